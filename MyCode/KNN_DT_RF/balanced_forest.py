@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Balanced random forest: every tree draws its own class-balanced sample.
+
+The script balances before the forest: ``dataset_balancement`` builds a
+replicated copy, or ``RandomUnderSampler`` in the imblearn pipeline builds
+an under-sampled one, and ``RandomForestClassifier`` then bootstraps that
+copy again. The pipeline also shows every tree the same ~700 legitimate
+rows, dropping the rest of the majority class.
+
+``BalancedRandomForest`` follows Chen, Liaw and Breiman's balanced random
+forest instead: for each tree, a bootstrap of the minority class and as
+many rows drawn with replacement from every other class, taken as indices
+into the original imbalanced matrix. The draws become per-row counts (as
+``tree_engine.RandomForest`` does with its bootstrap); each tree gathers
+only the ~2 x (number of frauds) distinct rows it drew, as float32, and is
+fitted on them with the counts as ``sample_weight``. No balanced copy of
+the training set is built, no per-tree work scales with the number of
+training rows, and each tree sees a different slice of the legitimate
+transactions.
+
+Trees are grown on ``n_jobs`` threads (sklearn's tree builder releases
+the GIL). ``estimators_`` holds plain sklearn trees, so
+``forest_compiler.compile_forest`` and ``model_artifact.save_artifact``
+accept the forest.
+
+    forest = BalancedRandomForest(n_estimators=100, max_depth=8, n_jobs=4)
+    forest.fit(X_train_s, y_train)
+    forest.predict_proba(X_test_s)[:, 1]
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.utils import check_random_state
+
+
+def balanced_counts(class_rows, n_rows, n_draw, rng):
+    """Per-row draw counts of one balanced sample.
+
+    ``class_rows`` holds the row indices of each class; ``n_draw`` rows are
+    drawn with replacement from each.
+    """
+    draws = np.concatenate([rng.choice(rows, n_draw, replace=True) for rows in class_rows])
+    return np.bincount(draws, minlength=n_rows)
+
+
+class BalancedRandomForest:
+    """Random forest of trees grown on per-tree class-balanced bootstraps.
+
+    ``max_samples`` caps the rows drawn per class and tree (default: the
+    minority class size). The other parameters are passed to every
+    ``DecisionTreeClassifier``.
+    """
+
+    def __init__(self, n_estimators=100, criterion="gini", max_depth=None, min_samples_leaf=1,
+                 max_features="sqrt", max_samples=None, n_jobs=None, random_state=None):
+        self.n_estimators = n_estimators
+        self.criterion = criterion
+        self.max_depth = max_depth
+        self.min_samples_leaf = min_samples_leaf
+        self.max_features = max_features
+        self.max_samples = max_samples
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+
+    def fit(self, X, y, sample_weight=None):
+        rng = check_random_state(self.random_state)
+        X = np.asarray(X)
+        y = np.asarray(y)
+        self.classes_, y_codes = np.unique(y, return_inverse=True)
+        self.n_features_in_ = X.shape[1]
+        class_rows = [np.flatnonzero(y_codes == c) for c in range(len(self.classes_))]
+        n_draw = min(len(rows) for rows in class_rows)
+        if self.max_samples is not None:
+            n_draw = min(n_draw, self.max_samples)
+        if sample_weight is not None:
+            sample_weight = np.asarray(sample_weight, dtype=np.float64)
+        seeds = rng.randint(np.iinfo(np.int32).max, size=self.n_estimators)
+
+        def grow(seed):
+            counts = balanced_counts(class_rows, len(y), n_draw, np.random.RandomState(seed))
+            rows = np.flatnonzero(counts)
+            weights = counts[rows].astype(np.float64)
+            if sample_weight is not None:
+                weights *= sample_weight[rows]
+            tree = DecisionTreeClassifier(criterion=self.criterion, max_depth=self.max_depth,
+                                          min_samples_leaf=self.min_samples_leaf,
+                                          max_features=self.max_features, random_state=seed)
+            # Float32 and contiguous already, so sklearn's input check is skipped.
+            return tree.fit(np.ascontiguousarray(X[rows], dtype=np.float32), y[rows],
+                            sample_weight=weights, check_input=False)
+
+        n_jobs = min(self.n_jobs or os.cpu_count(), self.n_estimators)
+        if n_jobs == 1:
+            self.estimators_ = [grow(seed) for seed in seeds]
+        else:
+            with ThreadPoolExecutor(n_jobs) as pool:
+                self.estimators_ = list(pool.map(grow, seeds))
+        self.rows_per_tree_ = len(self.classes_) * n_draw
+        return self
+
+    def predict_proba(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        # Summed in estimator order, then divided, as compile_forest does.
+        total = self.estimators_[0].predict_proba(X, check_input=False)
+        for tree in self.estimators_[1:]:
+            total += tree.predict_proba(X, check_input=False)
+        return total / len(self.estimators_)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
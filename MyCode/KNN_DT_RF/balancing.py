@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Class balancing for the training split.
+
+``dataset_balancement`` oversamples the fraud rows with replacement up to
+``len(y_train)`` and appends a shuffled copy of the legitimate rows, which
+roughly doubles the training matrix. ``balancement_weights`` expresses the
+same class balance as per-row sample weights instead, so estimators that
+accept ``sample_weight`` (decision trees, random forests) train on the
+original matrix without any copy.
+"""
+
+import numpy as np
+from sklearn.utils import check_random_state
+
+
+def balancement_indices(y_train, random_state=None):
+    """Return the row indices that ``dataset_balancement`` would select.
+
+    Indexing with them gives the balanced set; keeping only the indices is
+    enough for code that can gather rows lazily (e.g. block-wise KNN).
+    """
+    rng = check_random_state(random_state)
+    y_train = np.asarray(y_train)
+    fraud_indices = np.where(y_train == 1)[0]
+    not_fraud_indices = np.where(y_train == 0)[0]
+
+    under_sample_indices = rng.choice(not_fraud_indices, len(not_fraud_indices), False)
+    over_sample_indices = rng.choice(fraud_indices, len(y_train), replace=True)
+    return np.concatenate([over_sample_indices, under_sample_indices])
+
+
+def dataset_balancement(X_train, y_train, random_state=None):
+    """Materialise the balanced training set (replicated fraud rows)."""
+    X_train = np.asarray(X_train)
+    y_train = np.asarray(y_train)
+
+    indices = balancement_indices(y_train, random_state)
+    y_train = y_train[indices]
+    X_train = X_train[indices]
+    print(X_train.shape, y_train.shape)
+    return X_train, y_train
+
+
+def balancement_weights(y_train):
+    """Per-row sample weights giving the same class balance without copies.
+
+    ``dataset_balancement`` puts ``len(y_train)`` fraud rows next to every
+    legitimate row once. Weighting each fraud row by
+    ``len(y_train) / n_fraud`` and each legitimate row by 1 gives the same
+    class totals, i.e. the same balanced split criterion, in expectation
+    over the resampling but without its sampling noise.
+    """
+    y_train = np.asarray(y_train)
+    n_fraud = np.count_nonzero(y_train == 1)
+    weights = np.ones(len(y_train), dtype=np.float64)
+    if n_fraud:
+        weights[y_train == 1] = len(y_train) / n_fraud
+    return weights
+
+
+def undersampling_indices(y_train, random_state=None):
+    """Rows ``RandomUnderSampler(sampling_strategy="majority")`` would keep.
+
+    Every fraud row and as many legitimate rows drawn without replacement,
+    as indices into the original matrix.
+    """
+    rng = check_random_state(random_state)
+    y_train = np.asarray(y_train)
+    fraud_indices = np.flatnonzero(y_train == 1)
+    not_fraud_indices = np.flatnonzero(y_train != 1)
+    kept = rng.choice(not_fraud_indices, min(len(fraud_indices), len(not_fraud_indices)), False)
+    return np.sort(np.concatenate([fraud_indices, kept]))
@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+"""Headless batch entry point for the script's analyses.
+
+``creditcardfraud_knn_dt_rf_final.py`` is a notebook export: it blocks on
+``plt.show()`` about fifty times, opens a viewer after every graphviz
+render and imports seaborn, graphviz and imblearn whatever part of it is
+wanted. ``batch_run`` runs the same analyses as independent sections:
+
+    eda          summary table, correlation matrix, per-column histograms
+    knn          balanced 3-NN on the standardized split, recall for k = 1..19
+    trees        depth-3 entropy tree render, ID3 / C4.5 raw and balanced
+    forest       the final under-sampled forest, saved as a scoring artifact
+    depth-sweep  forest precision / recall for max_depth = 1..29
+    experiments  the ``experiment_runner`` grid
+
+Each section imports its libraries when it starts, so ``--sections
+forest`` never loads graphviz, and figures are drawn with plain matplotlib
+(no seaborn). Sections hand figures, reports and tree renders to an
+``OutputWriter``, whose background process pool draws with matplotlib's
+Agg backend and writes into ``--out``: the computation does not wait for
+plotting and no display is needed. Figures are described by data (arrays
+and titles), not matplotlib objects, so the main process never imports
+pyplot at all.
+
+    python batch_run.py --out results/ --sections eda trees forest
+    python batch_run.py --out results/                 # every section
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+# -- drawing (runs in the writer's worker processes) -------------------------
+
+
+def _pyplot():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def confusion_figure(cm, title="confusion matrix"):
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(10, 6))
+    image = ax.imshow(cm, cmap="Blues")
+    fig.colorbar(image, ax=ax)
+    for (i, j), count in np.ndenumerate(cm):
+        ax.text(j, i, f"{count:g}", ha="center", va="center",
+                color="white" if count > cm.max() / 2 else "black")
+    ax.set_xticks(range(cm.shape[1]))
+    ax.set_yticks(range(cm.shape[0]))
+    ax.set_xlabel("Prediction")
+    ax.set_ylabel("Actual")
+    ax.set_title(title)
+    return fig
+
+
+def roc_figure(fpr, tpr, auc, title="ROC curve"):
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(6, 6))
+    ax.plot(fpr, tpr, label=f"AUC = {auc:.3f}")
+    ax.plot([0, 1], [0, 1], linestyle="--", color="grey")
+    ax.set_xlabel("False Positive Rate")
+    ax.set_ylabel("True Positive Rate")
+    ax.set_title(title)
+    ax.legend(loc="lower right")
+    return fig
+
+
+def line_figure(x, y, title, xlabel, ylabel, marker="o", color="b"):
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.plot(x, y, marker=marker, linestyle="-", color=color)
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.set_xticks(list(x))
+    ax.grid(True)
+    return fig
+
+
+def histogram_figure(counts, edges, title):
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(8, 4))
+    ax.stairs(counts, edges, fill=True, edgecolor="black")
+    ax.set_title(title)
+    ax.set_ylabel("count")
+    return fig
+
+
+def heatmap_figure(matrix, labels, title):
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(12, 10))
+    image = ax.imshow(matrix, cmap="coolwarm", vmin=-1, vmax=1)
+    fig.colorbar(image, ax=ax)
+    ax.set_xticks(range(len(labels)), labels, rotation=90)
+    ax.set_yticks(range(len(labels)), labels)
+    ax.set_title(title)
+    return fig
+
+
+def bar_figure(labels, values, title, ylabel):
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(6, 4))
+    ax.bar([str(label) for label in labels], values)
+    ax.set_title(title)
+    ax.set_ylabel(ylabel)
+    return fig
+
+
+def _write_figure(path, draw, args, kwargs):
+    fig = draw(*args, **kwargs)
+    fig.savefig(path, bbox_inches="tight")
+    _pyplot().close(fig)
+    return path
+
+
+def _write_text(path, text):
+    with open(path, "w") as fh:
+        fh.write(text)
+    return path
+
+
+def _render_tree(path, dot_source, fmt):
+    # The .dot file is always written; the image needs the graphviz package
+    # and its ``dot`` executable.
+    _write_text(path + ".dot", dot_source)
+    try:
+        import graphviz
+        return graphviz.Source(dot_source).render(outfile=f"{path}.{fmt}", format=fmt,
+                                                  cleanup=True)
+    except Exception as exc:  # package or executable missing
+        print(f"graphviz render of {path}.dot unavailable: {exc}")
+        return path + ".dot"
+
+
+class OutputWriter:
+    """Writes figures, reports and tree renders to ``out_dir`` in the background.
+
+    ``figure(name, draw, *args)`` calls ``draw(*args)`` (a module-level
+    function returning a matplotlib figure) in a worker process and saves
+    it as ``out_dir/name``. ``close`` waits for every write and re-raises
+    the first error.
+    """
+
+    def __init__(self, out_dir, n_workers=2):
+        self.out_dir = out_dir
+        os.makedirs(out_dir, exist_ok=True)
+        # spawn: workers start clean instead of forking the BLAS threads
+        # and data of the main process.
+        self._pool = ProcessPoolExecutor(n_workers, mp_context=get_context("spawn"))
+        self._futures = []
+
+    def _path(self, name):
+        return os.path.join(self.out_dir, name)
+
+    def figure(self, name, draw, *args, **kwargs):
+        self._futures.append(self._pool.submit(_write_figure, self._path(name), draw, args,
+                                               kwargs))
+
+    def report(self, name, content):
+        """Write ``content`` (text, or anything JSON-serialisable) to ``name``."""
+        if not isinstance(content, str):
+            content = json.dumps(content, indent=1, default=float)
+        self._futures.append(self._pool.submit(_write_text, self._path(name), content))
+
+    def tree(self, name, dot_source, fmt="png"):
+        self._futures.append(self._pool.submit(_render_tree, self._path(name), dot_source, fmt))
+
+    def close(self):
+        """Wait for the pending writes; returns the written paths."""
+        try:
+            return [future.result() for future in self._futures]
+        finally:
+            self._pool.shutdown()
+
+
+# -- sections (run in the main process) --------------------------------------
+
+
+class Context:
+    """What the sections share: the data, its split cache and the writer."""
+
+    def __init__(self, data, writer):
+        from data_loader import load_creditcard_arrays
+
+        self.X, self.y, self.features = load_creditcard_arrays(data)
+        self.data = data
+        self.writer = writer
+        self.metrics = {}
+        self._prep = None
+
+    @property
+    def prep(self):
+        if self._prep is None:
+            from preprocessing_cache import PreprocessingCache
+            self._prep = PreprocessingCache(np.asarray(self.X, dtype=np.float64),
+                                            np.asarray(self.y))
+        return self._prep
+
+    def evaluate(self, name, y_test, scores):
+        """Metrics, classification report, confusion matrix and ROC of one model.
+
+        ``scores`` are fraud probabilities (``predict_proba(X)[:, 1]``); hard
+        0/1 predictions work too, with a one-point ROC curve.
+        """
+        from evaluation import Evaluation
+
+        ev = Evaluation(y_test, scores)
+        metrics = ev.metrics()
+        self.metrics[name] = {key: metrics[key]
+                              for key in ("accuracy", "precision", "recall", "roc_auc")}
+        self.writer.report(f"{name}-report.txt", ev.report())
+        self.writer.figure(f"{name}-confusion.png", confusion_figure, ev.confusion(),
+                           f"{name}: confusion matrix")
+        fpr, tpr, _ = ev.roc_curve()
+        self.writer.figure(f"{name}-roc.png", roc_figure, fpr, tpr, metrics["roc_auc"],
+                           f"{name}: ROC")
+
+
+def section_eda(ctx):
+    from eda_stats import eda_summary
+
+    stats = eda_summary(ctx.data)
+    ctx.writer.report("eda-describe.csv", stats.describe().to_csv())
+    corr = stats.corr()
+    ctx.writer.report("eda-correlation.csv", corr.to_csv())
+    ctx.writer.figure("eda-correlation.png", heatmap_figure, corr.to_numpy(), stats.columns,
+                      "Correlation Matrix")
+    for column in stats.columns:
+        counts, edges = stats.histogram(column, bins=40)
+        ctx.writer.figure(f"eda-hist-{column}.png", histogram_figure, counts, edges,
+                          f"Distribution of {column}")
+    fraud = stats.mean[stats.columns.index("Class")]
+    ctx.writer.figure("eda-class-distribution.png", bar_figure, [0, 1],
+                      [100 * (1 - fraud), 100 * fraud], "Class Distribution", "%")
+
+
+def section_knn(ctx):
+    from knn_engine import BlockedKNN
+    from knn_sweep import knn_sweep
+
+    _, _, _, y_test = ctx.prep.split(stratify=False)
+    _, X_test_s = ctx.prep.scaled(stratify=False)
+    X_u, y_u, counts = ctx.prep.balanced_reference(stratify=False)
+    index = BlockedKNN(n_jobs=os.cpu_count()).fit(X_u)
+    k_values = range(1, 20)
+    sweep = knn_sweep(X_u, y_u, X_test_s, y_test, k_values, index=index, counts=counts)
+    ctx.evaluate("knn-k3-balanced", y_test, sweep["predictions"][3])
+    ctx.writer.figure("knn-recall-vs-k.png", line_figure, list(k_values), sweep["recall"],
+                      "KNN Classification Recall for Different k Values",
+                      "Number of Neighbors (k)", "Recall", "x", "r")
+    ctx.metrics["knn-k3-balanced"]["reference_rows"] = int(len(y_u))
+
+
+def section_trees(ctx):
+    from sklearn.tree import DecisionTreeClassifier, export_graphviz
+
+    from tree_engine import DecisionTree
+
+    X_train, X_test, y_train, y_test = ctx.prep.split(stratify=True)
+    X_train_q = ctx.prep.binned(stratify=True)
+    clf = DecisionTreeClassifier(criterion="entropy", max_depth=3).fit(X_train, y_train)
+    ctx.writer.tree("tree-entropy-depth3", export_graphviz(
+        clf, feature_names=ctx.features, class_names=["0", "1"], filled=True, rounded=True,
+        proportion=False))
+
+    _, _, y_train_u, y_test_u = ctx.prep.split(stratify=False)
+    _, X_test_s = ctx.prep.scaled(stratify=False)
+    X_train_s_q = ctx.prep.binned(stratify=False, scaler="standard")
+    weights = ctx.prep.weights(stratify=False)
+    for criterion in ("id3", "c45"):
+        tree = DecisionTree(criterion=criterion).fit(X_train_q, y_train)
+        ctx.evaluate(f"{criterion}-raw", y_test, tree.predict_proba(X_test)[:, 1])
+        tree = DecisionTree(criterion=criterion)
+        tree.fit(X_train_s_q, y_train_u, sample_weight=weights)
+        ctx.evaluate(f"{criterion}-balanced", y_test_u, tree.predict_proba(X_test_s)[:, 1])
+
+
+def section_forest(ctx):
+    from imblearn.pipeline import make_pipeline
+    from imblearn.under_sampling import RandomUnderSampler
+    from sklearn.ensemble import RandomForestClassifier
+
+    from data_loader import FEATURES
+    from model_artifact import save_artifact
+
+    _, X_test, y_train, y_test = ctx.prep.split(stratify=False)
+    X_train_s, X_test_s = ctx.prep.scaled(stratify=False)
+    model = make_pipeline(RandomUnderSampler(random_state=42, sampling_strategy="majority"),
+                          RandomForestClassifier(n_estimators=100, random_state=42, max_depth=8))
+    model.fit(X_train_s, y_train)
+    ctx.evaluate("rf-under-sampled-depth8", y_test, model.predict_proba(X_test_s)[:, 1])
+    save_artifact(os.path.join(ctx.writer.out_dir, "rf-final-artifact"), model,
+                  scaler=ctx.prep.scaler(stratify=False), features=FEATURES)
+
+
+def section_depth_sweep(ctx):
+    from forest_depth_sweep import forest_depth_sweep
+
+    _, _, y_train, y_test = ctx.prep.split(stratify=False)
+    X_train_s, X_test_s = ctx.prep.scaled(stratify=False)
+    depth = list(range(1, 30))
+    _, precision, recall = forest_depth_sweep(
+        X_train_s, y_train, X_test_s, y_test, depth,
+        sample_weight=ctx.prep.weights(stratify=False), n_estimators=100, random_state=42)
+    ctx.metrics["depth-sweep"] = {"depth": depth, "precision": precision, "recall": recall}
+    ctx.writer.figure("rf-precision-vs-depth.png", line_figure, depth, precision,
+                      "Random Forest Classification Precision for Different depth",
+                      "Max_Depth (d)", "Precision", "o", "b")
+    ctx.writer.figure("rf-recall-vs-depth.png", line_figure, depth, recall,
+                      "Random Forest Classification Recall for Different depth",
+                      "Max_Depth (d)", "Recall", "x", "r")
+
+
+def section_experiments(ctx):
+    from experiment_runner import run_experiments
+
+    results = run_experiments(ctx.X, ctx.y)
+    ctx.metrics["experiments"] = results
+    header = list(results[0])
+    ctx.writer.report("experiments.csv", "\n".join(
+        [",".join(header)] + [",".join(str(r[key]) for key in header) for r in results]) + "\n")
+
+
+SECTIONS = {
+    "eda": section_eda,
+    "knn": section_knn,
+    "trees": section_trees,
+    "forest": section_forest,
+    "depth-sweep": section_depth_sweep,
+    "experiments": section_experiments,
+}
+
+
+def run(sections, out_dir, data=None, n_workers=2):
+    """Run ``sections`` in order; returns ``{section: seconds}`` and the metrics."""
+    writer = OutputWriter(out_dir, n_workers)
+    timings, ctx = {}, None
+    try:
+        ctx = Context(data, writer)
+        for name in sections:
+            start = time.perf_counter()
+            SECTIONS[name](ctx)
+            timings[name] = time.perf_counter() - start
+            print(f"{name:<12} {timings[name]:8.2f} s", flush=True)
+        writer.report("metrics.json", ctx.metrics)
+    finally:
+        start = time.perf_counter()
+        written = writer.close()
+        timings["(writer wait)"] = time.perf_counter() - start
+    print(f"{len(written)} files in {out_dir}; waited {timings['(writer wait)']:.2f} s "
+          "for the writer after the last section")
+    return timings, ctx.metrics
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", help="creditcard.csv file or folder")
+    parser.add_argument("--out", default="results")
+    parser.add_argument("--sections", nargs="+", choices=list(SECTIONS), default=list(SECTIONS))
+    parser.add_argument("--workers", type=int, default=2, help="writer processes")
+    args = parser.parse_args(argv)
+
+    run(args.sections, args.out, args.data, args.workers)
+    heavy = ("matplotlib", "seaborn", "graphviz", "imblearn", "kagglehub", "sklearn")
+    print("imported in this process:", ", ".join(m for m in heavy if m in sys.modules))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Benchmark: cold start from a saved artifact vs. retraining.
+
+Fits the script's final model (under-sampling pipeline, 100 trees of depth
+8, on the standardized split) and saves it with its scaler. Then reports
+the retraining time, the artifact size, and the time a fresh process needs
+to import ``model_artifact``, load the artifact and score its first row
+(``--processes`` such processes at once, all mapping the same files).
+
+    python bench_artifacts.py --out /tmp/rf-final --processes 4
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+from imblearn.pipeline import make_pipeline
+from imblearn.under_sampling import RandomUnderSampler
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+
+from data_loader import FEATURES, load_creditcard_arrays
+from model_artifact import load_artifact, save_artifact
+
+_COLD_START = """
+import sys, time
+start = time.perf_counter()
+from model_artifact import load_artifact
+imported = time.perf_counter()
+scoring = load_artifact(sys.argv[1])
+loaded = time.perf_counter()
+scoring.predict_proba_one([0.0] * len(scoring.features))
+scored = time.perf_counter()
+print(imported - start, loaded - imported, scored - loaded)
+"""
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", help="creditcard.csv file or folder")
+    parser.add_argument("--out", default="rf-final-artifact")
+    parser.add_argument("--processes", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    X, y, _ = load_creditcard_arrays(args.data)
+    X_train, X_test, y_train, y_test = train_test_split(
+        np.asarray(X, dtype=np.float64), np.asarray(y), test_size=0.3, random_state=42)
+
+    start = time.perf_counter()
+    scaler = StandardScaler().fit(X_train)
+    model = make_pipeline(RandomUnderSampler(random_state=42, sampling_strategy="majority"),
+                          RandomForestClassifier(n_estimators=100, random_state=42, max_depth=8))
+    model.fit(scaler.transform(X_train), y_train)
+    print(f"retrain:   {time.perf_counter() - start:8.3f} s")
+
+    start = time.perf_counter()
+    save_artifact(args.out, model, scaler=scaler, features=FEATURES)
+    size = sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(args.out) for name in names)
+    print(f"save:      {time.perf_counter() - start:8.3f} s, {size / 2**20:.2f} MB")
+
+    start = time.perf_counter()
+    scoring = load_artifact(args.out)
+    print(f"load:      {(time.perf_counter() - start) * 1e3:8.2f} ms (in process)")
+    print("identical to the fitted model:",
+          np.array_equal(scoring.predict_proba(X_test),
+                         model.predict_proba(scaler.transform(X_test))))
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=here + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    procs = [subprocess.Popen([sys.executable, "-c", _COLD_START, args.out], env=env,
+                              stdout=subprocess.PIPE, text=True)
+             for _ in range(args.processes)]
+    print(f"{'process':>7} {'import ms':>10} {'load ms':>8} {'first row ms':>13}")
+    for i, proc in enumerate(procs):
+        imported, loaded, scored = (float(t) * 1e3 for t in proc.communicate()[0].split())
+        print(f"{i:>7} {imported:>10.1f} {loaded:>8.2f} {scored:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
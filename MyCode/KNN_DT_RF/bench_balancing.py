@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Benchmark: replicated-row balancing vs. sample-weight balancing.
+
+For a decision tree and a random forest, compares the balanced fit done the
+old way (``dataset_balancement`` then ``fit``) with ``balancement_weights``
+on the original matrix. The forest is also fitted behind the script's
+``RandomUnderSampler`` and compared with ``BalancedRandomForest``, which
+draws a balanced sample per tree. Reports the rows each tree is grown on,
+fit time, peak traced memory (which covers the balanced copy) and test
+precision/recall.
+
+    python bench_balancing.py --estimators 100
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+from imblearn.pipeline import make_pipeline
+from imblearn.under_sampling import RandomUnderSampler
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import precision_score, recall_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+
+from balanced_forest import BalancedRandomForest
+from balancing import balancement_weights, dataset_balancement
+from data_loader import load_creditcard_arrays
+
+
+def run(make_model, mode, X_train, y_train, X_test, y_test):
+    tracemalloc.start()
+    start = time.perf_counter()
+    if mode == "replicate":
+        X_b, y_b = dataset_balancement(X_train, y_train, random_state=42)
+        model = make_model().fit(X_b, y_b)
+        rows = len(y_b)
+        del X_b, y_b
+    elif mode == "weights":
+        weights = balancement_weights(y_train)
+        model = make_model().fit(X_train, y_train, sample_weight=weights)
+        rows = len(y_train)
+    elif mode == "undersample":
+        model = make_pipeline(RandomUnderSampler(random_state=42, sampling_strategy="majority"),
+                              make_model()).fit(X_train, y_train)
+        rows = 2 * int(np.sum(y_train == 1))
+    else:  # per-tree: the model balances every tree itself
+        model = make_model().fit(X_train, y_train)
+        rows = model.rows_per_tree_
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    pred = model.predict(X_test)
+    return {"rows": rows, "fit_s": elapsed, "peak_mb": peak / 2**20,
+            "precision": precision_score(y_test, pred),
+            "recall": recall_score(y_test, pred)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", help="creditcard.csv file or folder")
+    parser.add_argument("--estimators", type=int, default=100)
+    parser.add_argument("--max-depth", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    X, y, _ = load_creditcard_arrays(args.data)
+    X_train, X_test, y_train, y_test = train_test_split(
+        np.asarray(X, dtype=np.float64), np.asarray(y), test_size=0.3, random_state=42)
+    scaler = StandardScaler().fit(X_train)
+    X_train, X_test = scaler.transform(X_train), scaler.transform(X_test)
+
+    models = {
+        "decision tree": (lambda: DecisionTreeClassifier(criterion="entropy", random_state=42),
+                          ("replicate", "weights")),
+        "random forest": (lambda: RandomForestClassifier(
+            n_estimators=args.estimators, max_depth=args.max_depth, random_state=42, n_jobs=-1),
+            ("replicate", "weights", "undersample")),
+        "balanced rf": (lambda: BalancedRandomForest(
+            n_estimators=args.estimators, max_depth=args.max_depth, random_state=42),
+            ("per-tree",)),
+    }
+    print(f"{'model':<14} {'mode':<11} {'rows':>8} {'fit s':>8} {'peak MB':>8} "
+          f"{'precision':>9} {'recall':>7}")
+    for name, (make_model, modes) in models.items():
+        for mode in modes:
+            r = run(make_model, mode, X_train, y_train, X_test, y_test)
+            print(f"{name:<14} {mode:<11} {r['rows']:>8} {r['fit_s']:>8.2f} "
+                  f"{r['peak_mb']:>8.1f} {r['precision']:>9.3f} {r['recall']:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Benchmark: ``CompiledForest`` vs. ``RandomForestClassifier.predict_proba``.
+
+Fits the script's final model (100 trees, depth 8, balanced weights on the
+standardized split), compiles it and reports, for both paths:
+
+* single-transaction latency (p50 / p99 over ``--queries`` test rows, one
+  ``predict_proba`` call per row);
+* batch throughput in rows per second over the whole test split (the
+  compiled path also with ``--n-jobs`` threads);
+
+and checks that the compiled outputs are bit-identical.
+
+    python bench_forest_inference.py --queries 2000 --n-jobs 4
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+
+from balancing import balancement_weights
+from data_loader import load_creditcard_arrays
+from forest_compiler import compile_forest
+
+
+def latencies(predict_one, rows):
+    times = np.empty(len(rows))
+    for i, row in enumerate(rows):
+        start = time.perf_counter()
+        predict_one(row)
+        times[i] = time.perf_counter() - start
+    return np.percentile(times, [50, 99]) * 1e6
+
+
+def throughput(predict_proba, X, repeat=3):
+    best = min(_timed(predict_proba, X) for _ in range(repeat))
+    return len(X) / best
+
+
+def _timed(predict_proba, X):
+    start = time.perf_counter()
+    predict_proba(X)
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", help="creditcard.csv file or folder")
+    parser.add_argument("--estimators", type=int, default=100)
+    parser.add_argument("--max-depth", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--n-jobs", type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+
+    X, y, _ = load_creditcard_arrays(args.data)
+    X_train, X_test, y_train, y_test = train_test_split(
+        np.asarray(X, dtype=np.float64), np.asarray(y), test_size=0.3, random_state=42)
+    scaler = StandardScaler().fit(X_train)
+    X_train, X_test = scaler.transform(X_train), scaler.transform(X_test)
+    forest = RandomForestClassifier(n_estimators=args.estimators, max_depth=args.max_depth,
+                                    random_state=42)
+    forest.fit(X_train, y_train, sample_weight=balancement_weights(y_train))
+
+    start = time.perf_counter()
+    compiled = compile_forest(forest)
+    print(f"compiled {compiled.n_estimators} trees, {len(compiled.feature)} nodes "
+          f"in {time.perf_counter() - start:.3f} s")
+
+    batch = compiled.predict_proba(X_test)
+    singles = np.array([compiled.predict_proba_one(row) for row in X_test[:args.queries]])
+    reference = forest.predict_proba(X_test)
+    print("bit-identical batch:", np.array_equal(batch, reference),
+          " single row:", np.array_equal(singles, reference[:args.queries]))
+
+    queries = X_test[:args.queries]
+    paths = {
+        "sklearn": (lambda row: forest.predict_proba(row[None, :]), forest.predict_proba),
+        "compiled": (compiled.predict_proba_one, compiled.predict_proba),
+    }
+    print(f"{'path':<10} {'p50 us':>9} {'p99 us':>9} {'rows/s':>12}")
+    for name, (predict_one, predict_proba) in paths.items():
+        p50, p99 = latencies(predict_one, queries)
+        rate = throughput(predict_proba, X_test)
+        print(f"{name:<10} {p50:>9.1f} {p99:>9.1f} {rate:>12,.0f}")
+    if args.n_jobs > 1:
+        compiled.n_jobs = args.n_jobs
+        rate = throughput(compiled.predict_proba, X_test)
+        print(f"{f'compiled, {args.n_jobs} threads':<30} {rate:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
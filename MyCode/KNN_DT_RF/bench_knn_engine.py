@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Benchmark: ``BlockedKNN`` vs. ``KNeighborsClassifier`` at growing data sizes.
+
+The reference set is the standardized, balanced training split (as built
+by ``dataset_balancement``). At scale s it is replicated s times with small
+jitter into a float32 memmap in a temporary directory (about 4.8 GB at
+s = 100 for the full dataset, so check free disk space), and a fixed sample
+of test rows is queried.
+
+    python bench_knn_engine.py --scales 1 10 100 --queries 5000 --n-jobs 4
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.preprocessing import StandardScaler
+
+from balancing import balancement_indices
+from data_loader import load_creditcard_arrays
+from knn_engine import BlockedKNNClassifier
+
+
+def scaled_reference(X_ref, scale, folder, seed=0):
+    """Write ``scale`` jittered copies of ``X_ref`` to a float32 memmap."""
+    path = os.path.join(folder, f"reference-x{scale}.npy")
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32,
+                                    shape=(len(X_ref) * scale, X_ref.shape[1]))
+    rng = np.random.default_rng(seed)
+    for s in range(scale):
+        jitter = 0 if s == 0 else rng.normal(0, 1e-3, X_ref.shape)
+        out[s * len(X_ref):(s + 1) * len(X_ref)] = X_ref + jitter
+    out.flush()
+    return np.load(path, mmap_mode="r")
+
+
+def timed(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", help="creditcard.csv file or folder")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--n-jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--memory-limit-mb", type=int, default=256)
+    parser.add_argument("--max-sklearn-scale", type=int, default=10,
+                        help="skip KNeighborsClassifier above this scale")
+    args = parser.parse_args(argv)
+
+    X, y, _ = load_creditcard_arrays(args.data)
+    X_train, X_test, y_train, y_test = train_test_split(
+        np.asarray(X, dtype=np.float64), np.asarray(y), test_size=0.3, random_state=42)
+    scaler = StandardScaler().fit(X_train)
+    X_train, X_test = scaler.transform(X_train), scaler.transform(X_test)
+    balanced = balancement_indices(y_train, random_state=42)
+    X_ref, y_ref = X_train[balanced], y_train[balanced]
+    queries = X_test[np.random.default_rng(0).permutation(len(X_test))[:args.queries]]
+
+    print(f"{'scale':>5} {'ref rows':>10} {'engine':<24} {'time s':>8} "
+          f"{'peak MB':>8} {'agree':>6}")
+    with tempfile.TemporaryDirectory() as folder:
+        for scale in args.scales:
+            R = X_ref if scale == 1 else scaled_reference(X_ref, scale, folder)
+            y_R = np.tile(y_ref, scale)
+
+            blocked = BlockedKNNClassifier(args.k, n_jobs=args.n_jobs,
+                                           memory_limit=args.memory_limit_mb * 2**20)
+            pred_b, t_b, m_b = timed(lambda: blocked.fit(R, y_R).predict(queries))
+            print(f"{scale:>5} {len(R):>10} {'BlockedKNN':<24} {t_b:>8.2f} {m_b:>8.1f} {'':>6}")
+
+            if scale <= args.max_sklearn_scale:
+                knn = KNeighborsClassifier(args.k, n_jobs=args.n_jobs)
+                pred_s, t_s, m_s = timed(lambda: knn.fit(np.asarray(R), y_R).predict(queries))
+                agree = (pred_s == pred_b).mean()
+                print(f"{scale:>5} {len(R):>10} {'KNeighborsClassifier':<24} {t_s:>8.2f} "
+                      f"{m_s:>8.1f} {agree:>6.3f}")
+            del R
+
+
+if __name__ == "__main__":
+    main()
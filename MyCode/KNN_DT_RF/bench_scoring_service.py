@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""Load generator for ``scoring_service``: replays the test split.
+
+Starts the service in a subprocess (fitting and saving the final model
+first if ``--artifact`` does not exist yet), or targets a running one with
+``--url``. For each ``--concurrency`` level it keeps that many keep-alive
+connections busy for ``--duration`` seconds, each posting the next test
+rows (``--rows-per-request`` per request, ``creditcard.csv`` layout with
+the ``Class`` column) as soon as the previous answer arrives. A ``503``
+from the service's backpressure is counted and retried after a short pause.
+
+Reports sustained requests and rows per second, client-side latency
+percentiles, rejections, and the server's mean batch size from
+``/metrics``, and checks the returned probabilities against the artifact
+scored locally.
+
+    python bench_scoring_service.py --concurrency 1 16 64 --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+from data_loader import load_creditcard_arrays
+from model_artifact import load_artifact
+from scoring_service import fit_artifact
+
+
+async def request(reader, writer, method, path, body=b""):
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: bench\r\n"
+                 f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+                 .encode() + body)
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = next(int(line.split(b":", 1)[1]) for line in head.split(b"\r\n")
+                  if line.lower().startswith(b"content-length:"))
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def get(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        return (await request(reader, writer, "GET", path))[1]
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, rows, concurrency, duration, rows_per_request):
+    """Drive ``concurrency`` clients for ``duration`` s; returns stats and answers."""
+    n_requests = -(-len(rows) // rows_per_request)
+    bodies = [json.dumps(rows[i * rows_per_request:(i + 1) * rows_per_request].tolist())
+              .encode() for i in range(n_requests)]
+    answers = {}
+    latencies, rejected, next_request = [], [0], [0]
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while time.perf_counter() < deadline:
+                i = next_request[0] % n_requests
+                next_request[0] += 1
+                start = time.perf_counter()
+                status, payload = await request(reader, writer, "POST", "/score", bodies[i])
+                if status == 503:
+                    rejected[0] += 1
+                    await asyncio.sleep(0.01)
+                    continue
+                if status != 200:
+                    raise RuntimeError(f"status {status}: {payload}")
+                latencies.append(time.perf_counter() - start)
+                answers[i] = payload["fraud_probability"]
+        finally:
+            writer.close()
+
+    before = await get(host, port, "/metrics")
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    after = await get(host, port, "/metrics")
+    batches = after["batches"] - before["batches"]
+    stats = {
+        "requests/s": len(latencies) / elapsed,
+        "rows/s": len(latencies) * rows_per_request / elapsed,
+        "p50 ms": np.percentile(latencies, 50) * 1e3,
+        "p99 ms": np.percentile(latencies, 99) * 1e3,
+        "rejected": rejected[0],
+        "batch rows": (after["rows"] - before["rows"]) / max(batches, 1),
+    }
+    return stats, answers
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_service(args):
+    port = _free_port()
+    here = os.path.dirname(os.path.abspath(__file__))
+    command = [sys.executable, os.path.join(here, "scoring_service.py"),
+               "--artifact", args.artifact, "--port", str(port),
+               "--max-batch", str(args.max_batch), "--max-wait-ms", str(args.max_wait_ms),
+               "--max-queue", str(args.max_queue)]
+    proc = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    proc.stdout.readline()  # "serving ..." once listening
+    return proc, "127.0.0.1", port
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", help="creditcard.csv file or folder")
+    parser.add_argument("--artifact", default="artifacts/rf-final")
+    parser.add_argument("--url", help="host:port of a running service")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--rows-per-request", type=int, default=1)
+    parser.add_argument("--max-batch", type=int, default=512)
+    parser.add_argument("--max-wait-ms", type=float, default=0.0)
+    parser.add_argument("--max-queue", type=int, default=1024)
+    args = parser.parse_args(argv)
+
+    X, y, _ = load_creditcard_arrays(args.data)
+    _, X_test, _, y_test = train_test_split(
+        np.asarray(X, dtype=np.float64), np.asarray(y), test_size=0.3, random_state=42)
+    if not os.path.isdir(args.artifact):
+        fit_artifact(args.artifact, args.data)
+    rows = np.column_stack([X_test, y_test])
+    expected = load_artifact(args.artifact).predict_proba(X_test)[:, 1]
+
+    proc = None
+    if args.url:
+        host, port = args.url.rsplit(":", 1)
+        port = int(port)
+    else:
+        proc, host, port = _start_service(args)
+    try:
+        print(f"{len(rows)} test rows, {args.rows_per_request} per request, "
+              f"{args.duration:g} s per level")
+        columns = ("requests/s", "rows/s", "p50 ms", "p99 ms", "rejected", "batch rows")
+        print(f"{'clients':>7} " + " ".join(f"{name:>10}" for name in columns))
+        mismatches = 0
+        for concurrency in args.concurrency:
+            stats, answers = asyncio.run(run_load(host, port, rows, concurrency,
+                                                  args.duration, args.rows_per_request))
+            for i, proba in answers.items():
+                start = i * args.rows_per_request
+                mismatches += not np.array_equal(proba, expected[start:start + len(proba)])
+            print(f"{concurrency:>7} " + " ".join(f"{stats[name]:>10.1f}" for name in columns))
+        print("answers identical to local scoring:", mismatches == 0)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Benchmark: ``tree_engine.DecisionTree`` vs. sklearn's ``DecisionTreeClassifier``.
+
+Fits the script's tree configurations (full depth and the tuned depths, on
+the raw split and with balancing weights) with sklearn's entropy tree and
+the native ID3 and C4.5 trees on the full dataset. Reports fit time (the
+native times include quantising the features), depth, leaf count and test
+precision/recall.
+
+It then compares the float64 training matrix with its uint8
+``BinnedMatrix``, and ``RandomForestClassifier`` on the floats with
+``tree_engine.RandomForest`` on the binned matrix (binned once, outside the
+timing, as ``PreprocessingCache.binned`` does).
+
+    python bench_trees.py --max-depth 0 7 --estimators 20
+"""
+
+import argparse
+import time
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import precision_score, recall_score
+from sklearn.model_selection import train_test_split
+from sklearn.tree import DecisionTreeClassifier
+
+from balancing import balancement_weights, dataset_balancement
+from binning import BinnedMatrix
+from data_loader import load_creditcard_arrays
+from tree_engine import DecisionTree, RandomForest
+
+MODELS = {
+    "sklearn entropy": lambda depth: DecisionTreeClassifier(
+        criterion="entropy", max_depth=depth, random_state=42),
+    "id3": lambda depth: DecisionTree(criterion="id3", max_depth=depth),
+    "c4.5": lambda depth: DecisionTree(criterion="c45", max_depth=depth),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", help="creditcard.csv file or folder")
+    parser.add_argument("--max-depth", type=int, nargs="+", default=[0, 3, 7],
+                        help="depths to fit; 0 means unlimited")
+    parser.add_argument("--estimators", type=int, default=20)
+    parser.add_argument("--forest-depth", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    X, y, _ = load_creditcard_arrays(args.data)
+    X_train, X_test, y_train, y_test = train_test_split(
+        np.asarray(X, dtype=np.float64), np.asarray(y), test_size=0.3, random_state=42,
+        stratify=y)
+    weights = {"raw": None, "balanced": balancement_weights(y_train)}
+
+    print(f"{len(y_train)} training rows")
+    print(f"{'model':<16} {'depth':>5} {'mode':<9} {'fit s':>7} {'levels':>6} {'leaves':>6} "
+          f"{'precision':>9} {'recall':>7}")
+    for depth in args.max_depth:
+        for mode, sample_weight in weights.items():
+            for name, make_model in MODELS.items():
+                model = make_model(depth or None)
+                start = time.perf_counter()
+                model.fit(X_train, y_train, sample_weight=sample_weight)
+                elapsed = time.perf_counter() - start
+                pred = model.predict(X_test)
+                print(f"{name:<16} {depth or '-':>5} {mode:<9} {elapsed:>7.2f} "
+                      f"{model.get_depth():>6} {model.get_n_leaves():>6} "
+                      f"{precision_score(y_test, pred, zero_division=0):>9.3f} "
+                      f"{recall_score(y_test, pred):>7.3f}")
+
+    X_b, _ = dataset_balancement(X_train, y_train, random_state=42)
+    start = time.perf_counter()
+    X_train_q = BinnedMatrix.from_array(X_train)
+    bin_s = time.perf_counter() - start
+    print(f"\nbinning: {bin_s:.2f} s; train {X_train.nbytes / 2**20:.1f} MB -> "
+          f"{X_train_q.nbytes / 2**20:.1f} MB, balanced {X_b.nbytes / 2**20:.1f} MB -> "
+          f"{X_train_q.transform(X_b).nbytes / 2**20:.1f} MB")
+    del X_b
+
+    forests = {
+        "sklearn forest": (lambda: RandomForestClassifier(
+            args.estimators, max_depth=args.forest_depth, random_state=42), X_train),
+        "binned forest": (lambda: RandomForest(
+            args.estimators, max_depth=args.forest_depth, random_state=42), X_train_q),
+    }
+    print(f"{'model':<16} {'mode':<9} {'fit s':>7} {'precision':>9} {'recall':>7}")
+    for mode, sample_weight in weights.items():
+        for name, (make_model, X_fit) in forests.items():
+            start = time.perf_counter()
+            model = make_model().fit(X_fit, y_train, sample_weight=sample_weight)
+            elapsed = time.perf_counter() - start
+            pred = model.predict(X_test)
+            print(f"{name:<16} {mode:<9} {elapsed:>7.2f} "
+                  f"{precision_score(y_test, pred, zero_division=0):>9.3f} "
+                  f"{recall_score(y_test, pred):>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
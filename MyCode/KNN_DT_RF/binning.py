@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Quantised uint8 feature matrices for the tree models.
+
+Every tree and forest fit used to work on a float64 copy of the training
+matrix (8 bytes per value) and look at raw thresholds at every node. A
+``BinnedMatrix`` replaces each of the 30 features by its bin among at most
+256 quantile bins (exact midpoints when a feature has fewer distinct
+values), so the same rows take one byte per value, and a node's split
+search becomes a histogram over (feature, bin) pairs.
+
+The bins are placed once per split (``PreprocessingCache.binned``) and
+shared by ``tree_engine.DecisionTree`` and ``tree_engine.RandomForest``.
+Binning is monotone, so a split ``code <= t`` is the float split
+``x <= thresholds[f, t]`` and the fitted models predict on raw rows.
+
+    X_train_q = BinnedMatrix.from_array(X_train)
+    tree = DecisionTree(criterion="c45").fit(X_train_q, y_train)
+    tree.predict(X_test)
+"""
+
+import numpy as np
+from sklearn.utils import check_random_state
+
+
+def fit_bins(X, max_bins=256, subsample=200_000, random_state=0):
+    """Per-feature split thresholds, padded with ``inf`` to (n_features, max_bins - 1).
+
+    Features with at most ``max_bins`` distinct values (in a row sample of
+    ``subsample``) get the midpoints between them, the others quantiles.
+    """
+    if not 2 <= max_bins <= 256:
+        raise ValueError("max_bins must be in [2, 256] to fit in uint8")
+    X = np.asarray(X)
+    if subsample is not None and len(X) > subsample:
+        rows = check_random_state(random_state).choice(len(X), subsample, replace=False)
+        X = X[np.sort(rows)]
+    thresholds = np.full((X.shape[1], max_bins - 1), np.inf)
+    for f in range(X.shape[1]):
+        column = np.asarray(X[:, f], dtype=np.float64)
+        values = np.unique(column)
+        if len(values) <= max_bins:
+            edges = (values[:-1] + values[1:]) / 2
+        else:
+            quantiles = np.linspace(0, 1, max_bins + 1)[1:-1]
+            edges = np.unique(np.quantile(column, quantiles, method="midpoint"))
+        thresholds[f, :len(edges)] = edges
+    return thresholds
+
+
+def apply_bins(X, thresholds):
+    """uint8 bin codes: ``code <= t`` exactly when ``x <= thresholds[f, t]``."""
+    X = np.asarray(X)
+    codes = np.empty(X.shape, dtype=np.uint8)
+    for f in range(X.shape[1]):
+        codes[:, f] = np.searchsorted(thresholds[f], X[:, f], side="left")
+    return codes
+
+
+class BinnedMatrix:
+    """uint8 bin codes of a feature matrix and the thresholds behind them."""
+
+    def __init__(self, codes, thresholds):
+        self.codes = codes
+        self.thresholds = thresholds
+
+    @classmethod
+    def from_array(cls, X, max_bins=256, subsample=200_000, random_state=0):
+        thresholds = fit_bins(X, max_bins, subsample, random_state)
+        return cls(apply_bins(X, thresholds), thresholds)
+
+    def transform(self, X):
+        """Bin other rows (e.g. the test part) with the same thresholds."""
+        return BinnedMatrix(apply_bins(X, self.thresholds), self.thresholds)
+
+    @property
+    def n_bins(self):
+        return self.thresholds.shape[1] + 1
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes
+
+    def __len__(self):
+        return len(self.codes)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Two-stage cascade: a cheap screen first, the full forest for the rest.
+
+With 99.83% of transactions legitimate, running the 100-tree forest on
+every row spends most of the compute on rows any cheap model would clear.
+``CascadeClassifier`` scores every row with a cheap ``screen`` and only
+sends rows whose screen fraud score reaches ``threshold_`` to the full
+``model``; the others are predicted legitimate.
+
+``calibrate`` picks ``threshold_`` on labelled rows the screen was not fit
+on: the highest threshold that still passes ``target_recall`` of their
+frauds to the forest. On those calibration rows the cascade then loses at
+most ``1 - target_recall`` of the forest's recall; on new rows that bound
+is an estimate, as loose as the few frauds it was calibrated on. The gain
+is the fraction of rows the forest no longer sees (``pass_rate_`` after
+each call).
+
+With ~100 calibration frauds, a near-perfect target leaves the threshold
+at the lowest fraud score, so the screen must rank every fraud above most
+legitimate rows. A depth-3 tree cannot: its 8 leaves put some frauds in
+the leaf with the most legitimate rows, and nearly every row passes. A
+few shallow balanced trees can (``BalancedRandomForest(n_estimators=10,
+max_depth=6)`` passes 1-10% of the rows at 0.995). ``calibrate`` warns
+when the screen clears almost nothing.
+
+    screen = BalancedRandomForest(n_estimators=10, max_depth=6).fit(X_fit_s, y_fit)
+    cascade = CascadeClassifier(screen, model, target_recall=0.995)
+    cascade.calibrate(X_cal_s, y_cal)
+    y_pred = cascade.predict(X_test_s)
+    cascade.pass_rate_                     # share of rows the forest scored
+"""
+
+import warnings
+
+import numpy as np
+
+
+def _fraud_column(estimator):
+    classes = list(np.asarray(estimator.classes_))
+    return classes.index(1) if 1 in classes else len(classes) - 1
+
+
+def recall_threshold(fraud_scores, target_recall):
+    """Highest threshold ``t`` with ``mean(fraud_scores >= t) >= target_recall``."""
+    fraud_scores = np.sort(np.asarray(fraud_scores))
+    if not len(fraud_scores):
+        raise ValueError("no fraud rows to calibrate on")
+    misses = int(np.floor((1.0 - target_recall) * len(fraud_scores) + 1e-9))
+    return float(fraud_scores[min(misses, len(fraud_scores) - 1)])
+
+
+class CascadeClassifier:
+    """Screen with ``screen``, score the rows it flags with ``model``.
+
+    Both stages are fitted already and have ``predict_proba`` and
+    ``classes_``. ``screen_features`` selects the screen's columns of ``X``
+    (e.g. the indices of the 5 selected features); ``threshold`` skips
+    ``calibrate``.
+    """
+
+    def __init__(self, screen, model, target_recall=0.995, screen_features=None,
+                 threshold=None):
+        self.screen = screen
+        self.model = model
+        self.target_recall = target_recall
+        self.screen_features = screen_features
+        self.threshold_ = threshold
+
+    @property
+    def classes_(self):
+        return self.model.classes_
+
+    def screen_scores(self, X):
+        """Fraud score of every row according to the screen."""
+        X = np.asarray(X)
+        if self.screen_features is not None:
+            X = X[:, self.screen_features]
+        return self.screen.predict_proba(X)[:, _fraud_column(self.screen)]
+
+    def calibrate(self, X, y):
+        """Set ``threshold_`` so ``target_recall`` of the frauds in ``(X, y)`` pass.
+
+        ``pass_rate_`` is then the share of these rows that pass.
+        """
+        y = np.asarray(y)
+        scores = self.screen_scores(X)
+        self.threshold_ = recall_threshold(scores[y == 1], self.target_recall)
+        self.pass_rate_ = float(np.mean(scores >= self.threshold_))
+        if self.pass_rate_ > 0.99:
+            warnings.warn(f"{self.pass_rate_:.1%} of the calibration rows pass the screen at "
+                          f"target_recall={self.target_recall} with {int(np.sum(y == 1))} "
+                          f"frauds; the screen is too coarse to clear any", RuntimeWarning)
+        return self
+
+    def predict_proba(self, X):
+        if self.threshold_ is None:
+            raise ValueError("call calibrate() first or pass threshold")
+        X = np.asarray(X)
+        passed = self.screen_scores(X) >= self.threshold_
+        self.pass_rate_ = float(passed.mean()) if len(X) else 0.0
+        proba = np.zeros((len(X), len(self.classes_)))
+        proba[:, list(self.classes_).index(0)] = 1.0  # cleared rows: legitimate
+        if passed.any():
+            proba[passed] = self.model.predict_proba(X[passed])
+        return proba
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
@@ -19,23 +19,17 @@ This dataset presents transactions that occurred in two days, where we have 492
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.cm as cm
-from sklearn.metrics import classification_report
 import warnings
 warnings.filterwarnings('ignore')
 
 """# **Download Dataset**"""
 
-import kagglehub
+# The CSV is looked up in Data/ (or $CREDITCARD_CSV) and downloaded with
+# kagglehub only when missing. It is converted once into a float32/int8
+# cache that is memory-mapped on later runs.
+from data_loader import load_creditcard
 
-# Download latest version
-path = kagglehub.dataset_download("mlg-ulb/creditcardfraud")
-
-print("Path to dataset files:", path)
-
-# load above downloaded file
-import pandas as pd
-
-df = pd.read_csv(path + '/creditcard.csv')
+df = load_creditcard()
 df.head()
 
 """## Exploratory Data Analysis (EDA):
@@ -52,26 +46,28 @@ df.head()
 
 """
 
+# Moments, quantiles, correlations and histograms of every column come
+# from one chunked pass over the CSV, cached on disk next to the data
+# cache; the table and plots below are drawn from that summary.
+from eda_stats import eda_summary, plot_correlation, plot_histogram
+
+eda_stats = eda_summary()
+
 # Display summary statistics for the dataset
-df.describe()
+eda_stats.describe()
 
 # Plot the correlation matrix
 import seaborn as sns
 
-corr_matrix = df.corr()
-plt.figure(figsize=(12, 10))
-sns.heatmap(corr_matrix, annot=False, cmap='coolwarm', linewidths=0.5)
-plt.title('Correlation Matrix')
+corr_matrix = eda_stats.corr()
+plot_correlation(eda_stats)
 plt.show()
 corr_matrix
 
 # Plot the distribution of all columns
-for col in df.columns:
-    plt.figure(figsize=(8,4))
-    plt.title(f'Distribution of {col}')
-    sns.set_style("white")
-    plt.ylabel('count')
-    sns.distplot(x=df[col],kde=True, hist_kws=dict(edgecolor="black"),bins=40)
+sns.set_style("white")
+for col in eda_stats.columns:
+    plot_histogram(eda_stats, col, bins=40)
     plt.show()
 
 # Separate features and target variable
@@ -115,47 +111,35 @@ X.columns
 df.isnull().sum()
 
 # Standardize the features
-from sklearn.preprocessing import StandardScaler, RobustScaler, MinMaxScaler
+# prep.scaled(...) fits the scaler on the train part of a split; pass
+# scaler="robust" or scaler="minmax" for RobustScaler / MinMaxScaler.
+# Every split, fitted scaler and balanced set below is computed once and
+# shared by all model sections (keys: split seed, stratify, scaler, balancing
+# seed). Pass disk_dir=... to keep them across runs as well.
+from preprocessing_cache import PreprocessingCache
 
-def standardize_features(X_train, X_test):
-    #scaler = RobustScaler()
-    scaler = StandardScaler()
-    #scaler = MinMaxScaler()
-    X_train = scaler.fit_transform(X_train)
-    X_test = scaler.transform(X_test)
-    return X_train, X_test
+prep = PreprocessingCache(X, y)
 
 # Balance the dataset
-def dataset_balancement(X_train, y_train):
-    X_train = np.array(X_train)
-    y_train = np.array(y_train)
-
-    fraud_indices = np.where(y_train == 1)[0]
-    not_fraud_indices = np.where(y_train == 0)[0]
-    fraud_records =  len(fraud_indices)
-
-    under_sample_indices = np.random.choice(not_fraud_indices, len(not_fraud_indices), False)
-    over_sample_indices = np.random.choice(fraud_indices, len(y_train), replace=True)
-
-    y_train = y_train[np.concatenate([over_sample_indices, under_sample_indices])]
-    X_train = X_train[np.concatenate([over_sample_indices, under_sample_indices])]
-    print(X_train.shape, y_train.shape)
-    return X_train, y_train
+# balancement_weights gives the class balance of balancing.dataset_balancement
+# (replicated fraud rows) as sample weights, without copying the rows.
+from balancing import balancement_weights
 
 """# **Forward sequential selection**"""
 
-from sklearn.feature_selection import SequentialFeatureSelector
-from sklearn.linear_model import RidgeCV
+# Same selection as SequentialFeatureSelector(RidgeCV(...), direction="forward")
+# with 5-fold CV, but every ridge fit is solved from per-fold Gram matrices
+# collected in one pass over the data.
+from feature_selection import gram_statistics, forward_select
 
-ridge = RidgeCV(alphas=np.logspace(-6, 6, num=5)).fit(X, y)
 feature_names = np.array(list(df.columns[:-1]))
-sfs_forward = SequentialFeatureSelector(
-    ridge, n_features_to_select=5, direction="forward"
-).fit(X, y)
+gram_stats = gram_statistics(X, y, cv=5)
+selected, step_scores = forward_select(gram_stats, n_features_to_select=5,
+                                       alphas=np.logspace(-6, 6, num=5))
 
 print(
     "Features selected by forward sequential selection: "
-    f"{feature_names[sfs_forward.get_support()]}")
+    f"{np.sort(feature_names[selected])}")
 
 # Features selected by forward sequential selection: ['V10' 'V12' 'V14' 'V16' 'V17']
 
@@ -166,6 +150,7 @@ new_df.head(5)
 
 X_new = new_df
 y_new = df['Class']
+prep_new = PreprocessingCache(X_new, y_new)
 X_new.shape, y_new.shape
 
 """## Classifying
@@ -176,33 +161,36 @@ X_new.shape, y_new.shape
 3. Enhance Model's Performance
 """
 
-from sklearn.neighbors import KNeighborsClassifier, NearestCentroid
-from sklearn.model_selection import StratifiedKFold, KFold , cross_val_score
-from sklearn.metrics import accuracy_score, recall_score, classification_report
-from sklearn.metrics import confusion_matrix, ConfusionMatrixDisplay
-from sklearn.metrics import roc_auc_score, roc_curve, RocCurveDisplay
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.metrics import recall_score
 from sklearn.model_selection import train_test_split
 import seaborn as sns
+# Every model below is evaluated from its predict_proba scores with one
+# sort: confusion matrix, ROC from the probabilities, report.
+from evaluation import Evaluation, show_evaluation
 
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42, stratify=y)
+X_train, X_test, y_train, y_test = prep.split(stratify=True)
 
 knn = KNeighborsClassifier(n_neighbors=5)
 knn.fit(X_train, y_train)
-pred = knn.predict(X_test)
-print("Accuracy Score",accuracy_score(y_test, pred))
+ev = Evaluation(y_test, knn.predict_proba(X_test)[:, 1])
+print("Accuracy Score", ev.accuracy())
 
-print(cross_val_score(knn, X_train, y_train, cv=10))
+# Stratified folds are computed once and cached; each fold reads index
+# views of the training array and the folds run in parallel.
+from cross_validation import cross_val_knn_sweep
+
+print(cross_val_knn_sweep(X_train, y_train, k_values=[5], cv=10)[0])
 
 print("Classification Report:")
-print(classification_report(y_test, pred))
+print(ev.report())
 
 """# Finding the Optimum K"""
 
-accuracy_rate = []
-for i in range(1,12):
-    knn = KNeighborsClassifier(n_neighbors=i)
-    scores = cross_val_score(knn, X_train, y_train, cv=10, scoring='accuracy')
-    accuracy_rate.append(scores.mean())
+# One neighbour search per fold at k = 11 gives the scores of every k <= 11
+from knn_sweep import knn_sweep
+
+accuracy_rate = cross_val_knn_sweep(X_train, y_train, k_values=range(1,12), cv=10).mean(axis=1)
 
 plt.figure(figsize=(8,6))
 accuracy_plot = plt.plot(range(1,12), accuracy_rate, color='blue', linestyle='dashed', marker='o',
@@ -220,48 +208,31 @@ Achieving high recall is crucial for this problem, Balance the dataset classes i
 
 knn = KNeighborsClassifier(n_neighbors=3)
 knn.fit(X_train, y_train)
-pred = knn.predict(X_test)
-print("K = 3  &  Accuracy Score",accuracy_score(y_test, pred))
-cm = confusion_matrix(y_test,pred)
-plt.subplots(figsize = (10,6))
-sns.heatmap(cm ,annot =True , cmap="Blues", fmt = 'g')
-plt.xlabel("Predicition")
-plt.ylabel("Actual")
-plt.title("confusion matrix")
-plt.show()
-print(roc_auc_score(y_test, pred))
-RocCurveDisplay.from_predictions(y_test, pred)
-plt.show()
+scores = knn.predict_proba(X_test)[:, 1]
+show_evaluation(Evaluation(y_test, scores), "K = 3")
 
-X_train_s, X_test_s = standardize_features(X_train, X_test)
-X_train_s_b, y_train_b = dataset_balancement(X_train_s, y_train)
+X_train_s, X_test_s = prep.scaled(stratify=True)
+# The balanced set holds ~199k copies of a few hundred frauds. Keep every
+# selected row once with its number of copies; weighted voting gives the
+# same predictions as KNN on the replicated set.
+from knn_dedup import DedupKNNClassifier
 
-knn = KNeighborsClassifier(n_neighbors=3)
-knn.fit(X_train_s_b, y_train_b)
-pred_s_b = knn.predict(X_test_s)
-print("K = 3  &  Accuracy Score",accuracy_score(y_test, pred_s_b))
-cm = confusion_matrix(y_test,pred_s_b)
-plt.subplots(figsize = (10,6))
-sns.heatmap(cm ,annot =True , cmap="Blues", fmt = 'g')
-plt.xlabel("Predicition")
-plt.ylabel("Actual")
-plt.title("confusion matrix")
-plt.show()
-print(roc_auc_score(y_test, pred_s_b))
-RocCurveDisplay.from_predictions(y_test, pred_s_b)
-plt.show()
-print("Classification Report:")
-print(classification_report(y_test, pred_s_b))
+X_train_s_u, y_train_u, counts_u = prep.balanced_reference(stratify=True)
+
+knn = DedupKNNClassifier(n_neighbors=3)
+knn.fit(X_train_s_u, y_train_u, counts_u)
+scores = knn.predict_proba(X_test_s)[:, 1]
+show_evaluation(Evaluation(y_test, scores), "K = 3")
 
 k_values = range(1, 20)
-recall_scores = []
+# A single neighbour search at k = 19 gives the predictions of every k.
+# BlockedKNN tiles the search so it fits in a fixed memory budget.
+import os
+from knn_engine import BlockedKNN
 
-for k in k_values:
-    knn = KNeighborsClassifier(n_neighbors=k)
-    knn.fit(X_train_s_b, y_train_b)
-    y_preds = knn.predict(X_test_s)
-    recall = recall_score(y_test, y_preds)
-    recall_scores.append(recall)
+knn_index = BlockedKNN(n_jobs=os.cpu_count()).fit(X_train_s_u)
+recall_scores = knn_sweep(X_train_s_u, y_train_u, X_test_s, y_test, k_values,
+                          index=knn_index, counts=counts_u)["recall"]
 
 # Plotting Recall for different values of k
 plt.figure(figsize=(10, 6))
@@ -273,90 +244,36 @@ plt.xticks(k_values)
 plt.grid(True)
 plt.show()
 
-knn = KNeighborsClassifier(n_neighbors=7)
-knn.fit(X_train_s_b, y_train_b)
-pred_s_b = knn.predict(X_test_s)
-print("K = 7  &  Accuracy Score",accuracy_score(y_test, pred_s_b))
-cm = confusion_matrix(y_test,pred_s_b)
-plt.subplots(figsize = (10,6))
-sns.heatmap(cm ,annot =True , cmap="Blues", fmt = 'g')
-plt.xlabel("Predicition")
-plt.ylabel("Actual")
-plt.title("confusion matrix")
-plt.show()
-print(roc_auc_score(y_test, pred_s_b))
-RocCurveDisplay.from_predictions(y_test, pred_s_b)
-plt.show()
-print("Classification Report:")
-print(classification_report(y_test, pred_s_b))
-
-knn = KNeighborsClassifier(n_neighbors=11)
-knn.fit(X_train_s_b, y_train_b)
-pred_s_b = knn.predict(X_test_s)
-print("K = 11  &  Accuracy Score",accuracy_score(y_test, pred_s_b))
-cm = confusion_matrix(y_test,pred_s_b)
-plt.subplots(figsize = (10,6))
-sns.heatmap(cm ,annot =True , cmap="Blues", fmt = 'g')
-plt.xlabel("Predicition")
-plt.ylabel("Actual")
-plt.title("confusion matrix")
-plt.show()
-print(roc_auc_score(y_test, pred_s_b))
-RocCurveDisplay.from_predictions(y_test, pred_s_b)
-plt.show()
-print("Classification Report:")
-print(classification_report(y_test, pred_s_b))
+knn = DedupKNNClassifier(n_neighbors=7)
+knn.fit(X_train_s_u, y_train_u, counts_u)
+scores = knn.predict_proba(X_test_s)[:, 1]
+show_evaluation(Evaluation(y_test, scores), "K = 7")
 
-X_new_train, X_new_test, y_new_train, y_new_test = train_test_split(X_new, y_new, test_size=0.3, random_state=42, stratify=y)
+knn = DedupKNNClassifier(n_neighbors=11)
+knn.fit(X_train_s_u, y_train_u, counts_u)
+scores = knn.predict_proba(X_test_s)[:, 1]
+show_evaluation(Evaluation(y_test, scores), "K = 11")
+
+X_new_train, X_new_test, y_new_train, y_new_test = prep_new.split(stratify=True)
 
 knn = KNeighborsClassifier(n_neighbors=3)
 knn.fit(X_new_train, y_new_train)
-pred_new = knn.predict(X_new_test)
-print("K = 3  &  Accuracy Score",accuracy_score(y_new_test, pred_new))
-cm = confusion_matrix(y_new_test,pred_new)
-plt.subplots(figsize = (10,6))
-sns.heatmap(cm ,annot =True , cmap="Blues", fmt = 'g')
-plt.xlabel("Predicition")
-plt.ylabel("Actual")
-plt.title("confusion matrix")
-plt.show()
-print(roc_auc_score(y_new_test, pred_new))
-RocCurveDisplay.from_predictions(y_new_test, pred_new)
-plt.show()
-print("Classification Report:")
-print(classification_report(y_new_test, pred_new))
+scores = knn.predict_proba(X_new_test)[:, 1]
+show_evaluation(Evaluation(y_new_test, scores), "K = 3")
 
-X_new_train, X_new_test, y_new_train, y_new_test = train_test_split(X_new, y_new, test_size=0.3, random_state=42)
+X_new_train, X_new_test, y_new_train, y_new_test = prep_new.split(stratify=False)
 
-X_new_train_s, X_new_test_s = standardize_features(X_new_train, X_new_test)
-X_new_train_s_b, y_new_train_b = dataset_balancement(X_new_train_s, y_new_train)
+X_new_train_s, X_new_test_s = prep_new.scaled(stratify=False)
+X_new_train_s_u, y_new_train_u, counts_new_u = prep_new.balanced_reference(stratify=False)
 
-knn = KNeighborsClassifier(n_neighbors=3)
-knn.fit(X_new_train_s_b, y_new_train_b)
-pred_new_s_b = knn.predict(X_new_test_s)
-print("K = 3  &  Accuracy Score",accuracy_score(y_new_test, pred_new_s_b))
-cm = confusion_matrix(y_new_test,pred_new_s_b)
-plt.subplots(figsize = (10,6))
-sns.heatmap(cm ,annot =True , cmap="Blues", fmt = 'g')
-plt.xlabel("Predicition")
-plt.ylabel("Actual")
-plt.title("confusion matrix")
-plt.show()
-print(roc_auc_score(y_new_test, pred_new_s_b))
-RocCurveDisplay.from_predictions(y_new_test, pred_new_s_b)
-plt.show()
-print("Classification Report:")
-print(classification_report(y_new_test, pred_new_s_b))
+knn = DedupKNNClassifier(n_neighbors=3)
+knn.fit(X_new_train_s_u, y_new_train_u, counts_new_u)
+scores = knn.predict_proba(X_new_test_s)[:, 1]
+show_evaluation(Evaluation(y_new_test, scores), "K = 3")
 
 k_values = range(1, 20)
-recall_scores = []
-
-for k in k_values:
-    knn = KNeighborsClassifier(n_neighbors=k)
-    knn.fit(X_new_train_s_b, y_new_train_b)
-    y_pred = knn.predict(X_new_test_s)
-    recall = recall_score(y_new_test, y_pred)
-    recall_scores.append(recall)
+recall_scores = knn_sweep(X_new_train_s_u, y_new_train_u, X_new_test_s, y_new_test, k_values,
+                          counts=counts_new_u)["recall"]
 
 # Plotting Recall for different values of k
 plt.figure(figsize=(10, 6))
@@ -368,35 +285,46 @@ plt.xticks(k_values)
 plt.grid(True)
 plt.show()
 
-knn = KNeighborsClassifier(n_neighbors=9)
-knn.fit(X_new_train_s_b, y_new_train_b)
-pred_new_s_b = knn.predict(X_new_test_s)
-print("K = 9  &  Accuracy Score",accuracy_score(y_new_test, pred_new_s_b))
-cm = confusion_matrix(y_new_test,pred_new_s_b)
-plt.subplots(figsize = (10,6))
-sns.heatmap(cm ,annot =True , cmap="Blues", fmt = 'g')
-plt.xlabel("Predicition")
-plt.ylabel("Actual")
-plt.title("confusion matrix")
-plt.show()
-print(roc_auc_score(y_new_test, pred_new_s_b))
-RocCurveDisplay.from_predictions(y_new_test, pred_new_s_b)
-plt.show()
-print("Classification Report:")
-print(classification_report(y_new_test, pred_new_s_b))
+knn = DedupKNNClassifier(n_neighbors=9)
+knn.fit(X_new_train_s_u, y_new_train_u, counts_new_u)
+scores = knn.predict_proba(X_new_test_s)[:, 1]
+show_evaluation(Evaluation(y_new_test, scores), "K = 9")
+
+"""## Persistent index for online scoring
+
+With only 5 features a KD-tree answers single-transaction queries
+exactly. The reference set keeps every legitimate training row, ~200k
+unique rows, where `predict_one` takes ~0.1 ms against ~6 ms for a
+brute-force scan. The index is saved once and memory-mapped when loaded.
+The approximate IVF index trades recall for latency through `n_probe`.
+"""
+
+from knn_index import KDTreeIndex, IVFIndex, KNNScorer, load_index, measure_recall
+
+KDTreeIndex().fit(X_new_train_s_u).save("knn5_kdtree", labels=y_new_train_u, counts=counts_new_u)
+scorer = KNNScorer(load_index("knn5_kdtree"), k=9)
+print("Single transaction prediction:", scorer.predict_one(X_new_test_s[0]))
+
+ivf = IVFIndex(n_probe=4).fit(X_new_train_s_u)
+for n_probe in (1, 2, 4, 8):
+    ivf.n_probe = n_probe
+    print(f"IVF n_probe={n_probe}  recall@9 =",
+          measure_recall(ivf, X_new_train_s_u, X_new_test_s[:1000], k=9))
 
 """# **Classification with Decision Trees**"""
 
 from sklearn.model_selection import train_test_split
 from sklearn.tree import DecisionTreeClassifier
-from sklearn import metrics
+from tree_engine import DecisionTree, RandomForest
 from sklearn.tree import export_graphviz
 import graphviz
 import seaborn as sns
 import matplotlib.pyplot as plt
-from sklearn.metrics import accuracy_score, confusion_matrix, roc_auc_score, RocCurveDisplay, classification_report
 
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42, stratify=y)
+X_train, X_test, y_train, y_test = prep.split(stratify=True)
+# The native trees train on the uint8-binned train part (8x smaller than
+# float64) and predict on the raw test rows.
+X_train_q = prep.binned(stratify=True)
 
 clf = DecisionTreeClassifier(criterion='entropy', max_depth=3)
 clf.fit(X, y)
@@ -433,276 +361,128 @@ graph.render(filename="decision_tree", format="png", cleanup=True)
 graph.view()
 graph
 
-clf_id3 = DecisionTreeClassifier(criterion='entropy')
-clf_id3.fit(X_train, y_train)
-y_pred_id3 = clf_id3.predict(X_test)
-
-print("Classifire = id3  &  Accuracy Score",accuracy_score(y_test, y_pred_id3))
-cm = confusion_matrix(y_test, y_pred_id3)
-plt.subplots(figsize = (10,6))
-sns.heatmap(cm ,annot =True , cmap="Blues", fmt = 'g')
-plt.xlabel("Predicition")
-plt.ylabel("Actual")
-plt.title("confusion matrix")
-plt.show()
-print(roc_auc_score(y_test, y_pred_id3))
-RocCurveDisplay.from_predictions(y_test, y_pred_id3)
-plt.show()
-print("Classification Report:")
-print(classification_report(y_test, y_pred_id3))
-
-clf_c45 = DecisionTreeClassifier(criterion='gini')
-clf_c45.fit(X_train, y_train)
-y_pred_c45 = clf_c45.predict(X_test)
-
-print("Classifire = c4.5  &  Accuracy Score",accuracy_score(y_test, y_pred_c45))
-cm = confusion_matrix(y_test, y_pred_c45)
-plt.subplots(figsize = (10,6))
-sns.heatmap(cm ,annot =True , cmap="Blues", fmt = 'g')
-plt.xlabel("Predicition")
-plt.ylabel("Actual")
-plt.title("confusion matrix")
-plt.show()
-print(roc_auc_score(y_test, y_pred_c45))
-RocCurveDisplay.from_predictions(y_test, y_pred_c45)
-plt.show()
-print("Classification Report:")
-print(classification_report(y_test, y_pred_c45))
+clf_id3 = DecisionTree(criterion='id3')
+clf_id3.fit(X_train_q, y_train)
+scores = clf_id3.predict_proba(X_test)[:, 1]
+show_evaluation(Evaluation(y_test, scores), "Classifire = id3")
+
+clf_c45 = DecisionTree(criterion='c45')
+clf_c45.fit(X_train_q, y_train)
+scores = clf_c45.predict_proba(X_test)[:, 1]
+show_evaluation(Evaluation(y_test, scores), "Classifire = c4.5")
 
 """# **Classifying with processed data**"""
 
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
+X_train, X_test, y_train, y_test = prep.split(stratify=False)
 
-X_train_s, X_test_s = standardize_features(X_train, X_test)
-X_train_s_b, y_train_b = dataset_balancement(X_train_s, y_train)
+X_train_s, X_test_s = prep.scaled(stratify=False)
+# Balanced objective as sample weights: no replicated fraud rows
+w_train_b = prep.weights(stratify=False)
+X_train_s_q = prep.binned(stratify=False, scaler="standard")
 
-clf_id3 = DecisionTreeClassifier(criterion='entropy')
-clf_id3.fit(X_train_s_b, y_train_b)
-y_pred_s_b = clf_id3.predict(X_test_s)
+clf_id3 = DecisionTree(criterion='id3')
+clf_id3.fit(X_train_s_q, y_train, sample_weight=w_train_b)
+scores = clf_id3.predict_proba(X_test_s)[:, 1]
+show_evaluation(Evaluation(y_test, scores), "Classifire = id3")
 
-print("Classifire = id3  &  Accuracy Score",accuracy_score(y_test, y_pred_s_b))
-cm = confusion_matrix(y_test, y_pred_s_b)
-plt.subplots(figsize = (10,6))
-sns.heatmap(cm ,annot =True , cmap="Blues", fmt = 'g')
-plt.xlabel("Predicition")
-plt.ylabel("Actual")
-plt.title("confusion matrix")
-plt.show()
-print(roc_auc_score(y_test, y_pred_s_b))
-RocCurveDisplay.from_predictions(y_test, y_pred_s_b)
-plt.show()
-print("Classification Report:")
-print(classification_report(y_test, y_pred_s_b))
-
-clf_c45 = DecisionTreeClassifier(criterion='gini')
-clf_c45.fit(X_train_s_b, y_train_b)
-y_pred_s_b_c45 = clf_c45.predict(X_test_s)
-
-print("Classifire = c4.5  &  Accuracy Score",accuracy_score(y_test, y_pred_s_b_c45))
-cm = confusion_matrix(y_test, y_pred_s_b_c45)
-plt.subplots(figsize = (10,6))
-sns.heatmap(cm ,annot =True , cmap="Blues", fmt = 'g')
-plt.xlabel("Predicition")
-plt.ylabel("Actual")
-plt.title("confusion matrix")
-plt.show()
-print(roc_auc_score(y_test, y_pred_s_b_c45))
-RocCurveDisplay.from_predictions(y_test, y_pred_s_b_c45)
-plt.show()
-print("Classification Report:")
-print(classification_report(y_test, y_pred_s_b_c45))
+clf_c45 = DecisionTree(criterion='c45')
+clf_c45.fit(X_train_s_q, y_train, sample_weight=w_train_b)
+scores = clf_c45.predict_proba(X_test_s)[:, 1]
+show_evaluation(Evaluation(y_test, scores), "Classifire = c4.5")
 
 """# **Random Forest**"""
 
 from sklearn.ensemble import RandomForestClassifier
 
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42, stratify=y)
+X_train, X_test, y_train, y_test = prep.split(stratify=True)
+X_train_q = prep.binned(stratify=True)
 
-rf_classifier = RandomForestClassifier(n_estimators=100, random_state=42)
-rf_classifier.fit(X_train, y_train)
-y_pred_rf = rf_classifier.predict(X_test)
+rf_classifier = RandomForest(n_estimators=100, random_state=42)
+rf_classifier.fit(X_train_q, y_train)
+scores = rf_classifier.predict_proba(X_test)[:, 1]
+show_evaluation(Evaluation(y_test, scores), "Classifire = RandomForest")
 
-print("Classifire = RandomForest  &  Accuracy Score",accuracy_score(y_test, y_pred_rf))
-cm = confusion_matrix(y_test, y_pred_rf)
-plt.subplots(figsize = (10,6))
-sns.heatmap(cm ,annot =True , cmap="Blues", fmt = 'g')
-plt.xlabel("Predicition")
-plt.ylabel("Actual")
-plt.title("confusion matrix")
-plt.show()
-print(roc_auc_score(y_test, y_pred_rf))
-RocCurveDisplay.from_predictions(y_test, y_pred_rf)
-plt.show()
-print("Classification Report:")
-print(classification_report(y_test, y_pred_rf))
-
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
-X_train_s, X_test_s = standardize_features(X_train, X_test)
-X_train_s_b, y_train_b = dataset_balancement(X_train_s, y_train)
-
-rf_classifier = RandomForestClassifier(n_estimators=100, random_state=42)
-rf_classifier.fit(X_train_s_b, y_train_b)
-y_pred_s_b_rf = rf_classifier.predict(X_test_s)
-
-print("Classifire = RandomForest  &  Accuracy Score",accuracy_score(y_test, y_pred_s_b_rf))
-cm = confusion_matrix(y_test, y_pred_s_b_rf)
-plt.subplots(figsize = (10,6))
-sns.heatmap(cm ,annot =True , cmap="Blues", fmt = 'g')
-plt.xlabel("Predicition")
-plt.ylabel("Actual")
-plt.title("confusion matrix")
-plt.show()
-print(roc_auc_score(y_test, y_pred_s_b_rf))
-RocCurveDisplay.from_predictions(y_test, y_pred_s_b_rf)
-plt.show()
-print("Classification Report:")
-print(classification_report(y_test, y_pred_s_b_rf))
+X_train, X_test, y_train, y_test = prep.split(stratify=False)
+X_train_s, X_test_s = prep.scaled(stratify=False)
+# Balanced objective as sample weights: no replicated fraud rows
+w_train_b = prep.weights(stratify=False)
+X_train_s_q = prep.binned(stratify=False, scaler="standard")
+
+rf_classifier = RandomForest(n_estimators=100, random_state=42)
+rf_classifier.fit(X_train_s_q, y_train, sample_weight=w_train_b)
+scores = rf_classifier.predict_proba(X_test_s)[:, 1]
+show_evaluation(Evaluation(y_test, scores), "Classifire = RandomForest")
 
 """# **Classifying with different Depth**"""
 
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42, stratify=y)
+X_train, X_test, y_train, y_test = prep.split(stratify=True)
+X_train_q = prep.binned(stratify=True)
 
-clf_id3 = DecisionTreeClassifier(criterion='entropy', max_depth=3)
-clf_id3.fit(X_train, y_train)
-y_pred_id3 = clf_id3.predict(X_test)
+clf_id3 = DecisionTree(criterion='id3', max_depth=3)
+clf_id3.fit(X_train_q, y_train)
+scores = clf_id3.predict_proba(X_test)[:, 1]
+show_evaluation(Evaluation(y_test, scores), "Classifire = id3")
 
-print("Classifire = id3  &  Accuracy Score",accuracy_score(y_test, y_pred_id3))
-cm = confusion_matrix(y_test, y_pred_id3)
-plt.subplots(figsize = (10,6))
-sns.heatmap(cm ,annot =True , cmap="Blues", fmt = 'g')
-plt.xlabel("Predicition")
-plt.ylabel("Actual")
-plt.title("confusion matrix")
-plt.show()
-print(roc_auc_score(y_test, y_pred_id3))
-RocCurveDisplay.from_predictions(y_test, y_pred_id3)
-plt.show()
-print("Classification Report:")
-print(classification_report(y_test, y_pred_id3))
-
-clf_c45 = DecisionTreeClassifier(criterion='gini', max_depth=7)
-clf_c45.fit(X_train, y_train)
-y_pred_c45 = clf_c45.predict(X_test)
-
-print("Classifire = c4.5  &  Accuracy Score",accuracy_score(y_test, y_pred_c45))
-cm = confusion_matrix(y_test, y_pred_c45)
-plt.subplots(figsize = (10,6))
-sns.heatmap(cm ,annot =True , cmap="Blues", fmt = 'g')
-plt.xlabel("Predicition")
-plt.ylabel("Actual")
-plt.title("confusion matrix")
-plt.show()
-print(roc_auc_score(y_test, y_pred_c45))
-RocCurveDisplay.from_predictions(y_test, y_pred_c45)
-plt.show()
-print("Classification Report:")
-print(classification_report(y_test, y_pred_c45))
+clf_c45 = DecisionTree(criterion='c45', max_depth=7)
+clf_c45.fit(X_train_q, y_train)
+scores = clf_c45.predict_proba(X_test)[:, 1]
+show_evaluation(Evaluation(y_test, scores), "Classifire = c4.5")
 
 """# **Classifying with processed data**"""
 
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
+X_train, X_test, y_train, y_test = prep.split(stratify=False)
 
-X_train_s, X_test_s = standardize_features(X_train, X_test)
-X_train_s_b, y_train_b = dataset_balancement(X_train_s, y_train)
+X_train_s, X_test_s = prep.scaled(stratify=False)
+# Balanced objective as sample weights: no replicated fraud rows
+w_train_b = prep.weights(stratify=False)
+X_train_s_q = prep.binned(stratify=False, scaler="standard")
 
-clf_id3 = DecisionTreeClassifier(criterion='entropy', max_depth=3)
-clf_id3.fit(X_train_s_b, y_train_b)
-y_pred_s_b = clf_id3.predict(X_test_s)
+clf_id3 = DecisionTree(criterion='id3', max_depth=3)
+clf_id3.fit(X_train_s_q, y_train, sample_weight=w_train_b)
+scores = clf_id3.predict_proba(X_test_s)[:, 1]
+show_evaluation(Evaluation(y_test, scores), "Classifire = id3")
 
-print("Classifire = id3  &  Accuracy Score",accuracy_score(y_test, y_pred_s_b))
-cm = confusion_matrix(y_test, y_pred_s_b)
-plt.subplots(figsize = (10,6))
-sns.heatmap(cm ,annot =True , cmap="Blues", fmt = 'g')
-plt.xlabel("Predicition")
-plt.ylabel("Actual")
-plt.title("confusion matrix")
-plt.show()
-print(roc_auc_score(y_test, y_pred_s_b))
-RocCurveDisplay.from_predictions(y_test, y_pred_s_b)
-plt.show()
-print("Classification Report:")
-print(classification_report(y_test, y_pred_s_b))
-
-clf_c45 = DecisionTreeClassifier(criterion='gini', max_depth=7)
-clf_c45.fit(X_train_s_b, y_train_b)
-y_pred_s_b_c45 = clf_c45.predict(X_test_s)
-
-print("Classifire = c4.5  &  Accuracy Score",accuracy_score(y_test, y_pred_s_b_c45))
-cm = confusion_matrix(y_test, y_pred_s_b_c45)
-plt.subplots(figsize = (10,6))
-sns.heatmap(cm ,annot =True , cmap="Blues", fmt = 'g')
-plt.xlabel("Predicition")
-plt.ylabel("Actual")
-plt.title("confusion matrix")
-plt.show()
-print(roc_auc_score(y_test, y_pred_s_b_c45))
-RocCurveDisplay.from_predictions(y_test, y_pred_s_b_c45)
-plt.show()
-print("Classification Report:")
-print(classification_report(y_test, y_pred_s_b_c45))
+clf_c45 = DecisionTree(criterion='c45', max_depth=7)
+clf_c45.fit(X_train_s_q, y_train, sample_weight=w_train_b)
+scores = clf_c45.predict_proba(X_test_s)[:, 1]
+show_evaluation(Evaluation(y_test, scores), "Classifire = c4.5")
 
 """# **Random Forest**"""
 
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42, stratify=y)
+X_train, X_test, y_train, y_test = prep.split(stratify=True)
+X_train_q = prep.binned(stratify=True)
 
-rf_classifier = RandomForestClassifier(n_estimators=100, random_state=42, max_depth=9)
-rf_classifier.fit(X_train, y_train)
-y_pred_rf = rf_classifier.predict(X_test)
+rf_classifier = RandomForest(n_estimators=100, random_state=42, max_depth=9)
+rf_classifier.fit(X_train_q, y_train)
+scores = rf_classifier.predict_proba(X_test)[:, 1]
+show_evaluation(Evaluation(y_test, scores), "Classifire = RandomForest")
 
-print("Classifire = RandomForest  &  Accuracy Score",accuracy_score(y_test, y_pred_rf))
-cm = confusion_matrix(y_test, y_pred_rf)
-plt.subplots(figsize = (10,6))
-sns.heatmap(cm ,annot =True , cmap="Blues", fmt = 'g')
-plt.xlabel("Predicition")
-plt.ylabel("Actual")
-plt.title("confusion matrix")
-plt.show()
-print(roc_auc_score(y_test, y_pred_rf))
-RocCurveDisplay.from_predictions(y_test, y_pred_rf)
-plt.show()
-print("Classification Report:")
-print(classification_report(y_test, y_pred_rf))
-
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
-X_train_s, X_test_s = standardize_features(X_train, X_test)
-X_train_s_b, y_train_b = dataset_balancement(X_train_s, y_train)
-
-rf_classifier = RandomForestClassifier(n_estimators=100, random_state=42, max_depth=9)
-rf_classifier.fit(X_train_s_b, y_train_b)
-y_pred_s_b_rf = rf_classifier.predict(X_test_s)
-
-print("Classifire = RandomForest  &  Accuracy Score",accuracy_score(y_test, y_pred_s_b_rf))
-cm = confusion_matrix(y_test, y_pred_s_b_rf)
-plt.subplots(figsize = (10,6))
-sns.heatmap(cm ,annot =True , cmap="Blues", fmt = 'g')
-plt.xlabel("Predicition")
-plt.ylabel("Actual")
-plt.title("confusion matrix")
-plt.show()
-print(roc_auc_score(y_test, y_pred_s_b_rf))
-RocCurveDisplay.from_predictions(y_test, y_pred_s_b_rf)
-plt.show()
-print("Classification Report:")
-print(classification_report(y_test, y_pred_s_b_rf))
+X_train, X_test, y_train, y_test = prep.split(stratify=False)
+X_train_s, X_test_s = prep.scaled(stratify=False)
+# Balanced objective as sample weights: no replicated fraud rows
+w_train_b = prep.weights(stratify=False)
+X_train_s_q = prep.binned(stratify=False, scaler="standard")
+
+rf_classifier = RandomForest(n_estimators=100, random_state=42, max_depth=9)
+rf_classifier.fit(X_train_s_q, y_train, sample_weight=w_train_b)
+scores = rf_classifier.predict_proba(X_test_s)[:, 1]
+show_evaluation(Evaluation(y_test, scores), "Classifire = RandomForest")
 
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
-X_train_s, X_test_s = standardize_features(X_train, X_test)
-X_train_s_b, y_train_b = dataset_balancement(X_train_s, y_train)
+X_train, X_test, y_train, y_test = prep.split(stratify=False)
+X_train_s, X_test_s = prep.scaled(stratify=False)
+# Balanced objective as sample weights: no replicated fraud rows
+w_train_b = prep.weights(stratify=False)
 
 from sklearn.metrics import precision_score, recall_score
 
+# One forest grown to depth 29; every shallower forest is evaluated by
+# stopping each tree walk at depth d instead of refitting 29 forests.
+from forest_depth_sweep import forest_depth_sweep
+
 depth = range(1, 30)
-precision_scores = []
-recall_scores = []
-
-for d in depth:
-    clf = RandomForestClassifier(n_estimators=100, random_state=42, max_depth=d)
-    clf.fit(X_train_s_b, y_train_b)
-    y_pred = clf.predict(X_test_s)
-    precision = precision_score(y_test, y_pred)
-    precision_scores.append(precision)
-    recall = recall_score(y_test, y_pred)
-    recall_scores.append(recall)
+_, precision_scores, recall_scores = forest_depth_sweep(
+    X_train_s, y_train, X_test_s, y_test, depth, sample_weight=w_train_b,
+    n_estimators=100, random_state=42)
 
 # Plotting Precision
 plt.figure(figsize=(10, 6))
@@ -736,29 +516,16 @@ plt.legend()
 plt.show()
 
 rf_classifier = RandomForestClassifier(n_estimators=100, random_state=42, max_depth=8)
-rf_classifier.fit(X_train_s_b, y_train_b)
-y_pred_s_b_rf = rf_classifier.predict(X_test_s)
-
-print("Classifire = RandomForest  &  Accuracy Score",accuracy_score(y_test, y_pred_s_b_rf))
-cm = confusion_matrix(y_test, y_pred_s_b_rf)
-plt.subplots(figsize = (10,6))
-sns.heatmap(cm ,annot =True , cmap="Blues", fmt = 'g')
-plt.xlabel("Predicition")
-plt.ylabel("Actual")
-plt.title("confusion matrix")
-plt.show()
-print(roc_auc_score(y_test, y_pred_s_b_rf))
-RocCurveDisplay.from_predictions(y_test, y_pred_s_b_rf)
-plt.show()
-print("Classification Report:")
-print(classification_report(y_test, y_pred_s_b_rf))
+rf_classifier.fit(X_train_s, y_train, sample_weight=w_train_b)
+scores = rf_classifier.predict_proba(X_test_s)[:, 1]
+show_evaluation(Evaluation(y_test, scores), "Classifire = RandomForest")
 
 from imblearn.over_sampling import SMOTE
 from imblearn.under_sampling import RandomUnderSampler
 from imblearn.pipeline import Pipeline, make_pipeline
 
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
-X_train_s, X_test_s = standardize_features(X_train, X_test)
+X_train, X_test, y_train, y_test = prep.split(stratify=False)
+X_train_s, X_test_s = prep.scaled(stratify=False)
 
 model = make_pipeline(
     RandomUnderSampler(random_state=42, sampling_strategy='majority'),
@@ -767,18 +534,127 @@ model = make_pipeline(
 )
 
 model.fit(X_train_s, y_train)
-pred_s = model.predict(X_test_s)
-
-print("Classifire = RandomForest  &  Accuracy Score",accuracy_score(y_test, pred_s))
-cm = confusion_matrix(y_test, pred_s)
-plt.subplots(figsize = (10,6))
-sns.heatmap(cm ,annot =True , cmap="Blues", fmt = 'g')
-plt.xlabel("Predicition")
-plt.ylabel("Actual")
-plt.title("confusion matrix")
-plt.show()
-print(roc_auc_score(y_test, pred_s))
-RocCurveDisplay.from_predictions(y_test, pred_s)
+scores = model.predict_proba(X_test_s)[:, 1]
+show_evaluation(Evaluation(y_test, scores), "Classifire = RandomForest")
+"""# **Compiled forest for scoring**
+
+The final forest flattened into contiguous node arrays: same probabilities
+bit for bit, without sklearn's per-estimator loop on every call.
+"""
+
+from forest_compiler import compile_forest
+
+compiled_rf = compile_forest(model)
+assert np.array_equal(compiled_rf.predict_proba(X_test_s), model.predict_proba(X_test_s))
+print("Single transaction fraud probability:", compiled_rf.predict_proba_one(X_test_s[0])[1])
+"""# **Saved scoring artifact**
+
+The scaler and the compiled forest saved together; loading memory-maps the
+arrays, so a scoring process starts in milliseconds without retraining.
+"""
+
+from data_loader import FEATURES
+from model_artifact import load_artifact, save_artifact
+
+save_artifact("artifacts/rf-final", compiled_rf, scaler=prep.scaler(stratify=False),
+              features=FEATURES)
+scoring = load_artifact("artifacts/rf-final")
+assert np.array_equal(scoring.predict_proba(X_test), model.predict_proba(X_test_s))
+
+"""# **Cascade: small balanced forest screen, full forest for the rest**
+
+A 10-tree, depth-6 balanced random forest fitted on part of the training
+split clears the obviously legitimate rows; its threshold is calibrated on
+the other part so that 99.5% of those frauds still reach the forest. The
+depth-3 tree is too coarse for this: with its 8 leaves, some frauds share a
+leaf with most legitimate rows, and at this target nearly every row passes.
+"""
+
+from balanced_forest import BalancedRandomForest
+from cascade import CascadeClassifier
+
+X_screen, X_cal, y_screen, y_cal = train_test_split(X_train_s, y_train, test_size=0.3,
+                                                    random_state=42, stratify=y_train)
+screen = BalancedRandomForest(n_estimators=10, max_depth=6, random_state=42)
+screen.fit(X_screen, y_screen)
+cascade = CascadeClassifier(screen, model, target_recall=0.995).calibrate(X_cal, y_cal)
+y_pred_forest = model.predict(X_test_s)
+y_pred_cascade = cascade.predict(X_test_s)
+print("Share of rows scored by the forest:", cascade.pass_rate_)
+print("Recall: forest", recall_score(y_test, y_pred_forest),
+      " cascade", recall_score(y_test, y_pred_cascade))
+print("Frauds caught by the forest and cleared by the screen:",
+      int(((y_test == 1) & (y_pred_forest == 1) & (y_pred_cascade == 0)).sum()))
+
+"""# **Operating point instead of retraining**
+
+Recall is moved by the decision threshold of one fitted model rather than
+by refitting for every k or depth. The forest is fitted on part of the
+training split; the threshold is tuned on the other part, with bootstrap
+intervals, and checked on the test split.
+"""
+
+from sklearn.base import clone
+
+from evaluation import predictions
+from operating_point import threshold_sweep, tune_threshold
+
+tuned_model = clone(model).fit(X_screen, y_screen)
+cal_scores = tuned_model.predict_proba(X_cal)[:, 1]
+sweep = threshold_sweep(Evaluation(y_cal, cal_scores))
+plt.figure(figsize=(10, 6))
+plt.plot(sweep['threshold'][1:], sweep['precision'][1:], color='b', label='Precision')
+plt.plot(sweep['threshold'][1:], sweep['recall'][1:], color='r', label='Recall')
+plt.title('Precision Vs Recall for every threshold of one Random Forest')
+plt.xlabel('Threshold')
+plt.ylabel('Scores')
+plt.grid(True)
+plt.legend()
 plt.show()
-print("Classification Report:")
-print(classification_report(y_test, pred_s))
\ No newline at end of file
+
+test_scores = tuned_model.predict_proba(X_test_s)[:, 1]
+for goal in ({'target_recall': 0.9}, {'target_precision': 0.5}, {'cost_ratio': 100}):
+    point = tune_threshold(y_cal, cal_scores, **goal)
+    y_pred_tuned = predictions(test_scores, point.threshold, inclusive=True)
+    print(goal, " threshold", point.threshold, " CI", point.ci['threshold'])
+    print("  tuning rows: precision", point.precision, point.ci['precision'],
+          " recall", point.recall, point.ci['recall'])
+    print("  test rows: precision", precision_score(y_test, y_pred_tuned, zero_division=0),
+          " recall", recall_score(y_test, y_pred_tuned))
+
+"""# **Balanced Random Forest: balancing per tree**
+
+Instead of under-sampling once before the forest, every tree draws its own
+balanced bootstrap (all classes sized like the frauds) from the original
+training matrix, so the trees see different legitimate transactions and
+no resampled copy is built.
+"""
+
+from balanced_forest import BalancedRandomForest
+
+balanced_rf = BalancedRandomForest(n_estimators=100, max_depth=8, random_state=42,
+                                   n_jobs=os.cpu_count())
+balanced_rf.fit(X_train_s, y_train)
+print("Rows per tree:", balanced_rf.rows_per_tree_, " of", len(y_train))
+scores = balanced_rf.predict_proba(X_test_s)[:, 1]
+show_evaluation(Evaluation(y_test, scores), "Classifire = BalancedRandomForest")
+
+"""# **Hyperparameter search: Hyperband over every model family**
+
+One search over model family, k, depth, criterion, scaler and balancing
+replaces the k, depth and criterion loops above: candidates are trained on
+growing subsamples of the training split, scored on a held-out part of it,
+and the weaker two thirds are dropped at every step. The winner is then
+refitted on the whole training split and evaluated on the test split.
+"""
+
+from halving_search import HalvingSearch, candidate_name, fit_candidate, print_history
+from preprocessing_cache import SCALERS
+
+search = HalvingSearch(method='hyperband', n_workers=os.cpu_count()).fit(X_train, y_train)
+print_history(search.history_)
+print("Best:", candidate_name(search.best_), " average precision", search.best_score_)
+best_scaler = SCALERS[search.best_['scaler']]().fit(X_train)
+best_model = fit_candidate(search.best_, best_scaler.transform(X_train), y_train)
+scores = best_model.predict_proba(best_scaler.transform(X_test))[:, 1]
+show_evaluation(Evaluation(y_test, scores), "Classifire = " + candidate_name(search.best_))
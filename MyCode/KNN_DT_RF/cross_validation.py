@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Zero-copy, parallel cross-validation.
+
+``cross_val_score(knn, X_train, y_train, cv=10)`` builds ten copies of the
+training fold every time it is called, and the k-selection loop calls it
+once per k. Here:
+
+* stratified fold indices are computed once per (labels, folds, shuffle,
+  seed) and cached;
+* every fold works on index views of one shared array: ``BlockedKNN``
+  gathers the fold's training and test rows block by block, so no fold
+  copy of the data is ever made;
+* one neighbour search per fold at ``max(k_values)`` scores every k (see
+  ``knn_sweep``), and the folds run in parallel threads that share one
+  ``memory_limit``.
+
+The whole 11-k x 10-fold grid is therefore ten searches spread over the
+available cores.
+"""
+
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import StratifiedKFold
+from threadpoolctl import threadpool_limits
+
+from knn_engine import BlockedKNN
+from knn_sweep import sweep_predictions
+
+_fold_cache = {}
+
+
+def fold_indices(y, n_splits=10, shuffle=False, random_state=None):
+    """Cached stratified ``(train, test)`` index pairs for labels ``y``.
+
+    Without shuffling the folds are those of ``cross_val_score(..., cv=n)``
+    for a classifier. The cache key includes a hash of ``y``, so the same
+    split reuses its folds across every call.
+    """
+    y = np.ascontiguousarray(y)
+    key = (hashlib.sha1(y.tobytes()).hexdigest(), y.dtype.str, n_splits, shuffle,
+           random_state if shuffle else None)
+    if key not in _fold_cache:
+        splitter = StratifiedKFold(n_splits, shuffle=shuffle,
+                                   random_state=random_state if shuffle else None)
+        folds = []
+        for train, test in splitter.split(np.zeros(len(y)), y):
+            train.flags.writeable = False
+            test.flags.writeable = False
+            folds.append((train, test))
+        _fold_cache[key] = tuple(folds)
+    return _fold_cache[key]
+
+
+def _run_folds(task, folds, n_jobs):
+    n_jobs = min(n_jobs or os.cpu_count(), len(folds))
+    if n_jobs == 1:
+        return [task(fold) for fold in folds]
+    # Each fold is one thread; keep BLAS single-threaded inside them.
+    with threadpool_limits(limits=1, user_api="blas"), ThreadPoolExecutor(n_jobs) as pool:
+        return list(pool.map(task, folds))
+
+
+def cross_val_knn_sweep(X, y, k_values=range(1, 12), cv=10, scoring=accuracy_score,
+                        n_jobs=None, shuffle=False, random_state=None,
+                        memory_limit=256 * 2**20, **engine_params):
+    """Cross-validated score of every k in ``k_values``.
+
+    Returns an (n_k, cv) array; row ``i`` matches
+    ``cross_val_score(KNeighborsClassifier(k_values[i]), X, y, cv=cv)``.
+    ``memory_limit`` bounds the distance tiles of all the folds running at
+    once: each of the ``n_jobs`` fold searches gets an equal share.
+    """
+    X = np.asarray(X)
+    y = np.asarray(y)
+    k_values = list(k_values)
+    classes, y_codes = np.unique(y, return_inverse=True)
+    folds = fold_indices(y, cv, shuffle, random_state)
+    n_jobs = min(n_jobs or os.cpu_count(), len(folds))
+
+    def task(fold):
+        train, test = fold
+        index = BlockedKNN(max(k_values), memory_limit=memory_limit / n_jobs,
+                           **engine_params).fit(X, sample_index=train)
+        ind = index.kneighbors(X, return_distance=False, query_index=test)
+        predictions = sweep_predictions(y_codes[train][ind], classes, k_values)
+        return [scoring(y[test], predictions[k]) for k in k_values]
+
+    return np.array(_run_folds(task, folds, n_jobs)).T
+
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""Cached loader for the Credit Card Fraud Detection dataset.
+
+The first run converts ``creditcard.csv`` into a compact columnar cache
+(float32 features, int8 ``Class``) stored as ``.npy`` files. Later runs
+memory-map the cache instead of parsing ~150 MB of CSV text again.
+
+The cache is keyed by the SHA-256 of the source file, so a new version of
+the CSV gets a new cache entry. The CSV is looked up locally first and
+``kagglehub`` is only used when no local copy exists, so the loader works
+fully offline once the file (or its cache) is on disk.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+KAGGLE_DATASET = "mlg-ulb/creditcardfraud"
+CSV_NAME = "creditcard.csv"
+TARGET = "Class"
+FEATURES = ["Time"] + [f"V{i}" for i in range(1, 29)] + ["Amount"]
+COLUMNS = FEATURES + [TARGET]
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_REPO_DATA = os.path.normpath(os.path.join(_HERE, "..", "..", "Data"))
+_INDEX_NAME = "index.json"
+
+
+def default_cache_dir():
+    """Return the cache directory (``$CREDITCARD_CACHE`` or ~/.cache)."""
+    return os.environ.get(
+        "CREDITCARD_CACHE",
+        os.path.join(os.path.expanduser("~"), ".cache", "creditcardfraud"))
+
+
+def find_creditcard_csv(path=None, download=True):
+    """Locate ``creditcard.csv`` on disk, downloading it only as a last resort.
+
+    The search order is: ``path`` (file or directory), ``$CREDITCARD_CSV``,
+    the repository ``Data/`` folder and finally ``kagglehub``. Returns None
+    when the file cannot be found and the download is unavailable.
+    """
+    candidates = [path, os.environ.get("CREDITCARD_CSV"), _REPO_DATA]
+    for candidate in candidates:
+        if not candidate:
+            continue
+        if os.path.isdir(candidate):
+            candidate = os.path.join(candidate, CSV_NAME)
+        if os.path.isfile(candidate):
+            return os.path.abspath(candidate)
+
+    if not download:
+        return None
+    try:
+        import kagglehub
+        folder = kagglehub.dataset_download(KAGGLE_DATASET)
+    except Exception as exc:  # offline, missing package or credentials
+        print("kagglehub download unavailable:", exc)
+        return None
+    candidate = os.path.join(folder, CSV_NAME)
+    return candidate if os.path.isfile(candidate) else None
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Hash a file in fixed-size blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, _INDEX_NAME)) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_index(cache_dir, index):
+    tmp = os.path.join(cache_dir, _INDEX_NAME + ".tmp")
+    with open(tmp, "w") as fh:
+        json.dump(index, fh, indent=1)
+    os.replace(tmp, os.path.join(cache_dir, _INDEX_NAME))
+
+
+def source_key(csv_path, cache_dir):
+    """Return the content hash of ``csv_path``.
+
+    Hashing 150 MB on every run would defeat the cache, so the hash is
+    remembered per (path, size, mtime) in a small index file and the file is
+    only re-hashed when one of those changes.
+    """
+    stat = os.stat(csv_path)
+    stamp = [stat.st_size, stat.st_mtime_ns]
+    index = _read_index(cache_dir)
+    entry = index.get(csv_path)
+    if entry and entry["stamp"] == stamp:
+        return entry["sha256"]
+    key = file_sha256(csv_path)
+    index[csv_path] = {"stamp": stamp, "sha256": key}
+    _write_index(cache_dir, index)
+    return key
+
+
+def build_cache(csv_path, entry_dir, chunksize=100_000):
+    """Convert the CSV into the columnar ``.npy`` cache at ``entry_dir``.
+
+    The CSV is parsed in chunks straight into float32/int8 so the float64
+    frame is never materialised. The entry is written to a temporary
+    directory and renamed into place, so a crash never leaves half a cache.
+    """
+    parent = os.path.dirname(entry_dir)
+    os.makedirs(parent, exist_ok=True)
+    header = pd.read_csv(csv_path, nrows=0).columns.tolist()
+    missing = [c for c in COLUMNS if c not in header]
+    if missing:
+        raise ValueError(f"{csv_path} is missing columns {missing}")
+
+    dtypes = {c: np.float32 for c in FEATURES}
+    dtypes[TARGET] = np.int8
+    X_parts, y_parts = [], []
+    for chunk in pd.read_csv(csv_path, usecols=COLUMNS, dtype=dtypes,
+                             chunksize=chunksize):
+        X_parts.append(chunk[FEATURES].to_numpy(np.float32))
+        y_parts.append(chunk[TARGET].to_numpy(np.int8))
+    X = np.concatenate(X_parts)
+    del X_parts
+    y = np.concatenate(y_parts)
+
+    tmp = tempfile.mkdtemp(prefix=".tmp-", dir=parent)
+    try:
+        # Column-major so every feature is one contiguous column on disk.
+        np.save(os.path.join(tmp, "features.npy"), np.asfortranarray(X))
+        np.save(os.path.join(tmp, "target.npy"), y)
+        with open(os.path.join(tmp, "meta.json"), "w") as fh:
+            json.dump({"source": csv_path, "rows": int(len(y)),
+                       "features": FEATURES, "target": TARGET}, fh, indent=1)
+        if os.path.isdir(entry_dir):  # another process won the race
+            shutil.rmtree(tmp)
+        else:
+            os.replace(tmp, entry_dir)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return entry_dir
+
+
+def _latest_entry(cache_dir):
+    entries = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir)
+               if os.path.isfile(os.path.join(cache_dir, name, "meta.json"))]
+    return max(entries, key=os.path.getmtime) if entries else None
+
+
+def load_creditcard_arrays(path=None, cache_dir=None, download=True):
+    """Return ``(X, y, feature_names)`` memory-mapped from the cache.
+
+    ``X`` is a read-only float32 (n, 30) memmap in Fortran order and ``y`` an
+    int8 memmap. If the CSV is nowhere to be found the most recent cache
+    entry is used, so the loader keeps working offline after the first run.
+    """
+    cache_dir = cache_dir or default_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+
+    csv_path = find_creditcard_csv(path, download=download)
+    if csv_path is not None:
+        entry_dir = os.path.join(cache_dir, source_key(csv_path, cache_dir))
+        if not os.path.isfile(os.path.join(entry_dir, "meta.json")):
+            build_cache(csv_path, entry_dir)
+    else:
+        entry_dir = _latest_entry(cache_dir)
+        if entry_dir is None:
+            raise FileNotFoundError(
+                f"{CSV_NAME} not found and no cached copy in {cache_dir}; "
+                "see 'Data/How to download this data?.txt'")
+
+    X = np.load(os.path.join(entry_dir, "features.npy"), mmap_mode="r")
+    y = np.load(os.path.join(entry_dir, "target.npy"), mmap_mode="r")
+    return X, y, list(FEATURES)
+
+
+def load_creditcard(path=None, cache_dir=None, download=True):
+    """Return the dataset as a DataFrame with float32 features and int8 Class.
+
+    Drop-in replacement for ``pd.read_csv(path + '/creditcard.csv')`` at
+    roughly half the resident memory.
+    """
+    X, y, features = load_creditcard_arrays(path, cache_dir, download)
+    df = pd.DataFrame(np.asarray(X), columns=features, copy=False)
+    df[TARGET] = np.asarray(y)
+    return df
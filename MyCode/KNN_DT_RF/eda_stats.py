@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""Single-pass streaming statistics for the EDA section.
+
+``df.describe()``, ``df.corr()`` and one ``distplot`` per column each scan
+the whole float64 frame again, and all of them need it in memory.
+``StreamingStats`` collects everything those calls show in one pass over
+chunks of rows, with memory independent of the row count:
+
+* count, mean, variance, skewness and kurtosis per column, merged chunk by
+  chunk with the pairwise (Welford / Chan-Pebay) update formulas;
+* the co-moment matrix, updated the same way, for the correlation matrix;
+* a quantile sketch per column (a KLL-style compactor stack: ``sketch_size``
+  rows per level, level ``l`` rows weigh ``2**l``). It is exact while the
+  data fits in level 0, with a rank error of a fraction of a percent beyond;
+* a fixed-bin histogram per column (``n_bins`` fine bins whose width
+  doubles, merging neighbours, whenever a chunk falls outside the range),
+  re-binned to any coarser bin count for plotting.
+
+``eda_summary`` runs the pass over ``creditcard.csv`` (or the cached
+arrays when the CSV is gone) and keeps the result on disk, keyed by the
+file's content hash like the ``data_loader`` cache, so later runs load
+under 2 MB of summaries instead of scanning the data. The plots draw from
+it.
+
+    stats = eda_summary()
+    stats.describe()                 # like df.describe(), plus skew and kurtosis
+    plot_correlation(stats)
+    for column in stats.columns:
+        plot_histogram(stats, column, bins=40)
+"""
+
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from data_loader import (COLUMNS, FEATURES, TARGET, _latest_entry, default_cache_dir,
+                         find_creditcard_csv, source_key)
+
+_META = "stats.json"
+_ARRAYS = ("mean", "m2", "m3", "m4", "min", "max", "comoment", "hist", "hist_lo",
+           "hist_width")
+
+
+class StreamingStats:
+    """Moments, correlations, quantile sketches and histograms, updated per chunk."""
+
+    def __init__(self, columns, n_bins=1024, sketch_size=2048, random_state=0):
+        self.columns = list(columns)
+        self.n_bins = n_bins
+        self.sketch_size = sketch_size
+        self.random_state = random_state
+        self._rng = np.random.default_rng(random_state)
+        d = len(self.columns)
+        self.count = 0
+        self.mean = np.zeros(d)
+        self.m2, self.m3, self.m4 = np.zeros(d), np.zeros(d), np.zeros(d)
+        self.min, self.max = np.full(d, np.inf), np.full(d, -np.inf)
+        self.comoment = np.zeros((d, d))
+        self.hist = np.zeros((d, n_bins), dtype=np.int64)
+        self.hist_lo, self.hist_width = np.zeros(d), np.zeros(d)
+        self.levels = []
+
+    # -- updates -----------------------------------------------------------
+
+    def update(self, chunk):
+        """Add a (rows, columns) block (array or DataFrame with ``columns``)."""
+        if isinstance(chunk, pd.DataFrame):
+            chunk = chunk[self.columns]
+        X = np.asarray(chunk, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != len(self.columns):
+            raise ValueError(f"expected (rows, {len(self.columns)}) values, got {X.shape}")
+        if not len(X):
+            return self
+        self._update_histograms(X)
+        self._update_moments(X)
+        self._update_sketch(0, X)
+        return self
+
+    def _update_moments(self, X):
+        nb = len(X)
+        mean_b = X.mean(axis=0)
+        D = X - mean_b
+        D2 = D * D
+        m2_b, m3_b, m4_b = D2.sum(axis=0), (D2 * D).sum(axis=0), (D2 * D2).sum(axis=0)
+        comoment_b = D.T @ D
+
+        na, n = self.count, self.count + nb
+        delta = mean_b - self.mean
+        m2_a, m3_a = self.m2, self.m3
+        self.m4 = (self.m4 + m4_b + delta ** 4 * na * nb * (na * na - na * nb + nb * nb) / n ** 3
+                   + 6 * delta ** 2 * (na * na * m2_b + nb * nb * m2_a) / n ** 2
+                   + 4 * delta * (na * m3_b - nb * m3_a) / n)
+        self.m3 = (m3_a + m3_b + delta ** 3 * na * nb * (na - nb) / n ** 2
+                   + 3 * delta * (na * m2_b - nb * m2_a) / n)
+        self.m2 = m2_a + m2_b + delta ** 2 * na * nb / n
+        self.comoment += comoment_b + np.outer(delta, delta) * (na * nb / n)
+        self.mean = self.mean + delta * (nb / n)
+        self.count = n
+        self.min = np.minimum(self.min, X.min(axis=0))
+        self.max = np.maximum(self.max, X.max(axis=0))
+
+    def _update_histograms(self, X):
+        lo_b, hi_b = X.min(axis=0), X.max(axis=0)
+        for j in range(len(self.columns)):
+            if self.count == 0:
+                span = hi_b[j] - lo_b[j]
+                self.hist_lo[j] = lo_b[j]
+                self.hist_width[j] = span / self.n_bins * (1 + 1e-9) if span > 0 else 1.0
+            while lo_b[j] < self.hist_lo[j] or hi_b[j] > self._hist_hi(j):
+                self._widen(j, grow_down=lo_b[j] < self.hist_lo[j])
+            bins = ((X[:, j] - self.hist_lo[j]) / self.hist_width[j]).astype(np.int64)
+            np.clip(bins, 0, self.n_bins - 1, out=bins)
+            self.hist[j] += np.bincount(bins, minlength=self.n_bins)
+
+    def _hist_hi(self, j):
+        return self.hist_lo[j] + self.hist_width[j] * self.n_bins
+
+    def _widen(self, j, grow_down):
+        """Double the bin width of column ``j``, extending its range on one side."""
+        half = self.n_bins // 2
+        merged = self.hist[j].reshape(half, 2).sum(axis=1)
+        self.hist[j] = 0
+        if grow_down:
+            self.hist[j, half:] = merged
+            self.hist_lo[j] -= self.hist_width[j] * self.n_bins
+        else:
+            self.hist[j, :half] = merged
+        self.hist_width[j] *= 2
+
+    def _update_sketch(self, level, X):
+        # Level ``level`` holds rows of weight 2**level. A full level is
+        # sorted per column and every other value (random offset) moves up.
+        while len(self.levels) <= level:
+            self.levels.append(np.empty((0, len(self.columns))))
+        buffer = np.concatenate([self.levels[level], X]) if len(self.levels[level]) else X
+        if len(buffer) < 2 * self.sketch_size:
+            self.levels[level] = buffer
+            return
+        keep = len(buffer) % 2
+        self.levels[level] = buffer[len(buffer) - keep:].copy()
+        compacted = np.sort(buffer[:len(buffer) - keep], axis=0)
+        self._update_sketch(level + 1, compacted[self._rng.integers(2)::2])
+
+    # -- results -----------------------------------------------------------
+
+    @property
+    def var(self):
+        return self.m2 / (self.count - 1)
+
+    @property
+    def std(self):
+        return np.sqrt(self.var)
+
+    @property
+    def skew(self):
+        """Bias-adjusted skewness, as ``DataFrame.skew``."""
+        n = self.count
+        with np.errstate(divide="ignore", invalid="ignore"):
+            g1 = np.sqrt(n) * self.m3 / self.m2 ** 1.5
+        return g1 * np.sqrt(n * (n - 1)) / (n - 2)
+
+    @property
+    def kurtosis(self):
+        """Bias-adjusted excess kurtosis, as ``DataFrame.kurt``."""
+        n = self.count
+        with np.errstate(divide="ignore", invalid="ignore"):
+            g2 = n * self.m4 / self.m2 ** 2 - 3
+        return ((n + 1) * g2 + 6) * (n - 1) / ((n - 2) * (n - 3))
+
+    def quantile(self, q):
+        """Quantiles ``q`` of every column: array of shape (len(q), columns)."""
+        q = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if len(self.levels) == 1:  # nothing compacted yet: exact
+            return np.quantile(self.levels[0], q, axis=0)
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** i)
+                                  for i, level in enumerate(self.levels)])
+        order = np.argsort(values, axis=0)
+        values = np.take_along_axis(values, order, axis=0)
+        cumulative = np.cumsum(weights[order], axis=0)
+        out = np.empty((len(q), len(self.columns)))
+        for j in range(len(self.columns)):
+            # The value whose weighted rank range covers rank q * count.
+            rank = q * cumulative[-1, j]
+            at = np.searchsorted(cumulative[:, j], rank, side="left")
+            out[:, j] = values[np.minimum(at, len(values) - 1), j]
+        out[q <= 0] = self.min
+        out[q >= 1] = self.max
+        return out
+
+    def describe(self, percentiles=(0.25, 0.5, 0.75)):
+        """``df.describe()`` from the summary, plus skewness and kurtosis rows."""
+        rows = {"count": np.full(len(self.columns), float(self.count)), "mean": self.mean,
+                "std": self.std, "min": self.min}
+        for p, values in zip(percentiles, self.quantile(percentiles)):
+            rows[f"{p * 100:g}%"] = values
+        rows.update({"max": self.max, "skew": self.skew, "kurtosis": self.kurtosis})
+        return pd.DataFrame(rows, index=self.columns).T
+
+    def corr(self):
+        """Pearson correlation matrix, as ``df.corr()``."""
+        scale = np.sqrt(np.diag(self.comoment))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = self.comoment / np.outer(scale, scale)
+        np.clip(corr, -1.0, 1.0, out=corr)
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+    def histogram(self, column, bins=40):
+        """``(counts, edges)`` of ``column`` with about ``bins`` bins over [min, max]."""
+        j = self.columns.index(column)
+        lo, width = self.hist_lo[j], self.hist_width[j]
+        first = int(np.clip((self.min[j] - lo) // width, 0, self.n_bins - 1))
+        last = int(np.clip((self.max[j] - lo) // width, 0, self.n_bins - 1))
+        group = -(-(last - first + 1) // bins)
+        starts = np.arange(first, last + 1, group)
+        counts = np.add.reduceat(self.hist[j, :last + 1], starts)
+        edges = lo + width * np.append(starts, min(starts[-1] + group, self.n_bins))
+        return counts, edges
+
+    # -- persistence -------------------------------------------------------
+
+    def save(self, path):
+        """Write the summary to the directory ``path`` (atomically)."""
+        path = os.path.abspath(path)
+        parent = os.path.dirname(path)
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=parent)
+        try:
+            for name in _ARRAYS:
+                np.save(os.path.join(tmp, name + ".npy"), getattr(self, name))
+            for i, level in enumerate(self.levels):
+                np.save(os.path.join(tmp, f"sketch-{i}.npy"), level)
+            with open(os.path.join(tmp, _META), "w") as fh:
+                json.dump({"columns": self.columns, "count": int(self.count),
+                           "n_bins": self.n_bins, "sketch_size": self.sketch_size,
+                           "random_state": self.random_state,
+                           "levels": len(self.levels)}, fh, indent=1)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            os.replace(tmp, path)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return path
+
+
+def load_stats(path):
+    """Load a ``StreamingStats`` written by ``save``."""
+    with open(os.path.join(path, _META)) as fh:
+        meta = json.load(fh)
+    stats = StreamingStats(meta["columns"], meta["n_bins"], meta["sketch_size"],
+                           meta["random_state"])
+    stats.count = meta["count"]
+    for name in _ARRAYS:
+        setattr(stats, name, np.load(os.path.join(path, name + ".npy")))
+    stats.levels = [np.load(os.path.join(path, f"sketch-{i}.npy"))
+                    for i in range(meta["levels"])]
+    return stats
+
+
+def summarize_chunks(chunks, columns=COLUMNS, **params):
+    """One pass of ``StreamingStats`` over an iterable of row blocks."""
+    stats = StreamingStats(columns, **params)
+    for chunk in chunks:
+        stats.update(chunk)
+    return stats
+
+
+def _cached_chunks(entry_dir, chunksize):
+    X = np.load(os.path.join(entry_dir, "features.npy"), mmap_mode="r")
+    y = np.load(os.path.join(entry_dir, "target.npy"), mmap_mode="r")
+    for start in range(0, len(y), chunksize):
+        yield np.column_stack([X[start:start + chunksize], y[start:start + chunksize]])
+
+
+def eda_summary(path=None, cache_dir=None, chunksize=200_000, download=True, refresh=False,
+                **params):
+    """``StreamingStats`` of ``creditcard.csv``, computed once and cached on disk.
+
+    The CSV is read in float64 chunks, so the result matches the statistics
+    of the full-precision frame. Without a CSV, the most recent
+    ``data_loader`` cache entry (float32) is summarized instead.
+    """
+    cache_dir = cache_dir or default_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+    csv_path = find_creditcard_csv(path, download=download)
+    if csv_path is not None:
+        key = source_key(csv_path, cache_dir)
+    else:
+        entry_dir = _latest_entry(cache_dir)
+        if entry_dir is None:
+            raise FileNotFoundError(f"creditcard.csv not found and no cached copy in {cache_dir}")
+        key = os.path.basename(entry_dir) + "-cache"
+    defaults = {"n_bins": 1024, "sketch_size": 2048}
+    defaults.update(params)
+    name = f"{key}-b{defaults['n_bins']}-k{defaults['sketch_size']}"
+    stats_dir = os.path.join(cache_dir, "eda", name)
+    if not refresh and os.path.isfile(os.path.join(stats_dir, _META)):
+        return load_stats(stats_dir)
+
+    if csv_path is not None:
+        dtypes = {c: np.float64 for c in FEATURES}
+        dtypes[TARGET] = np.float64
+        chunks = pd.read_csv(csv_path, usecols=COLUMNS, dtype=dtypes, chunksize=chunksize)
+    else:
+        chunks = _cached_chunks(entry_dir, chunksize)
+    stats = summarize_chunks(chunks, COLUMNS, **defaults)
+    stats.save(stats_dir)
+    return stats
+
+
+def plot_histogram(stats, column, bins=40, ax=None):
+    """Bar plot of ``column``'s histogram (the ``distplot`` of the EDA section)."""
+    import matplotlib.pyplot as plt
+
+    ax = ax or plt.figure(figsize=(8, 4)).gca()
+    counts, edges = stats.histogram(column, bins)
+    ax.stairs(counts, edges, fill=True, edgecolor="black")
+    ax.set_title(f"Distribution of {column}")
+    ax.set_xlabel(column)
+    ax.set_ylabel("count")
+    return ax
+
+
+def plot_correlation(stats, ax=None):
+    """Heatmap of the correlation matrix."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    ax = ax or plt.figure(figsize=(12, 10)).gca()
+    sns.heatmap(stats.corr(), annot=False, cmap="coolwarm", linewidths=0.5, ax=ax)
+    ax.set_title("Correlation Matrix")
+    return ax
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""Evaluation from one sort of the predicted probabilities.
+
+The script's model sections each called ``accuracy_score``,
+``confusion_matrix``, ``roc_auc_score``, ``RocCurveDisplay`` and
+``classification_report`` on the same hard 0/1 prediction vector: five
+scans of the test labels, and an ROC curve with a single point. An
+``Evaluation`` takes the fraud scores (``predict_proba(X)[:, 1]``) instead,
+sorts them once and keeps, for every distinct score, the number of true
+and false positives above it. Everything else is read off those counts:
+
+* the confusion matrix at any threshold (a binary search);
+* the full ROC and precision-recall curves, ROC AUC and average precision,
+  equal to sklearn's ``roc_curve``, ``roc_auc_score``,
+  ``precision_recall_curve`` and ``average_precision_score``;
+* accuracy, precision, recall, F1 and the ``classification_report`` text.
+
+At the default threshold 0.5 a row is predicted positive when its score is
+strictly above it, which is what ``predict`` does with two classes (a
+tied vote goes to class 0). ``evaluate_many`` evaluates several models (or
+the depths of one forest) with a single batched sort.
+
+    ev = Evaluation(y_test, model.predict_proba(X_test_s)[:, 1])
+    ev.confusion()                  # == confusion_matrix(y_test, model.predict(X_test_s))
+    ev.roc_auc()                    # from the probabilities, not the 0/1 labels
+    print(ev.report())
+    evs = evaluate_many(y_test, {"rf": p_rf, "id3": p_id3})
+"""
+
+import numpy as np
+
+
+class Evaluation:
+    """Cumulative true/false positive counts of one score vector, by score."""
+
+    def __init__(self, y_true, scores, pos_label=1):
+        y = np.asarray(y_true) == pos_label
+        scores = np.asarray(scores, dtype=np.float64)
+        order = np.argsort(-scores, kind="stable")
+        self._set_sorted(y[order], scores[order])
+
+    @classmethod
+    def _from_sorted(cls, y_sorted, scores_sorted):
+        ev = cls.__new__(cls)
+        ev._set_sorted(y_sorted, scores_sorted)
+        return ev
+
+    def _set_sorted(self, y_sorted, scores_sorted):
+        n = len(y_sorted)
+        # Last row of every run of equal scores: one point per distinct score.
+        last = np.append(np.flatnonzero(scores_sorted[1:] != scores_sorted[:-1]), n - 1)
+        self.thresholds = scores_sorted[last]  # descending
+        self.tps = np.cumsum(y_sorted, dtype=np.int64)[last]
+        self.fps = last + 1 - self.tps
+        self.n = n
+        self.n_pos = int(self.tps[-1]) if n else 0
+        self.n_neg = n - self.n_pos
+
+    # -- counts at a threshold ---------------------------------------------
+
+    def counts(self, threshold=0.5, inclusive=False):
+        """``(tp, fp)`` of the rows with score above ``threshold`` (``>=`` if inclusive)."""
+        side = "right" if inclusive else "left"
+        k = np.searchsorted(-self.thresholds, -np.asarray(threshold, dtype=np.float64), side)
+        tps = np.concatenate([[0], self.tps])
+        fps = np.concatenate([[0], self.fps])
+        return tps[k], fps[k]
+
+    def confusion(self, threshold=0.5, inclusive=False):
+        """``[[tn, fp], [fn, tp]]``, as ``confusion_matrix``."""
+        tp, fp = (int(c) for c in self.counts(threshold, inclusive))
+        return np.array([[self.n_neg - fp, fp], [self.n_pos - tp, tp]])
+
+    def metrics(self, threshold=0.5, inclusive=False):
+        """Accuracy, precision, recall, F1, specificity and the threshold-free AUCs."""
+        (tn, fp), (fn, tp) = self.confusion(threshold, inclusive)
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / self.n_pos if self.n_pos else 0.0
+        return {
+            "accuracy": (tp + tn) / self.n,
+            "precision": precision,
+            "recall": recall,
+            "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+            "specificity": tn / self.n_neg if self.n_neg else 0.0,
+            "roc_auc": self.roc_auc(),
+            "average_precision": self.average_precision(),
+        }
+
+    def accuracy(self, threshold=0.5, inclusive=False):
+        (tn, _), (_, tp) = self.confusion(threshold, inclusive)
+        return (tp + tn) / self.n
+
+    # -- curves --------------------------------------------------------------
+
+    def roc_curve(self):
+        """``(fpr, tpr, thresholds)`` as ``roc_curve(..., drop_intermediate=False)``."""
+        fpr = np.concatenate([[0], self.fps]) / self.n_neg
+        tpr = np.concatenate([[0], self.tps]) / self.n_pos
+        return fpr, tpr, np.concatenate([[np.inf], self.thresholds])
+
+    def roc_auc(self):
+        fpr, tpr, _ = self.roc_curve()
+        return float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1])) / 2)
+
+    def pr_curve(self):
+        """``(precision, recall, thresholds)`` as ``precision_recall_curve``."""
+        predicted = self.tps + self.fps
+        precision = np.divide(self.tps, predicted, out=np.zeros(len(predicted)),
+                              where=predicted != 0)
+        recall = self.tps / self.n_pos if self.n_pos else np.ones(len(self.tps))
+        return (np.append(precision[::-1], 1.0), np.append(recall[::-1], 0.0),
+                self.thresholds[::-1])
+
+    def average_precision(self):
+        precision, recall, _ = self.pr_curve()
+        return float(-np.sum(np.diff(recall) * precision[:-1]))
+
+    # -- report --------------------------------------------------------------
+
+    def report(self, threshold=0.5, inclusive=False, digits=2, output_dict=False):
+        """``classification_report`` text (or dict) for classes 0 and 1."""
+        (tn, fp), (fn, tp) = self.confusion(threshold, inclusive)
+        rows = {}
+        for name, hit, false_alarm, support in (("0", tn, fn, self.n_neg),
+                                                ("1", tp, fp, self.n_pos)):
+            precision = hit / (hit + false_alarm) if hit + false_alarm else 0.0
+            recall = hit / support if support else 0.0
+            f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+            rows[name] = {"precision": precision, "recall": recall, "f1-score": f1,
+                          "support": support}
+        averages = {}
+        for name, weights in (("macro avg", (0.5, 0.5)),
+                              ("weighted avg", (self.n_neg / self.n, self.n_pos / self.n))):
+            averages[name] = {key: sum(w * rows[c][key] for w, c in zip(weights, "01"))
+                              for key in ("precision", "recall", "f1-score")}
+            averages[name]["support"] = self.n
+        accuracy = (tp + tn) / self.n
+        if output_dict:
+            return {**rows, "accuracy": accuracy, **averages}
+
+        # Same layout as sklearn's classification_report.
+        headers = ["precision", "recall", "f1-score", "support"]
+        width = max(len("weighted avg"), digits)
+        text = ("{:>{width}s} " + " {:>9}" * 4).format("", *headers, width=width) + "\n\n"
+        row_fmt = "{:>{width}s} " + " {:>9.{digits}f}" * 3 + " {:>9}\n"
+        for name, row in rows.items():
+            text += row_fmt.format(name, *row.values(), width=width, digits=digits)
+        accuracy_fmt = "{:>{width}s} " + " {:>9.{digits}}" * 2 + " {:>9.{digits}f}" + " {:>9}\n"
+        text += "\n" + accuracy_fmt.format("accuracy", "", "", accuracy, self.n, width=width,
+                                           digits=digits)
+        for name, row in averages.items():
+            text += row_fmt.format(name, *row.values(), width=width, digits=digits)
+        return text
+
+
+def predictions(scores, threshold=0.5, inclusive=False):
+    """0/1 predictions of ``scores`` under the ``Evaluation`` threshold rule."""
+    scores = np.asarray(scores)
+    return (scores >= threshold if inclusive else scores > threshold).astype(np.int64)
+
+
+def evaluate_many(y_true, scores, pos_label=1):
+    """``Evaluation`` of every score vector, from one batched sort.
+
+    ``scores`` is a dict ``{name: scores}`` or a (n_models, n_rows) array;
+    the result has the same keys (or is a list).
+    """
+    names = list(scores) if isinstance(scores, dict) else None
+    S = np.asarray([scores[name] for name in names] if names else scores, dtype=np.float64)
+    y = np.asarray(y_true) == pos_label
+    order = np.argsort(-S, axis=1, kind="stable")
+    S_sorted = np.take_along_axis(S, order, axis=1)
+    y_sorted = y[order]
+    evaluations = [Evaluation._from_sorted(y_row, s_row)
+                   for y_row, s_row in zip(y_sorted, S_sorted)]
+    return dict(zip(names, evaluations)) if names else evaluations
+
+
+# -- notebook display ----------------------------------------------------------
+
+
+def plot_confusion(ev, threshold=0.5, ax=None, title="confusion matrix"):
+    """Annotated confusion matrix heatmap."""
+    import matplotlib.pyplot as plt
+
+    ax = ax or plt.subplots(figsize=(10, 6))[1]
+    cm = ev.confusion(threshold)
+    image = ax.imshow(cm, cmap="Blues")
+    ax.figure.colorbar(image, ax=ax)
+    for (i, j), count in np.ndenumerate(cm):
+        ax.text(j, i, f"{count:g}", ha="center", va="center",
+                color="white" if count > cm.max() / 2 else "black")
+    ax.set_xticks([0, 1])
+    ax.set_yticks([0, 1])
+    ax.set_xlabel("Prediction")
+    ax.set_ylabel("Actual")
+    ax.set_title(title)
+    return ax
+
+
+def plot_roc(ev, ax=None, name=None):
+    """ROC curve over every distinct score, with its AUC in the legend."""
+    import matplotlib.pyplot as plt
+
+    ax = ax or plt.subplots(figsize=(6, 6))[1]
+    fpr, tpr, _ = ev.roc_curve()
+    label = f"AUC = {ev.roc_auc():.3f}" if name is None else f"{name} (AUC = {ev.roc_auc():.3f})"
+    ax.plot(fpr, tpr, label=label)
+    ax.plot([0, 1], [0, 1], linestyle="--", color="grey")
+    ax.set_xlabel("False Positive Rate")
+    ax.set_ylabel("True Positive Rate")
+    ax.legend(loc="lower right")
+    return ax
+
+
+def plot_pr(ev, ax=None, name=None):
+    """Precision-recall curve, with the average precision in the legend."""
+    import matplotlib.pyplot as plt
+
+    ax = ax or plt.subplots(figsize=(6, 6))[1]
+    precision, recall, _ = ev.pr_curve()
+    ap = ev.average_precision()
+    ax.step(recall, precision, where="post",
+            label=f"AP = {ap:.3f}" if name is None else f"{name} (AP = {ap:.3f})")
+    ax.set_xlabel("Recall")
+    ax.set_ylabel("Precision")
+    ax.legend(loc="lower left")
+    return ax
+
+
+def show_evaluation(ev, label=""):
+    """The script's per-model block: accuracy, confusion matrix, ROC, report."""
+    import matplotlib.pyplot as plt
+
+    print(f"{label}  &  Accuracy Score" if label else "Accuracy Score", ev.accuracy())
+    plot_confusion(ev)
+    plt.show()
+    print(ev.roc_auc())
+    plot_roc(ev)
+    plt.show()
+    print("Classification Report:")
+    print(ev.report())
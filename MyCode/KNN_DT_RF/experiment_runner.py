@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""Parallel experiment runner with shared-memory datasets.
+
+The script's model sections are ~15 hand-written blocks that each combine a
+model (KNN, ID3 tree, C4.5 tree, random forest) with a preprocessing (raw,
+standardized, standardized + balanced) and a split (stratified or plain).
+Here they are declared as data in ``EXPERIMENTS`` and run concurrently in a
+process pool.
+
+The feature matrix and labels are copied once into
+``multiprocessing.shared_memory`` blocks; workers attach to them by name
+instead of receiving a pickled copy per task. Each result carries the wall
+time and the peak traced (Python + NumPy) allocation of its configuration.
+
+    results = run_experiments(X, y, EXPERIMENTS, n_workers=4)
+"""
+
+import os
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.preprocessing import StandardScaler
+
+from balancing import balancement_weights
+from evaluation import Evaluation
+from knn_dedup import DedupKNNClassifier, balanced_reference
+from tree_engine import DecisionTree
+
+MODELS = {
+    "knn": KNeighborsClassifier,
+    "id3": lambda **p: DecisionTree(criterion="id3", **p),
+    "c45": lambda **p: DecisionTree(criterion="c45", **p),
+    "rf": RandomForestClassifier,
+}
+
+
+@dataclass
+class Experiment:
+    """One model/preprocessing/split configuration.
+
+    ``preprocessing`` is "raw", "standardized" or "balanced" (standardized,
+    then balanced as in ``dataset_balancement``: KNN uses the deduplicated
+    reference set, trees and forests use ``balancement_weights``).
+    ``features`` restricts the columns (e.g. the forward-selected five).
+    """
+
+    name: str
+    model: str
+    params: dict = field(default_factory=dict)
+    preprocessing: str = "raw"
+    stratify: bool = True
+    features: list = None
+    test_size: float = 0.3
+    random_state: int = 42
+
+
+SELECTED = [10, 12, 14, 16, 17]  # V10, V12, V14, V16, V17 column positions
+
+EXPERIMENTS = [
+    Experiment("knn k=5 raw", "knn", {"n_neighbors": 5}),
+    Experiment("knn k=3 raw", "knn", {"n_neighbors": 3}),
+    Experiment("knn k=3 balanced", "knn", {"n_neighbors": 3}, "balanced", False),
+    Experiment("knn k=7 balanced", "knn", {"n_neighbors": 7}, "balanced", False),
+    Experiment("knn k=11 balanced", "knn", {"n_neighbors": 11}, "balanced", False),
+    Experiment("knn5 k=3 raw", "knn", {"n_neighbors": 3}, features=SELECTED),
+    Experiment("knn5 k=3 balanced", "knn", {"n_neighbors": 3}, "balanced", False, SELECTED),
+    Experiment("knn5 k=9 balanced", "knn", {"n_neighbors": 9}, "balanced", False, SELECTED),
+    Experiment("id3 raw", "id3"),
+    Experiment("c4.5 raw", "c45"),
+    Experiment("id3 balanced", "id3", {}, "balanced", False),
+    Experiment("c4.5 balanced", "c45", {}, "balanced", False),
+    Experiment("rf raw", "rf", {"n_estimators": 100, "random_state": 42}),
+    Experiment("rf balanced", "rf", {"n_estimators": 100, "random_state": 42},
+               "balanced", False),
+    Experiment("id3 depth=3 raw", "id3", {"max_depth": 3}),
+    Experiment("c4.5 depth=7 raw", "c45", {"max_depth": 7}),
+    Experiment("id3 depth=3 balanced", "id3", {"max_depth": 3}, "balanced", False),
+    Experiment("c4.5 depth=7 balanced", "c45", {"max_depth": 7}, "balanced", False),
+    Experiment("rf depth=9 raw", "rf", {"n_estimators": 100, "random_state": 42, "max_depth": 9}),
+    Experiment("rf depth=8 balanced", "rf",
+               {"n_estimators": 100, "random_state": 42, "max_depth": 8}, "balanced", False),
+]
+
+
+class SharedArray:
+    """A NumPy array copied once into a named shared-memory block."""
+
+    def __init__(self, array):
+        array = np.ascontiguousarray(array)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        self.spec = (self.shm.name, array.shape, array.dtype.str)
+        np.ndarray(array.shape, array.dtype, buffer=self.shm.buf)[...] = array
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+_shared = {}
+
+
+def _attach(x_spec, y_spec):
+    """Pool initializer: map the shared blocks into this worker."""
+    for key, (name, shape, dtype) in (("X", x_spec), ("y", y_spec)):
+        shm = shared_memory.SharedMemory(name=name)
+        _shared[key + "_shm"] = shm  # keep the mapping alive
+        _shared[key] = np.ndarray(shape, np.dtype(dtype), buffer=shm.buf)
+
+
+def run_experiment(exp, X, y):
+    """Fit and evaluate one ``Experiment``; returns a result dict."""
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    rows = np.arange(len(y))
+    train, test = train_test_split(rows, test_size=exp.test_size, random_state=exp.random_state,
+                                   stratify=y if exp.stratify else None)
+    if exp.features is None:
+        X_train, X_test = X[train], X[test]
+    else:
+        X_train, X_test = X[np.ix_(train, exp.features)], X[np.ix_(test, exp.features)]
+    y_train, y_test = y[train], y[test]
+    if exp.preprocessing in ("standardized", "balanced"):
+        scaler = StandardScaler().fit(X_train)
+        X_train, X_test = scaler.transform(X_train), scaler.transform(X_test)
+
+    if exp.preprocessing == "balanced" and exp.model == "knn":
+        X_u, y_u, counts = balanced_reference(X_train, y_train, exp.random_state)
+        model = DedupKNNClassifier(**exp.params).fit(X_u, y_u, counts)
+    elif exp.preprocessing == "balanced":
+        model = MODELS[exp.model](**exp.params)
+        model.fit(X_train, y_train, sample_weight=balancement_weights(y_train))
+    else:
+        model = MODELS[exp.model](**exp.params).fit(X_train, y_train)
+    ev = Evaluation(y_test, model.predict_proba(X_test)[:, 1])
+
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    metrics = ev.metrics()
+    return {
+        "name": exp.name,
+        "accuracy": metrics["accuracy"],
+        "precision": metrics["precision"],
+        "recall": metrics["recall"],
+        "roc_auc": metrics["roc_auc"],
+        "wall_s": elapsed,
+        "peak_mb": peak / 2**20,
+        "pid": os.getpid(),
+    }
+
+
+def _run_shared(exp):
+    return run_experiment(exp, _shared["X"], _shared["y"])
+
+
+def run_experiments(X, y, experiments=EXPERIMENTS, n_workers=None):
+    """Run ``experiments`` in a process pool over shared-memory data.
+
+    Results are returned in the order of ``experiments``.
+    """
+    X_shared = SharedArray(np.asarray(X, dtype=np.float64))
+    y_shared = SharedArray(np.asarray(y))
+    try:
+        with ProcessPoolExecutor(n_workers or os.cpu_count(), initializer=_attach,
+                                 initargs=(X_shared.spec, y_shared.spec)) as pool:
+            return list(pool.map(_run_shared, experiments))
+    finally:
+        X_shared.close()
+        y_shared.close()
+
+
+def print_results(results):
+    print(f"{'experiment':<24} {'acc':>6} {'prec':>6} {'recall':>6} {'auc':>6} "
+          f"{'wall s':>7} {'peak MB':>8}")
+    for r in results:
+        print(f"{r['name']:<24} {r['accuracy']:>6.3f} {r['precision']:>6.3f} "
+              f"{r['recall']:>6.3f} {r['roc_auc']:>6.3f} {r['wall_s']:>7.2f} {r['peak_mb']:>8.1f}")
+
+
+if __name__ == "__main__":
+    import argparse
+    from data_loader import load_creditcard_arrays
+
+    parser = argparse.ArgumentParser(description="Run the experiment grid in parallel.")
+    parser.add_argument("--data", help="creditcard.csv file or folder")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    X, y, _ = load_creditcard_arrays(args.data)
+    print_results(run_experiments(X, y, n_workers=args.workers))
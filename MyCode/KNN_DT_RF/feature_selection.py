@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""Closed-form forward feature selection for ridge regression.
+
+``SequentialFeatureSelector(RidgeCV(...), n_features_to_select=5,
+direction="forward")`` refits a cross-validated ridge for every candidate
+feature at every step and every fold. A ridge fit and its validation error
+only depend on second moments, so here:
+
+1. one pass over the data accumulates, per fold, the row count, the sums of
+   X and y and the Gram blocks X'X, X'y and y'y (chunk by chunk, so it also
+   works on streamed data);
+2. each step scores every candidate feature at once: the training moments
+   of a fold are the totals minus that fold, the ridge solution of the
+   grown subset is a rank-one (bordered inverse) update of the current
+   one, and the fold's R^2 follows from its moments;
+3. as in ``RidgeCV``, alpha is chosen per training set from ``alphas``, here
+   with the closed-form generalised cross-validation score (RidgeCV's
+   leave-one-out errors need per-row leverages that moments do not carry).
+
+The fold layout matches the unshuffled ``KFold(cv)`` that
+``SequentialFeatureSelector`` uses for a regressor.
+
+    stats = gram_statistics(X, y, cv=5)
+    selected, scores = forward_select(stats, n_features_to_select=5)
+"""
+
+import numpy as np
+
+
+class FoldMoments:
+    """Per-fold first and second moments of (X, y).
+
+    The data are shifted by the first chunk's means before accumulating,
+    which keeps the sums well conditioned (Time and Amount are large) and
+    does not change any centred quantity.
+    """
+
+    def __init__(self, n_features, cv):
+        self.cv = cv
+        self.n = np.zeros(cv)
+        self.sx = np.zeros((cv, n_features))
+        self.sy = np.zeros(cv)
+        self.xx = np.zeros((cv, n_features, n_features))
+        self.xy = np.zeros((cv, n_features))
+        self.yy = np.zeros(cv)
+        self.shift_x = self.shift_y = None
+
+    def update(self, X, y, folds):
+        """Add a chunk; ``folds`` gives the fold of every row."""
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if self.shift_x is None:
+            self.shift_x, self.shift_y = X.mean(axis=0), y.mean()
+        X = X - self.shift_x
+        y = y - self.shift_y
+        for f in np.unique(folds):
+            rows = folds == f
+            Xf, yf = X[rows], y[rows]
+            self.n[f] += len(yf)
+            self.sx[f] += Xf.sum(axis=0)
+            self.sy[f] += yf.sum()
+            self.xx[f] += Xf.T @ Xf
+            self.xy[f] += Xf.T @ yf
+            self.yy[f] += yf @ yf
+        return self
+
+
+def kfold_ids(n_samples, cv):
+    """Fold of every row for the unshuffled ``KFold(cv)``."""
+    sizes = np.full(cv, n_samples // cv)
+    sizes[:n_samples % cv] += 1
+    return np.repeat(np.arange(cv), sizes)
+
+
+def gram_statistics(X, y, cv=5, chunksize=65536):
+    """One chunked pass over in-memory (or memory-mapped) data."""
+    X = np.asarray(X)
+    y = np.asarray(y)
+    folds = kfold_ids(len(y), cv)
+    stats = FoldMoments(X.shape[1], cv)
+    for start in range(0, len(y), chunksize):
+        stop = start + chunksize
+        stats.update(X[start:stop], y[start:stop], folds[start:stop])
+    return stats
+
+
+def gram_statistics_streaming(chunks, n_features, cv=5):
+    """One pass over an iterator of ``(X, y)`` chunks of unknown total size.
+
+    Rows are assigned to folds round-robin since the total is not known in
+    advance.
+    """
+    stats = FoldMoments(n_features, cv)
+    seen = 0
+    for X, y in chunks:
+        stats.update(X, y, (seen + np.arange(len(y))) % cv)
+        seen += len(y)
+    return stats
+
+
+def _centred(n, sx, sy, xx, xy, yy):
+    mx, my = sx / n, sy / n
+    return (xx - n * np.outer(mx, mx), xy - n * mx * my, yy - n * my * my, mx, my)
+
+
+class _RidgePath:
+    """Ridge fit on a growing feature subset for one (training set, alpha).
+
+    Keeps the inverse ``(Cxx[S, S] + alpha I)^-1`` and its trace and grows
+    it by one feature with the bordered-inverse (rank-one) update.
+    """
+
+    def __init__(self, Cxx, Cxy, alpha):
+        self.Cxx, self.Cxy, self.alpha = Cxx, Cxy, alpha
+        self.subset = []
+        self.inv = np.zeros((0, 0))
+        self.beta = np.zeros(0)
+
+    def candidates(self, cand):
+        """Coefficients and inverse traces of subset + [j] for every j in cand.
+
+        Returns ``(beta_S, beta_j, trace)`` with ``beta_S`` of shape
+        (|S|, m): the updated old coefficients for each candidate.
+        """
+        S = self.subset
+        B = self.Cxx[np.ix_(S, cand)]
+        AinvB = self.inv @ B
+        schur = self.Cxx[cand, cand] + self.alpha - np.einsum("ij,ij->j", B, AinvB)
+        beta_j = (self.Cxy[cand] - B.T @ self.beta) / schur
+        beta_S = self.beta[:, None] - AinvB * beta_j
+        trace = np.trace(self.inv) + (np.einsum("ij,ij->j", AinvB, AinvB) + 1) / schur
+        return beta_S, beta_j, trace
+
+    def add(self, j):
+        S = self.subset
+        b = self.Cxx[S, j]
+        Ainv_b = self.inv @ b
+        s = self.Cxx[j, j] + self.alpha - b @ Ainv_b
+        k = len(S)
+        inv = np.empty((k + 1, k + 1))
+        inv[:k, :k] = self.inv + np.outer(Ainv_b, Ainv_b) / s
+        inv[:k, k] = inv[k, :k] = -Ainv_b / s
+        inv[k, k] = 1 / s
+        beta_j = (self.Cxy[j] - b @ self.beta) / s
+        self.beta = np.append(self.beta - Ainv_b * beta_j, beta_j)
+        self.inv = inv
+        self.subset = S + [j]
+
+
+def forward_select(stats, n_features_to_select=5, alphas=np.logspace(-6, 6, num=5),
+                   feature_names=None):
+    """Greedy forward selection scored by mean validation R^2 over folds.
+
+    Returns ``(selected, step_scores)``: the selected feature indices (or
+    names when ``feature_names`` is given) in order of selection and the
+    mean R^2 after each step.
+    """
+    cv = stats.cv
+    tot = [a.sum(axis=0) for a in (stats.n, stats.sx, stats.sy, stats.xx, stats.xy, stats.yy)]
+    folds = []
+    for f in range(cv):
+        fold = (stats.n[f], stats.sx[f], stats.sy[f], stats.xx[f], stats.xy[f], stats.yy[f])
+        n_tr = tot[0] - fold[0]
+        Cxx, Cxy, Cyy, mx, my = _centred(*(t - v for t, v in zip(tot, fold)))
+        paths = [_RidgePath(Cxx, Cxy, alpha) for alpha in alphas]
+        folds.append((fold, n_tr, Cyy, mx, my, paths))
+
+    n_features = stats.xx.shape[1]
+    selected, step_scores = [], []
+    for _ in range(n_features_to_select):
+        cand = np.array([j for j in range(n_features) if j not in selected])
+        scores = np.zeros(len(cand))
+        for (n_f, sx_f, sy_f, xx_f, xy_f, yy_f), n_tr, Cyy, mx, my, paths in folds:
+            best_gcv = np.full(len(cand), np.inf)
+            best_r2 = np.zeros(len(cand))
+            for path in paths:
+                beta_S, beta_j, trace = path.candidates(cand)
+                S = path.subset
+                # Training residual sum of squares and GCV score per candidate.
+                cols = [np.array(S + [j]) for j in cand]
+                betas = [np.r_[beta_S[:, i], beta_j[i]] for i in range(len(cand))]
+                rss = np.array([Cyy - 2 * b @ path.Cxy[c] + b @ path.Cxx[np.ix_(c, c)] @ b
+                                for c, b in zip(cols, betas)])
+                df = len(S) + 1 - path.alpha * trace + 1  # + intercept
+                gcv = n_tr * rss / (n_tr - df) ** 2
+                # Validation R^2 on the held-out fold, from its moments.
+                r2 = np.empty(len(cand))
+                sst = yy_f - sy_f ** 2 / n_f
+                for i, (c, b) in enumerate(zip(cols, betas)):
+                    b0 = my - mx[c] @ b
+                    sse = (yy_f - 2 * b0 * sy_f - 2 * b @ xy_f[c] + n_f * b0 ** 2
+                           + 2 * b0 * b @ sx_f[c] + b @ xx_f[np.ix_(c, c)] @ b)
+                    r2[i] = 1 - sse / sst
+                better = gcv < best_gcv
+                best_gcv[better] = gcv[better]
+                best_r2[better] = r2[better]
+            scores += best_r2 / cv
+        best = int(cand[scores.argmax()])
+        selected.append(best)
+        step_scores.append(float(scores.max()))
+        for *_, paths in folds:
+            for path in paths:
+                path.add(best)
+
+    if feature_names is not None:
+        selected = [feature_names[j] for j in selected]
+    return selected, step_scores
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""Compiled flat-array inference for fitted trees and forests.
+
+``RandomForestClassifier.predict_proba`` validates its input, then calls
+every estimator's ``predict_proba`` through joblib and adds the results
+under a lock. That is fine for a test set but costs milliseconds per single
+transaction. ``compile_forest`` copies the fitted trees into one set of
+contiguous node arrays (feature, threshold, children, leaf probabilities,
+root of each tree), and ``CompiledForest`` walks all trees at once:
+
+* ``predict_proba`` moves a block of rows through every tree one level
+  per step (one gather per array per level), blocks spread over
+  ``n_jobs`` threads (``take`` and the comparisons release the GIL);
+* ``predict_proba_one`` does the same for a single row across the trees,
+  with no validation or joblib overhead.
+
+Leaves point to themselves, so a walk of ``max_depth`` steps ends on a
+leaf whatever its depth. Node ids and features are int32 and, for sklearn
+trees, which compare float32 rows with float64 thresholds, the thresholds
+are rounded down to float32 (for a float32 ``x``, ``x <= t`` exactly when
+``x <= float32_floor(t)``), halving the memory each level touches.
+
+The outputs are bit-identical to the source model's ``predict_proba``:
+the comparisons are exact as above, leaf probabilities are the ones the
+model returns, and the trees are summed in estimator order before dividing
+by their number.
+
+Accepted models: sklearn ``RandomForestClassifier``/``ExtraTreesClassifier``
+and ``DecisionTreeClassifier``, ``tree_engine.RandomForest`` and
+``DecisionTree``, and a pipeline ending in one of them whose other steps
+only resample (e.g. ``RandomUnderSampler``).
+
+``save`` writes the arrays as ``.npy`` files and ``load_forest``
+memory-maps them back (see ``model_artifact`` for bundling the scaler).
+
+    compiled = compile_forest(rf_classifier)
+    compiled.predict_proba(X_test_s)      # == rf_classifier.predict_proba(X_test_s)
+    compiled.predict_proba_one(X_test_s[0])
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+_META = "forest.json"
+
+
+def _final_estimator(model):
+    if hasattr(model, "steps"):
+        for name, step in model.steps[:-1]:
+            if step is not None and step != "passthrough" and hasattr(step, "transform"):
+                raise ValueError(f"pipeline step {name!r} transforms the rows; "
+                                 "compile the final estimator and apply it separately")
+        return model.steps[-1][1]
+    return model
+
+
+def _sklearn_tree(tree):
+    # sklearn is only imported when compiling, so that loading a saved
+    # forest stays cheap.
+    import sklearn
+    from sklearn.utils.fixes import parse_version
+
+    t = tree.tree_
+    value = t.value[:, 0, :]
+    # From 1.4 on sklearn stores class fractions in ``tree_.value`` and
+    # ``predict_proba`` returns them as they are; before, it normalised counts.
+    if parse_version(sklearn.__version__) < parse_version("1.4"):
+        normalizer = value.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        value = value / normalizer
+    return t.feature, t.threshold, t.children_left, t.children_right, value
+
+
+def _native_tree(tree):
+    value = tree.value_ / tree.value_.sum(axis=1, keepdims=True)
+    return tree.feature_, tree.threshold_, tree.children_left_, tree.children_right_, value
+
+
+def compile_forest(model):
+    """Flatten a fitted tree, forest or resampling pipeline into a ``CompiledForest``."""
+    model = _final_estimator(model)
+    trees = getattr(model, "estimators_", [model])
+    if hasattr(trees[0], "tree_"):
+        parts, float32 = [_sklearn_tree(tree) for tree in trees], True
+    elif hasattr(trees[0], "value_"):
+        parts, float32 = [_native_tree(tree) for tree in trees], False
+    else:
+        raise TypeError(f"cannot compile {type(model).__name__}")
+
+    sizes = [len(part[0]) for part in parts]
+    roots = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int32)
+    feature, threshold, left, right, value = (np.concatenate(arrays) for arrays in zip(*parts))
+    leaf = left < 0
+    node = np.arange(len(feature))
+    offset = np.repeat(roots, sizes)
+    children = np.empty((len(feature), 2), dtype=np.int32)
+    children[:, 0] = np.where(leaf, node, left + offset)
+    children[:, 1] = np.where(leaf, node, right + offset)
+    threshold = np.where(leaf, 0.0, threshold)
+    if float32:
+        rounded = threshold.astype(np.float32)
+        threshold = np.where(rounded > threshold, np.nextafter(rounded, np.float32(-np.inf)),
+                             rounded)
+    depth = max(tree.get_depth() for tree in trees)
+    return CompiledForest(np.where(leaf, 0, feature).astype(np.int32), threshold, children,
+                          np.ascontiguousarray(value, dtype=np.float64), roots,
+                          np.asarray(model.classes_), depth)
+
+
+class CompiledForest:
+    """Flat node arrays of every tree and the walks over them.
+
+    ``children[i]`` holds the (left, right) successors of node ``i``,
+    itself for a leaf; ``leaf_proba[i]`` its class probabilities. Rows are
+    compared in the dtype of ``threshold``.
+    """
+
+    _array_names = ("feature", "threshold", "children", "leaf_proba", "roots", "classes_")
+
+    def __init__(self, feature, threshold, children, leaf_proba, roots, classes, max_depth,
+                 n_jobs=1, block=4096):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.leaf_proba = leaf_proba
+        self.roots = roots
+        self.classes_ = classes
+        self.max_depth = max_depth
+        self.n_jobs = n_jobs
+        self.block = block
+        self._flat_children = children.ravel()
+        # Fancy indexing of a ~100-element array is faster with intp ids.
+        self._one = (roots.astype(np.intp), feature.astype(np.intp),
+                     self._flat_children.astype(np.intp))
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    def save(self, path):
+        """Write the node arrays and parameters to the directory ``path``."""
+        os.makedirs(path, exist_ok=True)
+        for name in self._array_names:
+            np.save(os.path.join(path, name + ".npy"), getattr(self, name))
+        with open(os.path.join(path, _META), "w") as fh:
+            json.dump({"max_depth": int(self.max_depth), "n_jobs": self.n_jobs,
+                       "block": self.block}, fh, indent=1)
+        return path
+
+    def apply(self, X):
+        """Leaf node (global id) of every row in every tree: (n_rows, n_trees)."""
+        X = np.ascontiguousarray(X, dtype=self.threshold.dtype)
+        n_rows, n_features = X.shape
+        values = X.ravel()
+        row_start = (np.arange(n_rows, dtype=np.int32) * n_features)[:, None]
+        nodes = np.repeat(self.roots[None, :], n_rows, axis=0)
+        for _ in range(self.max_depth):
+            at = self.feature.take(nodes)
+            at += row_start
+            go_right = values.take(at) > self.threshold.take(nodes)
+            nodes *= 2
+            nodes += go_right
+            nodes = self._flat_children.take(nodes)
+        return nodes
+
+    def _proba(self, X):
+        leaves = self.apply(X)
+        # accumulate adds the trees one by one in estimator order, as
+        # predict_proba does (a sum could reorder them).
+        proba = np.add.accumulate(self.leaf_proba.take(leaves, axis=0), axis=1)[:, -1]
+        proba /= leaves.shape[1]
+        return proba
+
+    def predict_proba(self, X):
+        """Batch prediction, ``block`` rows at a time over ``n_jobs`` threads."""
+        X = np.asarray(X)
+        if len(X) <= self.block:
+            return self._proba(X)
+        blocks = [X[start:start + self.block] for start in range(0, len(X), self.block)]
+        if self.n_jobs > 1:
+            with ThreadPoolExecutor(self.n_jobs) as pool:
+                return np.vstack(list(pool.map(self._proba, blocks)))
+        return np.vstack([self._proba(block) for block in blocks])
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    def predict_proba_one(self, x):
+        """Class probabilities of one row (a 1-D array)."""
+        x = np.asarray(x, dtype=self.threshold.dtype)
+        nodes, feature, children = self._one
+        for _ in range(self.max_depth):
+            go_right = x[feature[nodes]] > self.threshold[nodes]
+            nodes = children[2 * nodes + go_right]
+        return np.add.accumulate(self.leaf_proba[nodes], axis=0)[-1] / len(nodes)
+
+    def predict_one(self, x):
+        return self.classes_[self.predict_proba_one(x).argmax()]
+
+
+def load_forest(path, mmap_mode="r"):
+    """Load a ``CompiledForest`` written by ``save``; arrays are memory-mapped."""
+    with open(os.path.join(path, _META)) as fh:
+        params = json.load(fh)
+    # Plain ndarray views of the memmaps, as in ``knn_index.load_index``.
+    arrays = [np.asarray(np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode))
+              for name in CompiledForest._array_names]
+    feature, threshold, children, leaf_proba, roots, classes = arrays
+    return CompiledForest(feature, threshold, children, leaf_proba, roots, classes, **params)
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""Successive halving and Hyperband over KNN, tree and forest candidates.
+
+The script picks hyperparameters with hand-written loops (k in 1..19,
+depth in 1..29, entropy vs gini), training every candidate on the full
+balanced set. ``HalvingSearch`` searches one joint space instead: model
+family, k, ``max_depth``, criterion, scaler (``SCALERS``: standard, robust,
+min-max) and balancing strategy:
+
+* ``"none"``: the imbalanced rows as they are;
+* ``"weights"``: ``balancement_weights`` for trees and forests, the
+  deduplicated replicated reference set (``balanced_reference``) for KNN;
+* ``"undersample"``: every fraud and as many legitimate rows
+  (``undersampling_indices``);
+* ``"per-tree"`` (forests): ``BalancedRandomForest``.
+
+The rows passed to ``fit`` are split once into a fit part and a stratified
+validation part. Candidates are trained on growing prefixes of a fixed
+stratified order of the fit part (each prefix keeps the fraud share, and
+the smallest holds at least ``min_frauds`` frauds), scored on the whole
+validation part (``Evaluation``, average precision by default) and only
+the best ``1 / factor`` of every rung moves on to ``factor`` times more
+rows:
+
+* ``method="halving"``: one successive-halving run over ``candidates``
+  (default: the full grid of ``space``);
+* ``method="hyperband"``: Hyperband's brackets, from many candidates on
+  few rows to a few candidates on all rows, each bracket sampling its own
+  candidates from ``space``.
+
+Candidates of a rung run in a process pool; the data is copied once into
+shared memory (``experiment_runner.SharedArray``) and every worker maps it.
+Scores are cached by (candidate, rows), so Hyperband never refits a
+candidate drawn twice.
+
+    search = HalvingSearch(method="hyperband", n_workers=4).fit(X_train, y_train)
+    search.best_, search.best_score_
+    print_history(search.history_)
+"""
+
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from multiprocessing import shared_memory
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.utils import check_random_state
+
+from balanced_forest import BalancedRandomForest
+from balancing import balancement_weights, undersampling_indices
+from evaluation import Evaluation
+from experiment_runner import SharedArray
+from knn_dedup import DedupKNNClassifier, balanced_reference
+from preprocessing_cache import SCALERS
+
+SPACE = {
+    "knn": {"k": [1, 3, 5, 7, 9, 11, 15, 19], "scaler": ["standard", "robust", "minmax"],
+            "balancing": ["none", "weights", "undersample"]},
+    # Trees only compare features with thresholds, so the (increasing, per
+    # feature) scalers grow the same trees: one is enough.
+    "tree": {"criterion": ["entropy", "gini"], "max_depth": [3, 5, 8, 12, None],
+             "scaler": ["standard"], "balancing": ["none", "weights", "undersample"]},
+    "rf": {"criterion": ["gini", "entropy"], "max_depth": [4, 8, 12, None],
+           "scaler": ["standard"], "balancing": ["none", "weights", "undersample", "per-tree"]},
+}
+
+
+def candidate_grid(space=SPACE):
+    """Every candidate of ``space``: a dict of its parameters and ``family``."""
+    candidates = []
+    for family, params in space.items():
+        for values in product(*params.values()):
+            candidates.append({"family": family, **dict(zip(params, values))})
+    return candidates
+
+
+def sample_candidates(space, n, random_state=None):
+    """``n`` distinct candidates drawn uniformly from the grid (all if fewer)."""
+    grid = candidate_grid(space)
+    if n >= len(grid):
+        return grid
+    rng = check_random_state(random_state)
+    return [grid[i] for i in rng.choice(len(grid), n, replace=False)]
+
+
+def candidate_name(candidate):
+    return " ".join([candidate["family"]] + [f"{key}={value}" for key, value in candidate.items()
+                                             if key != "family"])
+
+
+def fit_candidate(candidate, X, y, random_state=42):
+    """Fit ``candidate``'s model on scaled ``(X, y)`` with its balancing."""
+    family, balancing = candidate["family"], candidate["balancing"]
+    weights = None
+    if balancing == "undersample":
+        rows = undersampling_indices(y, random_state)
+        X, y = X[rows], y[rows]
+    elif balancing == "weights" and family != "knn":
+        weights = balancement_weights(y)
+
+    if family == "knn":
+        k = min(candidate["k"], len(y))
+        if balancing == "weights":
+            X_u, y_u, counts = balanced_reference(X, y, random_state)
+            return DedupKNNClassifier(k).fit(X_u, y_u, counts)
+        return KNeighborsClassifier(n_neighbors=k).fit(X, y)
+    if family == "tree":
+        model = DecisionTreeClassifier(criterion=candidate["criterion"],
+                                       max_depth=candidate["max_depth"],
+                                       random_state=random_state)
+    elif balancing == "per-tree":
+        return BalancedRandomForest(candidate.get("n_estimators", 100), candidate["criterion"],
+                                    candidate["max_depth"], n_jobs=1,
+                                    random_state=random_state).fit(X, y)
+    else:
+        model = RandomForestClassifier(n_estimators=candidate.get("n_estimators", 100),
+                                       criterion=candidate["criterion"],
+                                       max_depth=candidate["max_depth"],
+                                       random_state=random_state, n_jobs=1)
+    return model.fit(X, y, sample_weight=weights)
+
+
+def nested_order(y, random_state=None):
+    """Row order in which every prefix keeps the class shares of ``y``."""
+    rng = check_random_state(random_state)
+    y = np.asarray(y)
+    key = np.empty(len(y))
+    for c in np.unique(y):
+        rows = np.flatnonzero(y == c)
+        key[rows] = (rng.permutation(len(rows)) + rng.random_sample(len(rows))) / len(rows)
+    return np.argsort(key, kind="stable")
+
+
+def evaluate_candidate(candidate, n_rows, data, scoring="average_precision", random_state=42):
+    """Validation score of ``candidate`` fitted on ``n_rows`` rows of the fit order.
+
+    ``data`` holds ``X``, ``y``, ``order`` (fit rows) and ``val`` (validation rows).
+    """
+    start = time.perf_counter()
+    X, y = data["X"], data["y"]
+    rows, val = data["order"][:n_rows], data["val"]
+    scaler = SCALERS[candidate["scaler"]]().fit(X[rows])
+    model = fit_candidate(candidate, scaler.transform(X[rows]), y[rows], random_state)
+    proba = model.predict_proba(scaler.transform(X[val]))
+    scores = proba[:, list(model.classes_).index(1)]
+    return {"score": float(Evaluation(y[val], scores).metrics()[scoring]),
+            "fit_s": time.perf_counter() - start, "pid": os.getpid()}
+
+
+_shared = {}
+
+
+def _attach(specs):
+    """Pool initializer: map the shared blocks into this worker."""
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _shared[key + "_shm"] = shm  # keep the mapping alive
+        _shared[key] = np.ndarray(shape, np.dtype(dtype), buffer=shm.buf)
+
+
+def _evaluate_shared(task):
+    candidate, n_rows, scoring, random_state = task
+    return evaluate_candidate(candidate, n_rows, _shared, scoring, random_state)
+
+
+class HalvingSearch:
+    """Successive halving / Hyperband with a process pool.
+
+    ``min_resources`` is the smallest number of fit rows a candidate is
+    trained on (at least enough rows for ``min_frauds`` frauds). After
+    ``fit``: ``best_``, ``best_score_``, ``history_`` (one dict per
+    evaluation: bracket, rung, rows, candidate, score, fit time) and
+    ``wall_s_``.
+    """
+
+    def __init__(self, candidates=None, space=SPACE, method="halving", factor=3,
+                 min_resources=None, min_frauds=20, scoring="average_precision",
+                 validation_size=0.3, n_workers=None, random_state=42):
+        self.candidates = candidates
+        self.space = space
+        self.method = method
+        self.factor = factor
+        self.min_resources = min_resources
+        self.min_frauds = min_frauds
+        self.scoring = scoring
+        self.validation_size = validation_size
+        self.n_workers = n_workers
+        self.random_state = random_state
+
+    def _rung(self, candidates, n_rows, bracket, rung):
+        """Scores of ``candidates`` on ``n_rows`` rows, from the cache or the pool."""
+        todo = [c for c in candidates if (candidate_name(c), n_rows) not in self._cache]
+        tasks = [(c, n_rows, self.scoring, self.random_state) for c in todo]
+        if self._pool is None:
+            results = [evaluate_candidate(*task[:2], self._data, *task[2:]) for task in tasks]
+        else:
+            results = list(self._pool.map(_evaluate_shared, tasks))
+        for candidate, result in zip(todo, results):
+            self._cache[candidate_name(candidate), n_rows] = result
+            self.history_.append({"bracket": bracket, "rung": rung, "rows": n_rows,
+                                  "name": candidate_name(candidate), "candidate": candidate,
+                                  **result})
+        return [self._cache[candidate_name(c), n_rows]["score"] for c in candidates]
+
+    def _halve(self, candidates, n_rungs, bracket=0):
+        """Successive halving over ``n_rungs`` rungs ending on all fit rows."""
+        alive = list(candidates)
+        for rung in range(n_rungs):
+            n_rows = self._n_fit // self.factor ** (n_rungs - 1 - rung)
+            scores = self._rung(alive, n_rows, bracket, rung)
+            ranked = sorted(zip(scores, range(len(alive))), key=lambda t: -t[0])
+            if rung == n_rungs - 1:
+                return [(score, alive[i]) for score, i in ranked]
+            keep = max(1, math.ceil(len(alive) / self.factor))
+            alive = [alive[i] for _, i in ranked[:keep]]
+
+    def fit(self, X, y):
+        start = time.perf_counter()
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y)
+        rows = np.arange(len(y))
+        fit_rows, val_rows = train_test_split(rows, test_size=self.validation_size,
+                                              random_state=self.random_state, stratify=y)
+        order = fit_rows[nested_order(y[fit_rows], self.random_state)]
+        self._data = {"X": X, "y": y, "order": order, "val": val_rows}
+        self._n_fit = len(order)
+        fraud_share = max(np.mean(y[order] == 1), 1 / len(order))
+        r_min = max(self.min_resources or 0, math.ceil(self.min_frauds / fraud_share))
+        # Largest number of rungs whose first one still has r_min rows.
+        max_rungs = 1 + max(0, int(math.floor(math.log(self._n_fit / r_min, self.factor)
+                                                + 1e-9)))
+        self.history_, self._cache = [], {}
+
+        shared = {}
+        n_workers = self.n_workers or os.cpu_count()
+        self._pool = None
+        try:
+            if n_workers > 1:
+                shared = {key: SharedArray(value) for key, value in self._data.items()}
+                self._pool = ProcessPoolExecutor(
+                    n_workers, initializer=_attach,
+                    initargs=({key: s.spec for key, s in shared.items()},))
+            if self.method == "hyperband":
+                finals = self._hyperband(max_rungs)
+            else:
+                candidates = self.candidates or candidate_grid(self.space)
+                n_rungs = min(max_rungs,
+                              1 + math.ceil(math.log(len(candidates), self.factor) - 1e-9))
+                finals = self._halve(candidates, n_rungs)
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+            for block in shared.values():
+                block.close()
+            self._pool = self._data = None
+
+        self.best_score_, self.best_ = max(finals, key=lambda t: t[0])
+        self.wall_s_ = time.perf_counter() - start
+        return self
+
+    def _hyperband(self, max_rungs):
+        """Hyperband's brackets; returns the final-rung ``(score, candidate)``s."""
+        s_max = max_rungs - 1
+        rng = check_random_state(self.random_state)
+        finals = []
+        for s in range(s_max, -1, -1):
+            n = math.ceil((s_max + 1) / (s + 1) * self.factor ** s)
+            candidates = sample_candidates(self.space, n, rng)
+            finals.extend(self._halve(candidates, s + 1, bracket=s_max - s))
+        return finals
+
+
+def print_history(history, top=10):
+    """Evaluations per rung, then the ``top`` candidates of the last rung."""
+    print(f"{'bracket':>7} {'rung':>4} {'rows':>8} {'candidates':>10} {'fit s':>8}")
+    rungs = {}
+    for h in history:
+        rungs.setdefault((h["bracket"], h["rung"], h["rows"]), []).append(h["fit_s"])
+    for (bracket, rung, rows), times in rungs.items():
+        print(f"{bracket:>7} {rung:>4} {rows:>8} {len(times):>10} {sum(times):>8.1f}")
+    n_rows = max(h["rows"] for h in history)
+    final = sorted((h for h in history if h["rows"] == n_rows), key=lambda h: -h["score"])
+    print(f"\n{'candidate':<66} {'score':>6}")
+    for h in final[:top]:
+        print(f"{h['name']:<66} {h['score']:>6.3f}")
+
+
+if __name__ == "__main__":
+    import argparse
+    from data_loader import load_creditcard_arrays
+
+    parser = argparse.ArgumentParser(description="Successive halving / Hyperband search.")
+    parser.add_argument("--data", help="creditcard.csv file or folder")
+    parser.add_argument("--method", choices=["halving", "hyperband"], default="hyperband")
+    parser.add_argument("--candidates", type=int, default=None,
+                        help="sample this many candidates for halving (default: full grid)")
+    parser.add_argument("--factor", type=int, default=3)
+    parser.add_argument("--scoring", default="average_precision")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    X, y, _ = load_creditcard_arrays(args.data)
+    X_train, _, y_train, _ = train_test_split(np.asarray(X, dtype=np.float64), np.asarray(y),
+                                              test_size=0.3, random_state=42)
+    candidates = (sample_candidates(SPACE, args.candidates, 42) if args.candidates else None)
+    search = HalvingSearch(candidates, method=args.method, factor=args.factor,
+                           scoring=args.scoring, n_workers=args.workers)
+    search.fit(X_train, y_train)
+    print_history(search.history_)
+    print(f"\nbest: {candidate_name(search.best_)}  {args.scoring} {search.best_score_:.3f}  "
+          f"({len(search.history_)} fits, {search.wall_s_:.1f} s)")
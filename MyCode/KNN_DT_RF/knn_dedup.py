@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""Deduplicated, weighted reference sets for the KNN models.
+
+After ``dataset_balancement`` a few hundred unique fraud rows appear about
+199k times in the KNN training set, and every neighbour search scans every
+copy. Collapsing the duplicates into unique points with multiplicity counts
+shrinks the reference set to roughly the size of the original split, and
+voting with the counts (``knn_sweep.multiplicity_votes``) gives the same
+predictions as the expanded set.
+
+    X_u, y_u, counts = balanced_reference(X_train_s, y_train)
+    knn = DedupKNNClassifier(n_neighbors=3).fit(X_u, y_u, counts)
+    pred_s_b = knn.predict(X_test_s)
+"""
+
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+
+from balancing import balancement_indices
+from knn_sweep import multiplicity_votes, neighbor_indices, sweep_predictions
+
+
+def deduplicate_indices(indices):
+    """Collapse repeated row indices into ``(unique_rows, counts)``."""
+    return np.unique(np.asarray(indices), return_counts=True)
+
+
+def deduplicate(X, y):
+    """Collapse identical (features, label) rows of a materialised set.
+
+    Returns ``(X_unique, y_unique, counts)``. Use ``deduplicate_indices``
+    instead when the rows come from an index resample, which avoids
+    comparing feature values altogether.
+    """
+    X, y = np.asarray(X), np.asarray(y)
+    rows = np.column_stack([X, y])
+    unique, counts = np.unique(rows, axis=0, return_counts=True)
+    return unique[:, :-1], unique[:, -1].astype(y.dtype), counts
+
+
+def balanced_reference(X_train, y_train, random_state=None):
+    """Deduplicated equivalent of ``dataset_balancement(X_train, y_train)``.
+
+    Draws the same balancing indices, then keeps each selected row once with
+    its number of copies. Returns ``(X_unique, y_unique, counts)``.
+    """
+    X_train, y_train = np.asarray(X_train), np.asarray(y_train)
+    rows, counts = deduplicate_indices(balancement_indices(y_train, random_state))
+    return X_train[rows], y_train[rows], counts
+
+
+class DedupKNNClassifier:
+    """Uniform-vote KNN over unique reference points with multiplicities.
+
+    Predicts what ``KNeighborsClassifier(n_neighbors)`` fitted on the set
+    with every point repeated ``counts`` times would predict. ``index`` is
+    an optional unfitted neighbour index with ``fit(X)`` and ``kneighbors``
+    (e.g. ``BlockedKNN`` or ``KDTreeIndex``); ``NearestNeighbors`` is used
+    by default.
+    """
+
+    def __init__(self, n_neighbors=5, index=None):
+        self.n_neighbors = n_neighbors
+        self.index = index
+
+    def fit(self, X, y, counts=None):
+        y = np.asarray(y)
+        self.classes_, self.codes_ = np.unique(y, return_inverse=True)
+        self.counts_ = np.ones(len(y), dtype=np.int64) if counts is None else np.asarray(counts)
+        if len(y) < self.n_neighbors:
+            raise ValueError(f"{len(y)} unique points < n_neighbors={self.n_neighbors}")
+        index = self.index if self.index is not None else NearestNeighbors()
+        self.X_ = X  # kept (not copied) so the reference set can be persisted
+        self.index_ = index.fit(X)
+        return self
+
+    def predict(self, X, k_values=None):
+        """Predict for ``n_neighbors``, or ``{k: y_pred}`` for ``k_values``."""
+        ks = [self.n_neighbors] if k_values is None else list(k_values)
+        ind = neighbor_indices(None, X, max(ks), self.index_)
+        predictions = sweep_predictions(self.codes_[ind], self.classes_, ks, self.counts_[ind])
+        return predictions[self.n_neighbors] if k_values is None else predictions
+
+    def predict_proba(self, X):
+        """Vote fractions of the ``n_neighbors`` nearest points (duplicates expanded)."""
+        k = self.n_neighbors
+        ind = neighbor_indices(None, X, k, self.index_)
+        votes = multiplicity_votes(self.codes_[ind], self.counts_[ind], len(self.classes_), k)
+        return votes / k
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""Blocked, memory-bounded brute-force KNN.
+
+A full (n_query, n_reference) distance matrix for ~85k test rows against the
+~400k-row balanced training set would need hundreds of GB. ``BlockedKNN``
+tiles both sets into blocks, computes each tile of squared distances with
+one BLAS matrix product (``|q|^2 - 2 q.r + |r|^2``) and merges it into a
+running top-k per query, so memory stays under ``memory_limit`` whatever
+the data size. Query blocks are spread over ``n_jobs`` threads (BLAS and
+``argpartition`` release the GIL).
+
+The reference matrix is never copied: it may be a memmap, and ``fit`` (and
+``kneighbors``) can take an index array so that a view such as a
+cross-validation fold or a balanced resample is gathered block by block.
+
+``BlockedKNN`` has the ``kneighbors(X, n_neighbors, return_distance)``
+method of ``sklearn.neighbors.NearestNeighbors`` and can be passed as
+``index`` to the functions in ``knn_sweep``.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from threadpoolctl import threadpool_limits
+
+from knn_sweep import neighbor_labels, sweep_predictions
+
+
+class BlockedKNN:
+    """Exact euclidean k-nearest-neighbour search in bounded memory.
+
+    Parameters
+    ----------
+    n_neighbors : default k for ``kneighbors``.
+    memory_limit : byte budget for the distance tiles of all threads.
+    reference_block : reference rows per tile; the default keeps a
+        reference block of 30 float64 features around 1 MB (L2 sized).
+    n_jobs : number of threads working on query blocks.
+    dtype : compute precision; float64 by default for exact ranking.
+    """
+
+    def __init__(self, n_neighbors=5, memory_limit=256 * 2**20, reference_block=4096,
+                 n_jobs=1, dtype=np.float64):
+        self.n_neighbors = n_neighbors
+        self.memory_limit = memory_limit
+        self.reference_block = reference_block
+        self.n_jobs = n_jobs
+        self.dtype = dtype
+
+    def fit(self, X, sample_index=None):
+        self.X_ = X
+        self.sample_index_ = None if sample_index is None else np.asarray(sample_index)
+        self.n_samples_fit_ = len(X) if sample_index is None else len(self.sample_index_)
+        self.norms_ = np.concatenate([
+            np.einsum("ij,ij->i", block, block)
+            for _, block in self._reference_blocks()]) if self.n_samples_fit_ else np.empty(0)
+        return self
+
+    def _reference_blocks(self):
+        step = self.reference_block
+        for start in range(0, self.n_samples_fit_, step):
+            stop = min(start + step, self.n_samples_fit_)
+            if self.sample_index_ is None:
+                block = self.X_[start:stop]
+            else:
+                block = self.X_[self.sample_index_[start:stop]]
+            yield start, np.asarray(block, dtype=self.dtype)
+
+    def _query_block_rows(self, k):
+        # Per query row a tile holds the distances to one reference block,
+        # the merge candidates and their indices (argpartition output too).
+        per_row = (self.reference_block + k) * (2 * np.dtype(self.dtype).itemsize + 16)
+        budget = self.memory_limit / max(self.n_jobs, 1)
+        return max(1, int(budget // per_row))
+
+    def _search_block(self, Q, k):
+        q_norms = np.einsum("ij,ij->i", Q, Q)
+        best_d = np.full((len(Q), k), np.inf, dtype=self.dtype)
+        best_i = np.full((len(Q), k), -1, dtype=np.int64)
+        rows = np.arange(len(Q))[:, None]
+        for start, R in self._reference_blocks():
+            D = Q @ R.T
+            D *= -2
+            D += q_norms[:, None]
+            D += self.norms_[start:start + len(R)]
+            np.maximum(D, 0, out=D)
+            cand_d = np.hstack([best_d, D])
+            sel = np.argpartition(cand_d, k - 1, axis=1)[:, :k]
+            best_d = cand_d[rows, sel]
+            # Candidate column c < k is a previous best, else reference row
+            # start + c - k.
+            best_i = np.where(sel < k, np.take_along_axis(best_i, np.minimum(sel, k - 1), 1),
+                              start + sel - k)
+        order = np.argsort(best_d, axis=1, kind="stable")
+        return (np.sqrt(np.take_along_axis(best_d, order, 1)),
+                np.take_along_axis(best_i, order, 1))
+
+    def kneighbors(self, X, n_neighbors=None, return_distance=True, query_index=None):
+        """Nearest reference rows of each query row.
+
+        With ``query_index`` only the rows ``X[query_index]`` are queried,
+        gathered block by block like the reference rows.
+        """
+        k = n_neighbors or self.n_neighbors
+        if k > self.n_samples_fit_:
+            raise ValueError(f"n_neighbors={k} > n_samples_fit={self.n_samples_fit_}")
+        n_query = len(X) if query_index is None else len(query_index)
+        step = self._query_block_rows(k)
+        starts = range(0, n_query, step)
+
+        def search(start):
+            if query_index is None:
+                Q = X[start:start + step]
+            else:
+                Q = X[query_index[start:start + step]]
+            return self._search_block(np.asarray(Q, dtype=self.dtype), k)
+
+        if self.n_jobs > 1:
+            # One BLAS thread per worker so the workers do not oversubscribe.
+            with threadpool_limits(limits=1, user_api="blas"), \
+                    ThreadPoolExecutor(self.n_jobs) as pool:
+                parts = list(pool.map(search, starts))
+        else:
+            parts = [search(start) for start in starts]
+
+        dist = np.vstack([d for d, _ in parts]) if parts else np.empty((0, k))
+        ind = np.vstack([i for _, i in parts]) if parts else np.empty((0, k), np.int64)
+        return (dist, ind) if return_distance else ind
+
+
+class BlockedKNNClassifier:
+    """Uniform-vote KNN classifier on top of ``BlockedKNN``."""
+
+    def __init__(self, n_neighbors=5, **engine_params):
+        self.n_neighbors = n_neighbors
+        self.engine_params = engine_params
+
+    def fit(self, X, y, sample_index=None):
+        y = np.asarray(y)
+        self.y_ = y if sample_index is None else y[sample_index]
+        self.index_ = BlockedKNN(self.n_neighbors, **self.engine_params).fit(X, sample_index)
+        return self
+
+    def predict(self, X):
+        classes, labels = neighbor_labels(None, self.y_, X, self.n_neighbors, self.index_)
+        return sweep_predictions(labels, classes, [self.n_neighbors])[self.n_neighbors]
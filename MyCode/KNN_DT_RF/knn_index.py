@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""Persistent neighbour indexes for the low-dimensional KNN models.
+
+The forward-selected model uses only 5 features (V10, V12, V14, V16, V17),
+where space-partitioning search beats brute force by a wide margin. Two
+indexes are provided, both with the sklearn-style
+``kneighbors(X, n_neighbors, return_distance)`` method so they plug into
+``knn_sweep`` and ``KNNScorer``:
+
+* ``KDTreeIndex``: exact search through scipy's compiled ``cKDTree``,
+  ~0.1 ms per single-transaction query on 200k reference rows;
+* ``IVFIndex``: approximate search over k-means cells, where ``n_probe``
+  (cells scanned per query) trades recall for latency.
+
+Indexes are built once, saved as a directory of ``.npy`` files and
+memory-mapped by ``load_index``, so loading costs milliseconds and several
+processes share one copy of the pages (the KD-tree's nodes are rebuilt in
+each process on its first query). ``measure_recall`` reports the recall
+of approximate results against exact search.
+
+    index = KDTreeIndex().fit(X_new_train_s_u)
+    index.save("knn5-index", labels=y_new_train_u, counts=counts_new_u)
+    scorer = KNNScorer(load_index("knn5-index"), k=9)
+    scorer.predict_one(x)
+"""
+
+import json
+import os
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from knn_engine import BlockedKNN
+from knn_sweep import neighbor_indices, sweep_predictions
+
+_META = "index.json"
+
+
+class _ArrayIndex:
+    """Index whose whole state is a set of named arrays plus JSON params."""
+
+    kind = None
+    _array_names = ()
+
+    def kneighbors(self, X, n_neighbors=5, return_distance=True):
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        dist = np.empty((len(X), n_neighbors))
+        ind = np.empty((len(X), n_neighbors), dtype=np.int64)
+        for row, q in enumerate(X):
+            dist[row], ind[row] = self.query_one(q, n_neighbors)
+        return (dist, ind) if return_distance else ind
+
+    def _params(self):
+        return {}
+
+    def _check_k(self, k):
+        if not 1 <= k <= len(self.points_):
+            raise ValueError(f"k must be between 1 and the {len(self.points_)} indexed points, "
+                             f"got {k}")
+
+    def save(self, path, labels=None, counts=None):
+        """Write the index to ``path``, optionally with the reference labels
+        and multiplicities (for deduplicated reference sets)."""
+        os.makedirs(path, exist_ok=True)
+        for name in self._array_names:
+            np.save(os.path.join(path, name + ".npy"), getattr(self, name))
+        extras = {"labels_": labels, "counts_": counts}
+        extras = {name: np.asarray(a) for name, a in extras.items() if a is not None}
+        for name, array in extras.items():
+            np.save(os.path.join(path, name + ".npy"), array)
+        with open(os.path.join(path, _META), "w") as fh:
+            json.dump({"kind": self.kind, "params": self._params(),
+                       "extras": sorted(extras)}, fh, indent=1)
+        return path
+
+
+def load_index(path, mmap_mode="r"):
+    """Load an index saved with ``save``; arrays are memory-mapped."""
+    with open(os.path.join(path, _META)) as fh:
+        meta = json.load(fh)
+    cls = {c.kind: c for c in (KDTreeIndex, IVFIndex)}[meta["kind"]]
+    index = cls(**meta["params"])
+    names = list(cls._array_names) + meta["extras"]
+    for name in names:
+        # A plain ndarray view of the memmap avoids the subclass overhead
+        # on every slice in the query loops.
+        setattr(index, name, np.asarray(
+            np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode)))
+    return index
+
+
+class KDTreeIndex(_ArrayIndex):
+    """Exact KD-tree search through ``scipy.spatial.cKDTree``.
+
+    Only the reference points are saved (``points_``). The compiled tree
+    is built over them, without copying, on the first query after ``fit``
+    or ``load_index`` (~0.1 s for 200k points), so a memory-mapped index
+    still shares its point pages between processes.
+    """
+
+    kind = "kdtree"
+    _array_names = ("points_",)
+
+    def __init__(self, leaf_size=32):
+        self.leaf_size = leaf_size
+
+    def _params(self):
+        return {"leaf_size": self.leaf_size}
+
+    def fit(self, X):
+        self.points_ = np.ascontiguousarray(X, dtype=np.float64)
+        self._tree = None
+        return self
+
+    def _kdtree(self):
+        if getattr(self, "_tree", None) is None:
+            self._tree = cKDTree(self.points_, leafsize=self.leaf_size, copy_data=False)
+        return self._tree
+
+    def kneighbors(self, X, n_neighbors=5, return_distance=True):
+        self._check_k(n_neighbors)
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        dist, ind = self._kdtree().query(X, [*range(1, n_neighbors + 1)])
+        return (dist, ind) if return_distance else ind
+
+    def query_one(self, q, k=5):
+        """Return the ``k`` nearest ``(distances, indices)`` of one point."""
+        self._check_k(k)
+        dist, ind = self._kdtree().query(np.asarray(q, dtype=np.float64), [*range(1, k + 1)])
+        return dist, ind
+
+
+def _nearest_centroid(X, centroids, block=65536):
+    c_norms = np.einsum("ij,ij->i", centroids, centroids)
+    return np.concatenate([
+        (c_norms - 2 * X[start:start + block] @ centroids.T).argmin(axis=1)
+        for start in range(0, len(X), block)])
+
+
+class IVFIndex(_ArrayIndex):
+    """Approximate inverted-file index over k-means cells.
+
+    Points are grouped by their nearest of ``n_lists`` centroids; a query
+    scans the points of its ``n_probe`` nearest cells. ``n_probe`` can be
+    changed after loading to move along the recall/latency curve.
+    """
+
+    kind = "ivf"
+    _array_names = ("centroids_", "points_", "order_", "offsets_")
+
+    def __init__(self, n_lists=None, n_probe=4, n_iter=10, random_state=0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.random_state = random_state
+
+    def _params(self):
+        return {"n_lists": self.n_lists, "n_probe": self.n_probe,
+                "n_iter": self.n_iter, "random_state": self.random_state}
+
+    def fit(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(X))))
+        rng = np.random.default_rng(self.random_state)
+        # Centroids are trained on a sample, as usual for IVF indexes.
+        sample = X[rng.choice(len(X), min(len(X), 64 * n_lists), replace=False)]
+        centroids = sample[:n_lists].copy()
+        for _ in range(self.n_iter):  # Lloyd iterations
+            assign = _nearest_centroid(sample, centroids)
+            counts = np.bincount(assign, minlength=n_lists)
+            sums = np.column_stack([np.bincount(assign, sample[:, j], minlength=n_lists)
+                                    for j in range(X.shape[1])])
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+        assign = _nearest_centroid(X, centroids)
+
+        order = np.argsort(assign, kind="stable")
+        self.n_lists = n_lists
+        self.centroids_ = centroids
+        self.points_ = X[order]
+        self.order_ = order
+        self.offsets_ = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))])
+        return self
+
+    def query_one(self, q, k=5):
+        self._check_k(k)
+        q = np.asarray(q, dtype=np.float64)
+        diff = self.centroids_ - q
+        cells = np.argsort(np.einsum("ij,ij->i", diff, diff))
+        # Probe n_probe cells, or more if they hold fewer than k points.
+        sizes = np.diff(self.offsets_)[cells]
+        n_probe = max(self.n_probe, int(np.searchsorted(np.cumsum(sizes), k)) + 1)
+        cells = cells[:n_probe]
+        spans = [(self.offsets_[c], self.offsets_[c + 1]) for c in cells]
+        diff = np.concatenate([self.points_[a:b] for a, b in spans]) - q
+        d2 = np.einsum("ij,ij->i", diff, diff)
+        top = np.argpartition(d2, k - 1)[:k] if len(d2) > k else np.arange(len(d2))
+        top = top[np.argsort(d2[top])]
+        rows = np.concatenate([self.order_[a:b] for a, b in spans])
+        return np.sqrt(d2[top]), rows[top]
+
+
+def measure_recall(index, X_reference, X_query, k=5):
+    """Mean fraction of the exact k nearest neighbours that ``index`` returns."""
+    exact = BlockedKNN(k).fit(np.asarray(X_reference)).kneighbors(X_query, return_distance=False)
+    approx = index.kneighbors(X_query, k, return_distance=False)
+    hits = [len(np.intersect1d(a, e)) for a, e in zip(approx, exact)]
+    return float(np.mean(hits)) / k
+
+
+class KNNScorer:
+    """Uniform-vote KNN classifier over a (possibly loaded) index.
+
+    ``labels`` and ``counts`` default to the arrays saved with the index;
+    with ``counts`` the index holds unique points and votes are weighted by
+    multiplicity (see ``knn_dedup``).
+    """
+
+    def __init__(self, index, k=5, labels=None, counts=None):
+        self.index = index
+        self.k = k
+        self.labels = np.asarray(labels if labels is not None else index.labels_)
+        if counts is None:
+            counts = getattr(index, "counts_", None)
+        self.counts = None if counts is None else np.asarray(counts)
+        self.classes_, self.codes_ = np.unique(self.labels, return_inverse=True)
+        index._check_k(k)
+
+    def predict(self, X):
+        ind = neighbor_indices(None, X, self.k, self.index)
+        counts = None if self.counts is None else self.counts[ind]
+        return sweep_predictions(self.codes_[ind], self.classes_, [self.k], counts)[self.k]
+
+    def predict_one(self, x):
+        """Score a single transaction without the batching of ``predict``."""
+        _, ind = self.index.query_one(x, self.k)
+        if self.counts is None:
+            weights = None
+        else:
+            counts = self.counts[ind]
+            weights = np.clip(self.k - (np.cumsum(counts) - counts), 0, counts)
+        votes = np.bincount(self.codes_[ind], weights, minlength=len(self.classes_))
+        return self.classes_[votes.argmax()]
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Single-pass multi-k KNN sweep.
+
+Refitting ``KNeighborsClassifier`` for every k repeats the neighbour search
+each time. Here the search runs once at ``k_max`` and the vote counts of
+every smaller k are read off the sorted neighbour lists with a cumulative
+sum, so a 1..19 sweep costs one search instead of nineteen.
+
+Predictions match ``KNeighborsClassifier(n_neighbors=k)`` with uniform
+weights, including its tie rule (the smallest class label wins a tied vote).
+"""
+
+import numpy as np
+from sklearn.metrics import accuracy_score, recall_score
+from sklearn.neighbors import NearestNeighbors
+
+
+def neighbor_indices(X_train, X_query, k_max, index=None):
+    """Return the (n_query, k_max) indices of the nearest neighbours.
+
+    ``index`` is any fitted object with a sklearn-style
+    ``kneighbors(X, n_neighbors, return_distance)`` method; by default a
+    ``NearestNeighbors`` is fitted on ``X_train``. Rows are sorted by
+    distance.
+    """
+    if index is None:
+        index = NearestNeighbors(n_neighbors=k_max).fit(X_train)
+    return index.kneighbors(X_query, n_neighbors=k_max, return_distance=False)
+
+
+def neighbor_labels(X_train, y_train, X_query, k_max, index=None):
+    """Return ``(classes, labels)`` where ``labels`` holds the class codes
+    of the ``k_max`` nearest neighbours, sorted by distance."""
+    classes, y_codes = np.unique(np.asarray(y_train), return_inverse=True)
+    return classes, y_codes[neighbor_indices(X_train, X_query, k_max, index)]
+
+
+def cumulative_votes(labels, n_classes):
+    """Votes per class for every k: array of shape (k_max, n_query, n_classes)."""
+    one_hot = labels[:, :, None] == np.arange(n_classes)
+    votes = np.cumsum(one_hot, axis=1, dtype=np.int32)
+    return votes.transpose(1, 0, 2)
+
+
+def multiplicity_votes(labels, counts, n_classes, k):
+    """Votes per class of the k nearest points when neighbours have
+    multiplicities.
+
+    ``labels`` and ``counts`` describe the nearest *unique* points, sorted by
+    distance. Walking them in order and taking ``counts`` copies of each
+    until k points are taken gives exactly the votes of the k nearest
+    neighbours in the set with the duplicates expanded.
+    """
+    before = np.cumsum(counts, axis=1) - counts
+    taken = np.clip(k - before, 0, counts)
+    return np.stack([(taken * (labels == c)).sum(axis=1) for c in range(n_classes)], axis=1)
+
+
+def sweep_predictions(labels, classes, k_values, counts=None):
+    """Return ``{k: predictions}`` from sorted neighbour labels.
+
+    ``counts`` gives the multiplicity of each neighbour when the reference
+    set was deduplicated (see ``knn_dedup``).
+    """
+    # argmax returns the first maximum, i.e. the smallest label on a tie,
+    # which is what KNeighborsClassifier does.
+    if counts is None:
+        votes = cumulative_votes(labels, len(classes))
+        return {k: classes[votes[k - 1].argmax(axis=1)] for k in k_values}
+    return {k: classes[multiplicity_votes(labels, counts, len(classes), k).argmax(axis=1)]
+            for k in k_values}
+
+
+def knn_sweep(X_train, y_train, X_test, y_test=None, k_values=range(1, 20),
+              index=None, counts=None):
+    """Predict for every k in ``k_values`` with a single neighbour search.
+
+    With ``counts``, ``X_train``/``y_train`` are unique reference points and
+    ``counts`` their multiplicities; the predictions are those of the
+    expanded set. Returns a dict with ``k_values``, ``predictions``
+    (``{k: y_pred}``) and, when ``y_test`` is given, the per-k ``recall``
+    and ``accuracy`` lists.
+    """
+    k_values = list(k_values)
+    classes, y_codes = np.unique(np.asarray(y_train), return_inverse=True)
+    ind = neighbor_indices(X_train, X_test, max(k_values), index)
+    predictions = sweep_predictions(y_codes[ind], classes, k_values,
+                                    None if counts is None else np.asarray(counts)[ind])
+    result = {"k_values": k_values, "predictions": predictions}
+    if y_test is not None:
+        result["recall"] = [recall_score(y_test, predictions[k]) for k in k_values]
+        result["accuracy"] = [accuracy_score(y_test, predictions[k]) for k in k_values]
+    return result
+
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""Persisted, memory-mappable scoring artifacts.
+
+Every run of the script refits the scaler, the KNN reference sets, the
+trees and the forests. An artifact is a directory that bundles what scoring
+needs, with the model's arrays saved as ``.npy`` files:
+
+    artifact.json   format version, feature names, scaler and model kinds
+    scaler/         the scaler's fitted parameters (mean_, scale_, ...)
+    model/          a ``CompiledForest`` (``forest_compiler``) for trees and
+                    forests, or a neighbour index with its labels and counts
+                    (``knn_index``) for the KNN models
+
+``load_artifact`` memory-maps the arrays, so loading is a few ``open`` and
+``mmap`` calls (milliseconds, no retraining) and every process that loads
+the same artifact shares one copy of the pages through the page cache.
+Artifacts are written to a temporary directory and renamed into place, so
+a reader never sees a half-written one.
+
+The loaded model scores raw rows (in ``features`` order, or a DataFrame
+with those columns): the scaler is applied exactly as sklearn's
+``transform`` does, and the forest outputs are bit-identical to the fitted
+model's ``predict_proba``.
+
+    save_artifact("rf-final", model, scaler=prep.scaler(stratify=False), features=FEATURES)
+    scoring = load_artifact("rf-final")
+    scoring.predict_proba(X_test)
+    scoring.predict_proba_one(X_test[0])
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from forest_compiler import CompiledForest, load_forest
+
+FORMAT_VERSION = 1
+_META = "artifact.json"
+
+# Scaler kind -> (sklearn class name, transform steps as (operator, fitted
+# attribute, flag enabling the step), whether the parameters are cast to
+# the rows' dtype first). This mirrors each scaler's ``transform`` so the
+# results are bit-identical, float32 rows included.
+_SCALERS = {
+    "standard": ("StandardScaler", (("-", "mean_", "with_mean"), ("/", "scale_", "with_std")),
+                 True),
+    "robust": ("RobustScaler", (("-", "center_", "with_centering"),
+                                ("/", "scale_", "with_scaling")), False),
+    "minmax": ("MinMaxScaler", (("*", "scale_", None), ("+", "min_", None)), False),
+}
+
+
+class ArtifactScaler:
+    """The fitted state of a sklearn scaler, applied without sklearn."""
+
+    def __init__(self, kind, params):
+        self.kind = kind
+        self.params = params
+        self._steps = [(op, params[name]) for op, name, _ in _SCALERS[kind][1]
+                       if name in params]
+        self._cast = _SCALERS[kind][2]
+
+    @classmethod
+    def from_sklearn(cls, scaler):
+        import sklearn.preprocessing
+
+        for kind, (class_name, steps, _) in _SCALERS.items():
+            if type(scaler) is getattr(sklearn.preprocessing, class_name):
+                if getattr(scaler, "clip", False):
+                    raise ValueError("MinMaxScaler(clip=True) is not supported")
+                # Steps switched off (e.g. with_mean=False) are not stored.
+                return cls(kind, {name: getattr(scaler, name) for _, name, flag in steps
+                                  if flag is None or getattr(scaler, flag)})
+        raise TypeError(f"cannot persist {type(scaler).__name__}")
+
+    def transform(self, X):
+        X = np.array(X, dtype=None if np.asarray(X).dtype.kind == "f" else np.float64)
+        for op, param in self._steps:
+            if self._cast:
+                param = param.astype(X.dtype, copy=False)
+            if op == "-":
+                X -= param
+            elif op == "/":
+                X /= param
+            elif op == "*":
+                X *= param
+            else:
+                X += param
+        return X
+
+
+class ScoringArtifact:
+    """A loaded artifact: feature selection, scaling and the model."""
+
+    def __init__(self, model, scaler=None, features=None, meta=None):
+        self.model = model
+        self.scaler = scaler
+        self.features = features
+        self.meta = meta or {}
+
+    def transform(self, X):
+        if hasattr(X, "columns") and self.features is not None:  # a DataFrame
+            X = X[self.features].to_numpy()
+        return X if self.scaler is None else self.scaler.transform(X)
+
+    def predict_proba(self, X):
+        return self.model.predict_proba(self.transform(X))
+
+    def predict(self, X):
+        return self.model.predict(self.transform(X))
+
+    def predict_proba_one(self, x):
+        """Class probabilities of one raw row (forest and tree artifacts)."""
+        return self.model.predict_proba_one(self.transform(x))
+
+    def predict_one(self, x):
+        x = self.transform(x)
+        if hasattr(self.model, "predict_one"):
+            return self.model.predict_one(x)
+        return self.model.predict(np.asarray(x)[None, :])[0]
+
+
+def _save_model(model, path):
+    """Write ``model`` under ``path``; returns its kind and JSON parameters."""
+    from forest_compiler import compile_forest
+    from knn_dedup import DedupKNNClassifier
+    from knn_index import KNNScorer
+
+    if isinstance(model, KNNScorer):
+        model.index.save(path, labels=model.labels, counts=model.counts)
+        return "knn-index", {"k": model.k}
+    if isinstance(model, DedupKNNClassifier):
+        labels = model.classes_[model.codes_]
+        if hasattr(model.index_, "save"):
+            model.index_.save(path, labels=labels, counts=model.counts_)
+            return "knn-index", {"k": model.n_neighbors}
+        # Brute-force indexes have no state beyond the reference points.
+        os.makedirs(path)
+        for name, array in (("points", model.X_), ("labels", labels), ("counts", model.counts_)):
+            np.save(os.path.join(path, name + ".npy"), np.asarray(array))
+        return "knn-brute", {"k": model.n_neighbors}
+    if not isinstance(model, CompiledForest):
+        model = compile_forest(model)
+    model.save(path)
+    return "forest", {}
+
+
+def _load_model(kind, params, path, mmap_mode):
+    # Only the forest path is imported eagerly: loading must stay cheap.
+    if kind == "forest":
+        return load_forest(path, mmap_mode)
+    if kind == "knn-index":
+        from knn_index import KNNScorer, load_index
+        return KNNScorer(load_index(path, mmap_mode), k=params["k"])
+    if kind == "knn-brute":
+        from knn_dedup import DedupKNNClassifier
+        from knn_engine import BlockedKNN
+
+        points, labels, counts = (np.asarray(np.load(os.path.join(path, name + ".npy"),
+                                                     mmap_mode=mmap_mode))
+                                  for name in ("points", "labels", "counts"))
+        knn = DedupKNNClassifier(params["k"], index=BlockedKNN(params["k"]))
+        return knn.fit(points, labels, counts)
+    raise ValueError(f"unknown model kind {kind!r}")
+
+
+def save_artifact(path, model, scaler=None, features=None, metadata=None):
+    """Persist ``model`` (and the fitted ``scaler`` in front of it) to ``path``.
+
+    ``model`` is anything ``compile_forest`` accepts, a ``KNNScorer`` or a
+    ``DedupKNNClassifier``. An existing artifact at ``path`` is replaced
+    atomically; processes that still map the old files keep reading them.
+    """
+    path = os.path.abspath(path)
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".tmp-", dir=parent)
+    try:
+        import sklearn
+
+        meta = {"format_version": FORMAT_VERSION, "created": time.time(),
+                "sklearn_version": sklearn.__version__, "numpy_version": np.__version__,
+                "features": None if features is None else list(features),
+                "scaler": None, "metadata": metadata or {}}
+        if scaler is not None:
+            if not isinstance(scaler, ArtifactScaler):
+                scaler = ArtifactScaler.from_sklearn(scaler)
+            os.makedirs(os.path.join(tmp, "scaler"))
+            for name, array in scaler.params.items():
+                np.save(os.path.join(tmp, "scaler", name + ".npy"), np.asarray(array))
+            meta["scaler"] = {"kind": scaler.kind, "params": sorted(scaler.params)}
+        kind, params = _save_model(model, os.path.join(tmp, "model"))
+        meta["model"] = {"kind": kind, "params": params}
+        with open(os.path.join(tmp, _META), "w") as fh:
+            json.dump(meta, fh, indent=1)
+
+        old = None
+        if os.path.isdir(path):
+            old = tempfile.mkdtemp(prefix=".old-", dir=parent)
+            os.replace(path, os.path.join(old, "artifact"))
+        os.replace(tmp, path)
+        if old is not None:
+            shutil.rmtree(old, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return path
+
+
+def load_artifact(path, mmap_mode="r"):
+    """Load a ``ScoringArtifact`` saved with ``save_artifact``; arrays are memory-mapped."""
+    with open(os.path.join(path, _META)) as fh:
+        meta = json.load(fh)
+    if meta["format_version"] > FORMAT_VERSION:
+        raise ValueError(f"{path} has format version {meta['format_version']}; "
+                         f"this code reads up to {FORMAT_VERSION}")
+    scaler = None
+    if meta["scaler"] is not None:
+        params = {name: np.asarray(np.load(os.path.join(path, "scaler", name + ".npy"),
+                                           mmap_mode=mmap_mode))
+                  for name in meta["scaler"]["params"]}
+        scaler = ArtifactScaler(meta["scaler"]["kind"], params)
+    model = _load_model(meta["model"]["kind"], meta["model"]["params"],
+                        os.path.join(path, "model"), mmap_mode)
+    return ScoringArtifact(model, scaler, meta["features"], meta)
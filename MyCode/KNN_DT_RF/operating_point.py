@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""Operating-point tuning from one fitted model's scores.
+
+The script moves fraud recall by refitting: KNN with k = 3, 7, 9, 11 and a
+forest for every ``max_depth`` from 1 to 29. A fitted model's fraud scores
+on a held-out split already contain every trade-off it can make; only the
+decision threshold moves. ``threshold_sweep`` lists, for every distinct
+score, the confusion counts, precision, recall, false positive rate and
+cost of flagging the rows scoring at least that much, read off one
+``Evaluation`` (one sort).
+
+``tune_threshold`` picks the threshold that meets one goal:
+
+* ``target_recall``: the highest threshold catching that share of frauds;
+* ``target_precision``: the lowest threshold whose flags are at least that
+  precise (the most recall at that precision);
+* ``cost_ratio``: the lowest expected cost when a missed fraud costs
+  ``cost_ratio`` false alarms.
+
+Confidence intervals come from bootstrap resamples of the cached scores:
+each resample is a row count vector, summed per distinct score, so all
+thresholds of a resample are evaluated with one cumulative sum and no
+model is called again. The intervals cover the precision and recall at the
+chosen threshold and the threshold the rule would pick on a resample.
+
+A row is flagged when its score is ``>= threshold`` (``inclusive=True`` in
+``Evaluation`` and ``predictions``).
+
+    point = tune_threshold(y_cal, model.predict_proba(X_cal)[:, 1], target_recall=0.9)
+    point.threshold, point.precision, point.ci["precision"]
+    y_pred = predictions(model.predict_proba(X_test)[:, 1], point.threshold, inclusive=True)
+"""
+
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from evaluation import Evaluation
+
+
+@dataclass
+class OperatingPoint:
+    """A decision threshold and its metrics on the tuning rows.
+
+    ``ci`` maps ``"threshold"``, ``"precision"`` and ``"recall"`` to
+    ``(low, high)`` bootstrap intervals; ``target_met`` is the share of
+    resamples on which ``threshold`` still meets the goal.
+    """
+
+    threshold: float
+    precision: float
+    recall: float
+    fpr: float
+    flagged: float
+    cost: float
+    ci: dict = field(default_factory=dict)
+    target_met: float = float("nan")
+
+
+def threshold_sweep(ev, cost_ratio=1.0):
+    """Every operating point of ``ev`` as arrays, by decreasing threshold.
+
+    The first entry (threshold ``inf``) flags nothing. ``cost`` is
+    ``cost_ratio * fn + fp``.
+    """
+    tp = np.concatenate([[0], ev.tps])
+    fp = np.concatenate([[0], ev.fps])
+    fn, tn = ev.n_pos - tp, ev.n_neg - fp
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 1.0)
+        recall = tp / ev.n_pos if ev.n_pos else np.zeros(len(tp))
+        fpr = fp / ev.n_neg if ev.n_neg else np.zeros(len(fp))
+    return {
+        "threshold": np.concatenate([[np.inf], ev.thresholds]),
+        "tp": tp, "fp": fp, "fn": fn, "tn": tn,
+        "precision": precision, "recall": recall, "fpr": fpr,
+        "flagged": (tp + fp) / ev.n,
+        "cost": cost_ratio * fn + fp,
+    }
+
+
+def _select(tps, fps, target_recall=None, target_precision=None, cost_ratio=None):
+    """Chosen column of every row of the (n, 1 + n_thresholds) count arrays.
+
+    Column 0 flags nothing. Rows where the goal cannot be met get -1.
+    """
+    n_pos = tps[:, -1:]
+    if target_recall is not None:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ok = tps / n_pos >= target_recall
+        chosen = ok.argmax(axis=1)  # first = highest threshold
+    elif target_precision is not None:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ok = tps / (tps + fps) >= target_precision
+        ok[:, 0] = False
+        chosen = ok.shape[1] - 1 - ok[:, ::-1].argmax(axis=1)  # last = most recall
+    else:
+        chosen = (cost_ratio * (n_pos - tps) + fps).argmin(axis=1)
+        ok = np.ones_like(tps, dtype=bool)
+    return np.where(ok[np.arange(len(chosen)), chosen], chosen, -1)
+
+
+def _bootstrap_counts(y_sorted, starts, n_bootstrap, rng, chunk):
+    """Yield per-threshold cumulative ``(tps, fps)`` of bootstrap resamples."""
+    n = len(y_sorted)
+    for begin in range(0, n_bootstrap, chunk):
+        size = min(chunk, n_bootstrap - begin)
+        rows = rng.integers(0, n, size=(size, n)) + (np.arange(size) * n)[:, None]
+        counts = np.bincount(rows.ravel(), minlength=size * n).reshape(size, n)
+        pos = np.add.reduceat(counts * y_sorted, starts, axis=1)
+        neg = np.add.reduceat(counts, starts, axis=1) - pos
+        zero = np.zeros((size, 1), dtype=np.int64)
+        yield (np.concatenate([zero, np.cumsum(pos, axis=1)], axis=1),
+               np.concatenate([zero, np.cumsum(neg, axis=1)], axis=1))
+
+
+def tune_threshold(y_true, scores, target_recall=None, target_precision=None,
+                   cost_ratio=None, n_bootstrap=1000, confidence=0.95, random_state=0,
+                   chunk=64):
+    """Threshold meeting exactly one goal, with bootstrap intervals.
+
+    ``scores`` are held-out fraud scores (``predict_proba(X)[:, 1]``).
+    ``n_bootstrap=0`` skips the intervals. Raises ``ValueError`` when the
+    goal cannot be met on these rows.
+    """
+    goals = {"target_recall": target_recall, "target_precision": target_precision,
+             "cost_ratio": cost_ratio}
+    if sum(value is not None for value in goals.values()) != 1:
+        raise ValueError("pass exactly one of target_recall, target_precision, cost_ratio")
+    goal = {name: value for name, value in goals.items() if value is not None}
+
+    y = np.asarray(y_true) == 1
+    scores = np.asarray(scores, dtype=np.float64)
+    order = np.argsort(-scores, kind="stable")
+    y_sorted, s_sorted = y[order], scores[order]
+    ev = Evaluation._from_sorted(y_sorted, s_sorted)
+    sweep = threshold_sweep(ev, 1.0 if cost_ratio is None else cost_ratio)
+    i = int(_select(sweep["tp"][None], sweep["fp"][None], **goal)[0])
+    if i < 0:
+        raise ValueError(f"no threshold meets {goal} on these rows")
+    point = OperatingPoint(threshold=float(sweep["threshold"][i]),
+                           precision=float(sweep["precision"][i]),
+                           recall=float(sweep["recall"][i]), fpr=float(sweep["fpr"][i]),
+                           flagged=float(sweep["flagged"][i]), cost=float(sweep["cost"][i]))
+    if not n_bootstrap:
+        return point
+
+    rng = np.random.default_rng(random_state)
+    starts = np.append(0, np.flatnonzero(s_sorted[1:] != s_sorted[:-1]) + 1)
+    thresholds = sweep["threshold"]
+    chosen_t, precision, recall, met = [], [], [], []
+    for tps, fps in _bootstrap_counts(y_sorted.astype(np.int64), starts, n_bootstrap, rng,
+                                      chunk):
+        chosen = _select(tps, fps, **goal)
+        chosen_t.append(np.where(chosen >= 0, thresholds[chosen], np.nan))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            p = np.where(tps[:, i] + fps[:, i] > 0, tps[:, i] / (tps[:, i] + fps[:, i]), 1.0)
+            r = tps[:, i] / tps[:, -1]
+        precision.append(p)
+        recall.append(r)
+        if target_recall is not None:
+            met.append(r >= target_recall)
+        elif target_precision is not None:
+            met.append(p >= target_precision)
+        else:  # the point estimate is still the cheapest on the resample
+            cost = cost_ratio * (tps[:, -1:] - tps) + fps
+            met.append(cost[:, i] <= cost.min(axis=1))
+
+    tail = 100 * (1 - confidence) / 2
+    for name, values in (("threshold", chosen_t), ("precision", precision), ("recall", recall)):
+        low, high = np.nanpercentile(np.concatenate(values), [tail, 100 - tail])
+        point.ci[name] = (float(low), float(high))
+    point.target_met = float(np.concatenate(met).mean())
+    return point
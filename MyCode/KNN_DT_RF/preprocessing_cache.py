@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""Memoised splits and preprocessing shared by every model section.
+
+The script calls ``train_test_split(X, y, test_size=0.3, random_state=42,
+...)`` about ten times with the same arguments and refits the scaler and
+rebalances the data in each KNN, decision tree, depth and random forest
+section. ``PreprocessingCache`` computes each split, scaled split and
+balanced set once per run and hands the same (read-only) arrays to every
+section.
+
+Entries are keyed by (split seed, stratify flag, scaler type, balancing
+seed or number of bins), kept in an in-memory LRU of ``maxsize`` entries
+and, with ``disk_dir``, also written as ``.npy`` files that later runs
+memory-map.
+The disk entries live under a hash of the data, so a new dataset never
+reuses stale results.
+
+    prep = PreprocessingCache(X, y)
+    X_train, X_test, y_train, y_test = prep.split(stratify=True)
+    X_train_s, X_test_s = prep.scaled(stratify=False)
+    w_train_b = prep.weights(stratify=False)
+    X_train_q = prep.binned(stratify=False, scaler="standard")
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import MinMaxScaler, RobustScaler, StandardScaler
+
+from balancing import balancement_indices, balancement_weights
+from binning import BinnedMatrix
+from knn_dedup import deduplicate_indices
+
+SCALERS = {
+    "standard": StandardScaler,
+    "robust": RobustScaler,
+    "minmax": MinMaxScaler,
+}
+
+
+class PreprocessingCache:
+    """LRU (+ optional disk) cache of splits, scaled splits and balanced sets."""
+
+    def __init__(self, X, y, test_size=0.3, maxsize=16, disk_dir=None):
+        self.columns = X.columns if isinstance(X, pd.DataFrame) else None
+        self.X = np.asarray(X)
+        self.y = np.asarray(y)
+        self.test_size = test_size
+        self.maxsize = maxsize
+        self.disk_dir = disk_dir
+        self._memory = OrderedDict()
+        self._scalers = {}
+        self.hits = self.misses = 0
+
+    def _data_key(self):
+        if not hasattr(self, "_data_key_"):
+            digest = hashlib.sha1()
+            digest.update(np.ascontiguousarray(self.X).tobytes())
+            digest.update(np.ascontiguousarray(self.y).tobytes())
+            digest.update(str(self.test_size).encode())
+            self._data_key_ = digest.hexdigest()
+        return self._data_key_
+
+    def _disk_path(self, key):
+        name = "-".join(str(part) for part in key)
+        return os.path.join(self.disk_dir, self._data_key(), name)
+
+    def _load(self, key):
+        path = self._disk_path(key)
+        if not os.path.isdir(path):
+            return None
+        n_parts = len([f for f in os.listdir(path) if f.endswith(".npy")])
+        return tuple(np.load(os.path.join(path, f"{i}.npy"), mmap_mode="r")
+                     for i in range(n_parts))
+
+    def _store(self, key, value):
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=os.path.dirname(path))
+        for i, array in enumerate(value):
+            np.save(os.path.join(tmp, f"{i}.npy"), array)
+        if os.path.isdir(path):
+            shutil.rmtree(tmp)
+        else:
+            os.replace(tmp, path)
+
+    def _cached(self, key, compute):
+        if key in self._memory:
+            self.hits += 1
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        value = self._load(key) if self.disk_dir else None
+        if value is None:
+            self.misses += 1
+            value = tuple(np.asarray(a) for a in compute())
+            if self.disk_dir:
+                self._store(key, value)
+        else:
+            self.hits += 1
+        for array in value:
+            # Shared between sections: nobody may modify it in place.
+            if isinstance(array, np.ndarray) and array.flags.owndata:
+                array.flags.writeable = False
+        self._memory[key] = value
+        if len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+        return value
+
+    def _indices(self, seed, stratify):
+        def compute():
+            rows = np.arange(len(self.y))
+            return train_test_split(rows, test_size=self.test_size, random_state=seed,
+                                    stratify=self.y if stratify else None)
+        return self._cached(("indices", seed, stratify), compute)
+
+    def _arrays(self, seed, stratify):
+        def compute():
+            train, test = self._indices(seed, stratify)
+            return self.X[train], self.X[test], self.y[train], self.y[test]
+        return self._cached(("split", seed, stratify), compute)
+
+    def split(self, seed=42, stratify=True):
+        """``train_test_split(X, y, ...)``: ``(X_train, X_test, y_train, y_test)``.
+
+        The feature parts come back as DataFrames when ``X`` was one.
+        """
+        X_train, X_test, y_train, y_test = self._arrays(seed, stratify)
+        if self.columns is not None:
+            X_train = pd.DataFrame(X_train, columns=self.columns, copy=False)
+            X_test = pd.DataFrame(X_test, columns=self.columns, copy=False)
+        return X_train, X_test, y_train, y_test
+
+    def scaler(self, seed=42, stratify=True, scaler="standard"):
+        """The scaler fitted on the split's train part, e.g. to persist with a model."""
+        key = (seed, stratify, scaler)
+        if key not in self._scalers:
+            self._scalers[key] = SCALERS[scaler]().fit(self._arrays(seed, stratify)[0])
+        return self._scalers[key]
+
+    def scaled(self, seed=42, stratify=True, scaler="standard"):
+        """Split scaled with a scaler fitted on its train part: ``(X_train_s, X_test_s)``."""
+        def compute():
+            X_train, X_test, _, _ = self._arrays(seed, stratify)
+            fitted = self.scaler(seed, stratify, scaler)
+            return fitted.transform(X_train), fitted.transform(X_test)
+        return self._cached(("scaled", seed, stratify, scaler), compute)
+
+    def weights(self, seed=42, stratify=True):
+        """``balancement_weights`` of the split's train labels."""
+        return self._cached(("weights", seed, stratify),
+                            lambda: (balancement_weights(self._arrays(seed, stratify)[2]),))[0]
+
+    def binned(self, seed=42, stratify=True, scaler=None, max_bins=256):
+        """Train part as a uint8 ``BinnedMatrix``; of the scaled split with ``scaler``."""
+        def compute():
+            if scaler is None:
+                X_train = self._arrays(seed, stratify)[0]
+            else:
+                X_train = self.scaled(seed, stratify, scaler)[0]
+            binned = BinnedMatrix.from_array(X_train, max_bins)
+            return binned.codes, binned.thresholds
+        return BinnedMatrix(*self._cached(("binned", seed, stratify, scaler, max_bins), compute))
+
+    def balanced(self, seed=42, stratify=True, scaler="standard", balance_seed=0):
+        """Scaled train part balanced like ``dataset_balancement``: ``(X_b, y_b)``."""
+        def compute():
+            X_train_s, _ = self.scaled(seed, stratify, scaler)
+            y_train = self._arrays(seed, stratify)[2]
+            rows = balancement_indices(y_train, balance_seed)
+            return X_train_s[rows], y_train[rows]
+        return self._cached(("balanced", seed, stratify, scaler, balance_seed), compute)
+
+    def balanced_reference(self, seed=42, stratify=True, scaler="standard", balance_seed=0):
+        """Deduplicated balanced set for KNN: ``(X_unique, y_unique, counts)``."""
+        def compute():
+            X_train_s, _ = self.scaled(seed, stratify, scaler)
+            y_train = self._arrays(seed, stratify)[2]
+            rows, counts = deduplicate_indices(balancement_indices(y_train, balance_seed))
+            return X_train_s[rows], y_train[rows], counts
+        return self._cached(("reference", seed, stratify, scaler, balance_seed), compute)
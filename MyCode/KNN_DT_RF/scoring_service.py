@@ -0,0 +1,398 @@
+# -*- coding: utf-8 -*-
+"""Local micro-batching HTTP service for fraud scoring.
+
+Serves the script's final model (under-sampling pipeline, 100 trees of
+depth 8) from a ``model_artifact`` directory, so starting the service loads
+memory-mapped arrays instead of retraining. It runs on asyncio with a small
+HTTP/1.1 front end (keep-alive, no dependency beyond the stdlib):
+
+    POST /score     transactions in the ``creditcard.csv`` column layout,
+                    as JSON (an object keyed by column name, a list of
+                    them, one row of values or a list of rows) or as CSV
+                    lines; a trailing ``Class`` column is ignored.
+                    Returns ``{"fraud_probability": [...], "prediction": [...]}``;
+                    a row is predicted fraud when its probability is
+                    strictly above ``threshold`` (0.5), as ``predict`` does.
+    GET  /metrics   request, row, batch and rejection counters, latency
+                    percentiles and recent throughput, as JSON.
+    GET  /health    ``{"status": "ok"}``.
+
+Requests are not scored one by one. Each request is put on a bounded
+queue, and a single batcher task takes everything queued (up to
+``max_batch`` rows), stacks it and makes one ``predict_proba`` call in a
+worker thread. While a batch is being scored new requests pile up, so
+the batches grow with the load on their own: one row when the service is
+idle, hundreds under load. ``max_wait_ms`` optionally holds a partial batch
+a little longer, but only when the previous batch showed concurrent traffic.
+
+When the queue is full the request is rejected straight away with ``503``
+and a ``Retry-After`` header instead of waiting without bound (backpressure
+the client can see); requests with more than ``max_rows`` rows or a body
+over ``max_body_bytes`` get ``413``, malformed ones ``400`` and a failure
+while scoring ``500``.
+
+    python scoring_service.py --artifact artifacts/rf-final --port 8750
+    python scoring_service.py --artifact artifacts/rf-final --fit --data creditcard.csv
+    curl -d '{"Time": 0, "V1": -1.36, ..., "Amount": 149.62}' localhost:8750/score
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from model_artifact import load_artifact
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error",
+            503: "Service Unavailable"}
+
+
+class RequestError(Exception):
+    """A client error, answered with ``status``."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_rows(body, content_type, features):
+    """Rows of a ``/score`` body as a float64 (n, len(features)) array."""
+    n_features = len(features)
+    try:
+        text = body.decode("utf-8")
+    except UnicodeDecodeError as exc:
+        raise RequestError(400, f"body is not UTF-8: {exc}") from None
+    if "csv" in content_type:
+        lines = [line for line in text.splitlines() if line.strip()]
+        if lines and lines[0].lstrip().lstrip('"')[:1].isalpha():
+            lines = lines[1:]  # header
+        rows = [line.split(",") for line in lines]
+    else:
+        try:
+            data = json.loads(text)
+        except ValueError as exc:
+            raise RequestError(400, f"invalid JSON: {exc}") from None
+        if isinstance(data, dict) and "rows" in data:
+            data = data["rows"]
+        if isinstance(data, dict) or (isinstance(data, list) and data
+                                      and not isinstance(data[0], (dict, list))):
+            data = [data]
+        if not isinstance(data, list):
+            raise RequestError(400, "expected an object, a row or a list of them")
+        try:
+            rows = [[row[name] for name in features] if isinstance(row, dict) else row
+                    for row in data]
+        except KeyError as exc:
+            raise RequestError(400, f"missing column {exc}") from None
+    if not all(isinstance(row, list) for row in rows):
+        raise RequestError(400, "every row must be an object or a list of values")
+    # A trailing Class column (the creditcard.csv layout) is dropped.
+    rows = [row[:n_features] if len(row) == n_features + 1 else row for row in rows]
+    if any(len(row) != n_features for row in rows):
+        raise RequestError(400, f"rows must have {n_features} values ({', '.join(features)})")
+    try:
+        rows = np.array(rows, dtype=np.float64).reshape(len(rows), n_features)
+    except (TypeError, ValueError) as exc:
+        raise RequestError(400, f"non-numeric value: {exc}") from None
+    if not np.isfinite(rows).all():
+        raise RequestError(400, "values must be finite (no null, NaN or infinity)")
+    return rows
+
+
+class Metrics:
+    """Counters plus sliding windows of request latencies and batch sizes."""
+
+    def __init__(self, window=10_000, rate_window=10.0):
+        self.started = time.monotonic()
+        self.rate_window = rate_window
+        self.counts = collections.Counter()
+        self.latencies = collections.deque(maxlen=window)
+        self.batch_rows = collections.deque(maxlen=window)
+        self.batch_ms = collections.deque(maxlen=window)
+        self._recent = collections.deque()  # (time, rows) of recent batches
+
+    def batch(self, n_rows, n_requests, elapsed):
+        now = time.monotonic()
+        self.counts["batches"] += 1
+        self.counts["rows"] += n_rows
+        self.counts["requests"] += n_requests
+        self.batch_rows.append(n_rows)
+        self.batch_ms.append(elapsed * 1e3)
+        self._recent.append((now, n_rows))
+        while self._recent and self._recent[0][0] < now - self.rate_window:
+            self._recent.popleft()
+
+    def snapshot(self, queue_depth):
+        def percentiles(values):
+            if not values:
+                return None
+            p50, p90, p99 = np.percentile(np.fromiter(values, float), [50, 90, 99])
+            return {"p50": round(p50, 3), "p90": round(p90, 3), "p99": round(p99, 3)}
+
+        now = time.monotonic()
+        uptime = now - self.started
+        recent = sum(rows for t, rows in self._recent if t >= now - self.rate_window)
+        return {
+            "uptime_s": round(uptime, 3),
+            **{name: self.counts[name]
+               for name in ("requests", "rows", "batches", "rejected", "errors")},
+            "queue_depth": queue_depth,
+            "rows_per_s": round(recent / min(self.rate_window, uptime or 1.0), 1),
+            "mean_batch_rows": round(float(np.mean(self.batch_rows)), 2)
+            if self.batch_rows else None,
+            "max_batch_rows": max(self.batch_rows, default=None),
+            "latency_ms": percentiles(self.latencies),
+            "batch_ms": percentiles(self.batch_ms),
+        }
+
+
+class MicroBatcher:
+    """Collects concurrent requests into single ``score`` calls.
+
+    ``score`` maps a (n, n_features) array to per-row results; it runs in
+    a worker thread so the event loop keeps accepting requests meanwhile.
+    """
+
+    def __init__(self, score, max_batch=512, max_wait_ms=0.0, max_queue=1024, metrics=None):
+        self.score = score
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1e3
+        self.queue = asyncio.Queue(max_queue)
+        self.metrics = metrics or Metrics()
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="score")
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._executor.shutdown()
+
+    async def submit(self, rows):
+        """Score ``rows``; raises ``asyncio.QueueFull`` when the queue is full."""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((rows, future))
+        return await future
+
+    def _drain(self, batch, n_rows):
+        while n_rows < self.max_batch and not self.queue.empty():
+            item = self.queue.get_nowait()
+            batch.append(item)
+            n_rows += len(item[0])
+        return n_rows
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        previous = 1
+        while True:
+            batch = [await self.queue.get()]
+            n_rows = self._drain(batch, len(batch[0][0]))
+            if self.max_wait and previous > 1 and n_rows < self.max_batch:
+                deadline = loop.time() + self.max_wait
+                while n_rows < self.max_batch and loop.time() < deadline:
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), deadline - loop.time())
+                    except asyncio.TimeoutError:
+                        break
+                    batch.append(item)
+                    n_rows = self._drain(batch, n_rows + len(item[0]))
+            previous = len(batch)
+            batch = [(rows, future) for rows, future in batch if not future.cancelled()]
+            if not batch:
+                continue
+            start = time.perf_counter()
+            try:
+                X = np.concatenate([rows for rows, _ in batch])
+                results = await loop.run_in_executor(self._executor, self.score, X)
+            except Exception as exc:  # reported to every waiting request
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            self.metrics.batch(len(X), len(batch), time.perf_counter() - start)
+            offset = 0
+            for rows, future in batch:
+                if not future.done():
+                    future.set_result(results[offset:offset + len(rows)])
+                offset += len(rows)
+
+
+class ScoringService:
+    """The HTTP front end: parses requests, submits them and answers."""
+
+    def __init__(self, scoring, max_batch=512, max_wait_ms=0.0, max_queue=1024,
+                 max_rows=10_000, max_body_bytes=16 << 20, threshold=0.5):
+        self.scoring = scoring
+        self.features = scoring.features
+        classes = list(np.asarray(scoring.model.classes_))
+        self.fraud_column = classes.index(1) if 1 in classes else len(classes) - 1
+        self.threshold = threshold
+        self.max_rows = max_rows
+        self.max_body_bytes = max_body_bytes
+        self.metrics = Metrics()
+        self.batcher = MicroBatcher(self._score, max_batch, max_wait_ms, max_queue,
+                                    self.metrics)
+
+    def _score(self, X):
+        return self.scoring.predict_proba(X)[:, self.fraud_column]
+
+    async def handle_score(self, body, content_type):
+        rows = parse_rows(body, content_type, self.features)
+        if len(rows) > self.max_rows:
+            raise RequestError(413, f"at most {self.max_rows} rows per request")
+        if not len(rows):
+            return {"fraud_probability": [], "prediction": []}
+        proba = await self.batcher.submit(rows)
+        return {"fraud_probability": proba.tolist(),
+                "prediction": (proba > self.threshold).astype(int).tolist()}
+
+    async def route(self, method, path, body, headers):
+        path = path.split("?", 1)[0]
+        if path == "/score":
+            if method != "POST":
+                raise RequestError(405, "use POST")
+            return await self.handle_score(body, headers.get("content-type", ""))
+        if path == "/metrics":
+            return self.metrics.snapshot(self.batcher.queue.qsize())
+        if path == "/health":
+            return {"status": "ok"}
+        raise RequestError(404, f"no route {path}")
+
+    def _respond(self, writer, status, payload, keep_alive, extra=None):
+        data = json.dumps(payload).encode()
+        response = [f"HTTP/1.1 {status} {_REASONS[status]}",
+                    "Content-Type: application/json",
+                    f"Content-Length: {len(data)}",
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        response += [f"{name}: {value}" for name, value in (extra or {}).items()]
+        writer.write(("\r\n".join(response) + "\r\n\r\n").encode() + data)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        ConnectionError):
+                    break
+                request_line, *lines = head.decode("latin-1").split("\r\n")
+                method, path, _ = (request_line.split(" ", 2) + ["", ""])[:3]
+                headers = {}
+                for line in lines:
+                    name, sep, value = line.partition(":")
+                    if sep:
+                        headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    length = int(headers.get("content-length", 0))
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    length = None
+                if length is None or length > self.max_body_bytes:
+                    # The body is left unread, so the connection cannot be reused.
+                    status, message = ((400, "invalid Content-Length") if length is None else
+                                       (413, f"body over {self.max_body_bytes} bytes"))
+                    self.metrics.counts["errors"] += 1
+                    self._respond(writer, status, {"error": message}, False)
+                    await writer.drain()
+                    break
+                body = await reader.readexactly(length)
+
+                start = time.perf_counter()
+                status, extra = 200, {}
+                try:
+                    payload = await self.route(method, path, body, headers)
+                except RequestError as exc:
+                    status, payload = exc.status, {"error": str(exc)}
+                    self.metrics.counts["errors"] += 1
+                except asyncio.QueueFull:
+                    status, payload = 503, {"error": "scoring queue full"}
+                    extra = {"Retry-After": "1"}
+                    self.metrics.counts["rejected"] += 1
+                except Exception as exc:  # a scoring failure must still get an answer
+                    status, payload = 500, {"error": f"{type(exc).__name__}: {exc}"}
+                    self.metrics.counts["errors"] += 1
+                if status == 200 and path.startswith("/score"):
+                    self.metrics.latencies.append((time.perf_counter() - start) * 1e3)
+
+                self._respond(writer, status, payload, keep_alive, extra)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8750, ready=None):
+        """Run until cancelled; ``ready`` (an ``asyncio.Event``) is set once listening."""
+        self.batcher.start()
+        server = await asyncio.start_server(self.handle_connection, host, port, backlog=1024)
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.batcher.close()
+
+
+def fit_artifact(path, data=None):
+    """Fit the script's final model on the unstratified split and save it to ``path``."""
+    from imblearn.pipeline import make_pipeline
+    from imblearn.under_sampling import RandomUnderSampler
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import StandardScaler
+
+    from data_loader import FEATURES, load_creditcard_arrays
+    from model_artifact import save_artifact
+
+    X, y, _ = load_creditcard_arrays(data)
+    X_train, _, y_train, _ = train_test_split(
+        np.asarray(X, dtype=np.float64), np.asarray(y), test_size=0.3, random_state=42)
+    scaler = StandardScaler().fit(X_train)
+    model = make_pipeline(RandomUnderSampler(random_state=42, sampling_strategy="majority"),
+                          RandomForestClassifier(n_estimators=100, random_state=42, max_depth=8))
+    model.fit(scaler.transform(X_train), y_train)
+    return save_artifact(path, model, scaler=scaler, features=FEATURES,
+                         metadata={"model": "under-sampled random forest, depth 8"})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--artifact", default="artifacts/rf-final")
+    parser.add_argument("--fit", action="store_true",
+                        help="fit and save the model first if the artifact is missing")
+    parser.add_argument("--data", help="creditcard.csv file or folder (with --fit)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8750)
+    parser.add_argument("--max-batch", type=int, default=512)
+    parser.add_argument("--max-wait-ms", type=float, default=0.0)
+    parser.add_argument("--max-queue", type=int, default=1024)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    args = parser.parse_args(argv)
+
+    if args.fit and not os.path.isdir(args.artifact):
+        fit_artifact(args.artifact, args.data)
+    service = ScoringService(load_artifact(args.artifact), args.max_batch, args.max_wait_ms,
+                             args.max_queue, threshold=args.threshold)
+    print(f"serving {args.artifact} on http://{args.host}:{args.port}", flush=True)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
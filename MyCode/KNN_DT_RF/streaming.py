@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""Chunked streaming pipeline for transaction logs larger than memory.
+
+The logs have the ``creditcard.csv`` schema (Time, V1-V28, Amount, Class).
+Nothing here holds more than one chunk in memory:
+
+1. pass one assigns every row to the train or test split (stratified within
+   each chunk) and fits a ``StandardScaler`` incrementally on the train rows;
+2. pass two standardizes each chunk and writes it as float32 ``.npy`` shards,
+   one per (split, chunk), plus a ``manifest.json``.
+
+Training and evaluation then stream over the memory-mapped shards, e.g. with
+estimators that support ``partial_fit``.
+
+    manifest = write_shards("logs/", "shards/", chunksize=500_000)
+    for X, y in iter_shards("shards/", "train"):
+        ...
+"""
+
+import glob
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+from data_loader import FEATURES, TARGET, COLUMNS
+
+MANIFEST = "manifest.json"
+
+
+def _csv_paths(paths):
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+    out = []
+    for path in paths:
+        if os.path.isdir(path):
+            out.extend(sorted(glob.glob(os.path.join(path, "*.csv"))))
+        else:
+            out.append(path)
+    if not out:
+        raise FileNotFoundError(f"no CSV files in {paths}")
+    return out
+
+
+def iter_csv_chunks(paths, chunksize=200_000):
+    """Yield ``(X, y)`` float32/int8 chunks from one or more CSV files."""
+    dtypes = {c: np.float32 for c in FEATURES}
+    dtypes[TARGET] = np.int8
+    for path in _csv_paths(paths):
+        for chunk in pd.read_csv(path, usecols=COLUMNS, dtype=dtypes,
+                                 chunksize=chunksize):
+            yield chunk[FEATURES].to_numpy(np.float32), chunk[TARGET].to_numpy(np.int8)
+
+
+def iter_split_masks(chunks, test_size=0.3, seed=42, stratify=True):
+    """Yield ``(X, y, is_test)`` for each chunk.
+
+    The assignment only depends on the chunk sequence and ``seed``, so both
+    passes see the same split without storing it. With ``stratify`` each
+    class contributes ``test_size`` of its rows per chunk; the fractional
+    remainder is carried over so rare classes (frauds) are split correctly
+    across many small chunks.
+    """
+    rng = np.random.default_rng(seed)
+    carry = {}
+    for X, y in chunks:
+        is_test = np.zeros(len(y), dtype=bool)
+        if stratify:
+            for label in np.unique(y):
+                rows = np.flatnonzero(y == label)
+                want = carry.get(label, 0.0) + test_size * len(rows)
+                n_test = min(int(want), len(rows))
+                carry[label] = want - n_test
+                is_test[rng.choice(rows, n_test, replace=False)] = True
+        else:
+            is_test = rng.random(len(y)) < test_size
+        yield X, y, is_test
+
+
+def fit_scaler_streaming(paths, chunksize=200_000, test_size=0.3, seed=42,
+                         stratify=True, scaler=None):
+    """Fit ``scaler`` (default StandardScaler) on the train rows, chunk by chunk."""
+    scaler = scaler if scaler is not None else StandardScaler()
+    chunks = iter_csv_chunks(paths, chunksize)
+    for X, y, is_test in iter_split_masks(chunks, test_size, seed, stratify):
+        if (~is_test).any():
+            scaler.partial_fit(X[~is_test])
+    return scaler
+
+
+def write_shards(paths, out_dir, chunksize=200_000, test_size=0.3, seed=42,
+                 stratify=True, scaler=None):
+    """Standardize the logs and write split-assigned shards to ``out_dir``.
+
+    Peak memory is a few chunks regardless of the input size. Returns the
+    manifest, which is also saved as ``out_dir/manifest.json``.
+    """
+    if scaler is None:
+        scaler = fit_scaler_streaming(paths, chunksize, test_size, seed, stratify)
+    os.makedirs(out_dir, exist_ok=True)
+
+    shards = {"train": [], "test": []}
+    chunks = iter_csv_chunks(paths, chunksize)
+    masks = iter_split_masks(chunks, test_size, seed, stratify)
+    for i, (X, y, is_test) in enumerate(masks):
+        for split, rows in (("train", ~is_test), ("test", is_test)):
+            if not rows.any():
+                continue
+            name = f"{split}-{i:05d}"
+            np.save(os.path.join(out_dir, name + "-X.npy"),
+                    scaler.transform(X[rows]).astype(np.float32))
+            np.save(os.path.join(out_dir, name + "-y.npy"), y[rows])
+            shards[split].append({"name": name, "rows": int(rows.sum()),
+                                  "positives": int(y[rows].sum())})
+
+    manifest = {
+        "features": FEATURES,
+        "test_size": test_size,
+        "seed": seed,
+        "stratify": stratify,
+        "scaler_mean": scaler.mean_.tolist(),
+        "scaler_scale": scaler.scale_.tolist(),
+        "shards": shards,
+    }
+    with open(os.path.join(out_dir, MANIFEST), "w") as fh:
+        json.dump(manifest, fh, indent=1)
+    return manifest
+
+
+def read_manifest(out_dir):
+    with open(os.path.join(out_dir, MANIFEST)) as fh:
+        return json.load(fh)
+
+
+def iter_shards(out_dir, split="train"):
+    """Yield memory-mapped ``(X, y)`` shards of ``split``."""
+    for shard in read_manifest(out_dir)["shards"][split]:
+        prefix = os.path.join(out_dir, shard["name"])
+        yield (np.load(prefix + "-X.npy", mmap_mode="r"),
+               np.load(prefix + "-y.npy", mmap_mode="r"))
+
+
+def partial_fit_shards(estimator, out_dir, classes=(0, 1), epochs=1):
+    """Train an estimator with ``partial_fit`` over the train shards."""
+    classes = np.asarray(classes)
+    for _ in range(epochs):
+        for X, y in iter_shards(out_dir, "train"):
+            estimator.partial_fit(X, y, classes=classes)
+    return estimator
+
+
+def predict_shards(model, out_dir, split="test", proba=False):
+    """Return ``(y_true, y_pred)`` for ``split``, scored shard by shard.
+
+    Only the label and prediction vectors (a few bytes per row) are kept,
+    so evaluation memory grows with the row count, not with the features.
+    """
+    y_true, y_pred = [], []
+    for X, y in iter_shards(out_dir, split):
+        y_true.append(np.asarray(y))
+        y_pred.append(model.predict_proba(X)[:, 1] if proba else model.predict(X))
+    return np.concatenate(y_true), np.concatenate(y_pred)
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""Synthetic transactions with the ``creditcard.csv`` schema, at any size.
+
+284,807 rows are too few to show how the models and pipelines scale, and
+the only data path is the Kaggle download. ``CopulaModel`` fits the real
+data once and ``write_dataset`` then writes 10^5 to 10^8 rows with the same
+columns (Time, V1-V28, Amount, Class) as chunked CSV files, offline.
+
+The model is a Gaussian copula per class: each column keeps its empirical
+marginal (``n_quantiles`` quantiles, interpolated), and the dependence
+between columns is the correlation of their normal scores
+(``ndtri((rank - 0.5) / n)``). Fraud and legitimate rows have their own
+marginals and correlations, so the classes stay as separable as in the
+real data; ``fraud_rate`` (default: the fitted one, ~0.17%) sets their mix.
+
+``Time`` is written sorted across all files. The rows of a chunk are the
+next ``m`` order statistics of the remaining uniforms: the chunk's largest
+is one Beta draw, the others are sorted uniforms below it, so chunks are
+independent once their bounds are drawn and are generated in a process
+pool. The other columns are drawn from the copula conditionally on each
+row's Time score, which keeps their correlation with the time of day.
+``periods`` repeats the fitted time window (two days for the real data)
+that many times. Class is drawn independently of Time.
+
+Each chunk is a ``part-NNNNN.csv`` with a header (what
+``streaming.write_shards`` reads), or, with ``single_file``, the parts are
+joined into one ``creditcard.csv`` for ``load_creditcard_arrays``.
+
+    X, y, _ = load_creditcard_arrays()
+    model = CopulaModel().fit(X, y)
+    write_dataset(model, "synthetic/10m", 10_000_000, n_workers=4)
+
+    python synthetic_data.py --rows 1e7 --out synthetic/10m --workers 4
+"""
+
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr, ndtri
+from scipy.stats import rankdata
+
+from data_loader import COLUMNS, FEATURES
+
+DAY = 86_400
+META = "synthetic.json"
+HEADER = ",".join(COLUMNS) + "\n"
+ROW_FORMAT = ",".join(["%.10g"] + ["%.8g"] * (len(FEATURES) - 1) + ["%d"]) + "\n"
+
+
+class CopulaModel:
+    """Per-class Gaussian copula of the creditcard features.
+
+    After ``fit``: ``fraud_rate_``, ``period_`` (the time window in whole
+    days, in seconds), ``time_quantiles_`` (pooled Time marginal) and, per
+    class, ``quantiles_[c]`` (marginals), ``beta_[c]`` and ``factor_[c]``
+    (the other columns' normal scores given the Time score).
+    """
+
+    def __init__(self, n_quantiles=1001):
+        self.n_quantiles = n_quantiles
+
+    def fit(self, X, y):
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y)
+        self.fraud_rate_ = float(np.mean(y == 1))
+        self.period_ = DAY * max(1, int(np.ceil(X[:, 0].max() / DAY)))
+        self.time_quantiles_ = np.quantile(X[:, 0], np.linspace(0, 1, self.n_quantiles))
+        self.quantiles_, self.beta_, self.factor_ = {}, {}, {}
+        for c in (0, 1):
+            X_c = X[y == c]
+            self.quantiles_[c] = np.quantile(
+                X_c, np.linspace(0, 1, min(self.n_quantiles, len(X_c))), axis=0)
+            scores = ndtri((rankdata(X_c, axis=0) - 0.5) / len(X_c))
+            corr = np.corrcoef(scores, rowvar=False)
+            beta = corr[1:, 0]
+            # Covariance of the other scores given Time's; eigenvalues are
+            # clipped so that a near-singular estimate still factors.
+            w, V = np.linalg.eigh(corr[1:, 1:] - np.outer(beta, beta))
+            self.beta_[c] = beta
+            self.factor_[c] = V * np.sqrt(np.clip(w, 1e-9, None))
+        return self
+
+    def sample(self, n_rows, low, high, rng, fraud_rate=None, periods=1):
+        """``n_rows`` rows whose sorted Time uniforms lie in ``(low, high]``.
+
+        The last row sits exactly at ``high`` (the chunk's largest order
+        statistic). Returns a DataFrame with ``COLUMNS``.
+        """
+        fraud_rate = self.fraud_rate_ if fraud_rate is None else fraud_rate
+        u = np.append(np.sort(rng.uniform(low, high, n_rows - 1)), high)
+        window = np.minimum(np.floor(u * periods), periods - 1)
+        t = np.interp(u * periods - window, np.linspace(0, 1, len(self.time_quantiles_)),
+                      self.time_quantiles_)
+        X = np.empty((n_rows, len(FEATURES)))
+        X[:, 0] = np.floor(t) + window * self.period_
+        y = (rng.random(n_rows) < fraud_rate).astype(np.int64)
+        for c in (0, 1):
+            rows = np.flatnonzero(y == c)
+            if not len(rows):
+                continue
+            q = self.quantiles_[c]
+            p = np.linspace(0, 1, len(q))
+            half = 0.5 / len(q)
+            z_time = ndtri(np.clip(np.interp(t[rows], q[:, 0], p), half, 1 - half))
+            z = (z_time[:, None] * self.beta_[c]
+                 + rng.standard_normal((len(rows), len(self.beta_[c]))) @ self.factor_[c].T)
+            u_other = ndtr(z)
+            for j in range(1, X.shape[1]):
+                X[rows, j] = np.interp(u_other[:, j - 1], p, q[:, j])
+        amount = FEATURES.index("Amount")
+        X[:, amount] = np.round(X[:, amount], 2)
+        frame = pd.DataFrame(X, columns=FEATURES)
+        frame["Class"] = y
+        return frame[COLUMNS]
+
+
+def chunk_bounds(n_rows, chunksize, rng):
+    """``(rows, low, high)`` of every chunk of ``n_rows`` sorted uniforms.
+
+    The largest of the next ``m`` of ``r`` remaining uniforms above ``low``
+    is ``low + (1 - low) * Beta(m, r - m + 1)``.
+    """
+    bounds, low, remaining = [], 0.0, n_rows
+    while remaining:
+        m = min(chunksize, remaining)
+        high = 1.0 if m == remaining else low + (1 - low) * rng.beta(m, remaining - m + 1)
+        bounds.append((m, low, high))
+        low, remaining = high, remaining - m
+    return bounds
+
+
+def _write_part(task):
+    model, path, (m, low, high), seed, fraud_rate, periods = task
+    frame = model.sample(m, low, high, np.random.default_rng(seed), fraud_rate, periods)
+    tmp = path + ".tmp"
+    # One format string per row writes ~4x faster than DataFrame.to_csv.
+    with open(tmp, "w") as fh:
+        fh.write(HEADER)
+        fh.writelines(ROW_FORMAT % tuple(row) for row in frame.to_numpy().tolist())
+    os.replace(tmp, path)
+    return int(frame["Class"].sum())
+
+
+def write_dataset(model, out_dir, n_rows, fraud_rate=None, chunksize=1_000_000, periods=1,
+                  single_file=False, n_workers=None, random_state=None):
+    """Write ``n_rows`` synthetic rows under ``out_dir``; returns the metadata.
+
+    ``out_dir/synthetic.json`` records the parameters, the files and the
+    number of frauds written.
+    """
+    if int(n_rows) < 1:
+        raise ValueError(f"n_rows must be at least 1, got {n_rows}")
+    if int(chunksize) < 1 or int(periods) < 1:
+        raise ValueError(f"chunksize and periods must be at least 1, got {chunksize}, {periods}")
+    if fraud_rate is not None and not 0 <= fraud_rate <= 1:
+        raise ValueError(f"fraud_rate must be between 0 and 1, got {fraud_rate}")
+    os.makedirs(out_dir, exist_ok=True)
+    seed = np.random.SeedSequence(random_state)
+    bounds = chunk_bounds(int(n_rows), int(chunksize), np.random.default_rng(seed))
+    seeds = seed.spawn(len(bounds))
+    paths = [os.path.join(out_dir, f"part-{i:05d}.csv") for i in range(len(bounds))]
+    tasks = [(model, path, b, s, fraud_rate, periods) for path, b, s in zip(paths, bounds, seeds)]
+    n_workers = min(n_workers or os.cpu_count(), len(tasks))
+    if n_workers == 1:
+        frauds = [_write_part(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(n_workers) as pool:
+            frauds = list(pool.map(_write_part, tasks))
+
+    files = [os.path.basename(path) for path in paths]
+    if single_file:
+        target = os.path.join(out_dir, "creditcard.csv")
+        with open(target + ".tmp", "wb") as out:
+            for i, path in enumerate(paths):
+                with open(path, "rb") as part:
+                    if i:
+                        part.readline()  # header
+                    shutil.copyfileobj(part, out, 1 << 20)
+        os.replace(target + ".tmp", target)
+        for path in paths:
+            os.remove(path)
+        files = ["creditcard.csv"]
+
+    meta = {"rows": int(n_rows), "frauds": int(sum(frauds)),
+            "fraud_rate": model.fraud_rate_ if fraud_rate is None else fraud_rate,
+            "periods": periods, "chunksize": int(chunksize), "random_state": random_state,
+            "files": files}
+    with open(os.path.join(out_dir, META), "w") as fh:
+        json.dump(meta, fh, indent=1)
+    return meta
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from data_loader import load_creditcard_arrays
+
+    parser = argparse.ArgumentParser(description="Write a synthetic creditcard dataset.")
+    parser.add_argument("--data", help="real creditcard.csv file or folder to fit")
+    parser.add_argument("--out", required=True, help="output folder")
+    parser.add_argument("--rows", type=float, default=1e6, help="e.g. 1e5 .. 1e8")
+    parser.add_argument("--fraud-rate", type=float, default=None)
+    parser.add_argument("--chunksize", type=float, default=1e6)
+    parser.add_argument("--periods", type=int, default=1)
+    parser.add_argument("--single-file", action="store_true")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    X, y, _ = load_creditcard_arrays(args.data)
+    model = CopulaModel().fit(X, y)
+    start = time.perf_counter()
+    meta = write_dataset(model, args.out, int(args.rows), args.fraud_rate, int(args.chunksize),
+                         args.periods, args.single_file, args.workers, args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"{meta['rows']} rows ({meta['frauds']} frauds) in {len(meta['files'])} file(s), "
+          f"{elapsed:.1f} s, {meta['rows'] / elapsed:,.0f} rows/s")
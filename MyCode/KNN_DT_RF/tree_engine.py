@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+"""Native ID3 / C4.5 decision trees with histogram split search.
+
+The script calls ``DecisionTreeClassifier(criterion="entropy")`` "ID3" and
+``DecisionTreeClassifier(criterion="gini")`` "C4.5", but the second is
+CART: neither gain ratio nor C4.5's pruning is involved. ``DecisionTree``
+implements both algorithms for the continuous features of this dataset
+(binary ``x <= threshold`` splits, as C4.5 does for numeric attributes):
+
+* ``criterion="id3"``: the split with the largest information gain;
+* ``criterion="gini"``: the split with the largest Gini impurity decrease
+  (CART's rule, what sklearn's default ``criterion="gini"`` uses);
+* ``criterion="c45"``: C4.5's rules. For each feature the threshold with
+  the largest gain is found, its gain is reduced by ``log2(#thresholds) / N``
+  (Release 8's correction for continuous attributes), and among features
+  with at least the average corrected gain the one with the best gain ratio
+  wins. The grown tree is then pruned bottom-up with C4.5's pessimistic
+  (upper confidence bound) error estimate at ``confidence`` = 0.25, and
+  each branch needs at least two rows. Subtree raising is not done.
+  ``sample_weight`` is rescaled to sum to the number of rows first, so that
+  N and the error counts are on C4.5's case-count scale.
+
+Split search never sorts: the features are quantised into at most 256
+uint8 bins (a ``binning.BinnedMatrix``, passed in or built by ``fit``). A
+node's class histogram over all (feature, bin) pairs is one
+``np.bincount``, the gain of every threshold of every feature is computed
+at once from its cumulative sums, and only the smaller child of a split is
+histogrammed: the larger one is the parent's histogram minus it.
+
+``RandomForest`` bags such trees (bootstrap counts as sample weights,
+``max_features`` candidate features per node) over one shared binned
+matrix.
+
+    tree = DecisionTree(criterion="c45").fit(X_train, y_train, sample_weight=w)
+    y_pred = tree.predict(X_test)
+"""
+
+from statistics import NormalDist
+
+import numpy as np
+from sklearn.utils import check_random_state
+
+from binning import BinnedMatrix
+
+
+def _xlogx(a):
+    return np.where(a > 0, a * np.log2(np.where(a > 0, a, 1)), 0.0)
+
+
+def _n_candidates(max_features, n_features):
+    if max_features is None:
+        return n_features
+    if max_features == "sqrt":
+        return max(1, int(np.sqrt(n_features)))
+    if isinstance(max_features, float):
+        return max(1, int(max_features * n_features))
+    return min(int(max_features), n_features)
+
+
+def added_errors(n, e, confidence=0.25):
+    """C4.5's extra errors: upper confidence bound of ``e`` errors in ``n`` cases, minus ``e``."""
+    if n <= 0:
+        return 0.0
+    if e < 1:
+        base = n * (1 - confidence ** (1 / n))
+        return base if e == 0 else base + e * (added_errors(n, 1, confidence) - base)
+    if e + 0.5 >= n:
+        return 0.67 * max(n - e, 0.0)  # Release 8's AddErrs
+    z = NormalDist().inv_cdf(1 - confidence)
+    f = (e + 0.5) / n
+    r = (f + z * z / (2 * n) + z * np.sqrt(f / n - f * f / n + z * z / (4 * n * n))) \
+        / (1 + z * z / n)
+    return r * n - e
+
+
+def _case_weights(sample_weight):
+    """``sample_weight`` rescaled to sum to the number of rows, or None.
+
+    C4.5's split penalty and pruning estimates count cases, so weights such
+    as ``balancement_weights`` (one fraud worth ~580 rows) are brought back
+    to that scale; only their ratios matter to the splits.
+    """
+    if sample_weight is None:
+        return None
+    weights = np.asarray(sample_weight, dtype=np.float64)
+    total = weights.sum()
+    if not total > 0:
+        raise ValueError("sample_weight must have a positive sum")
+    return weights * (len(weights) / total)
+
+
+class DecisionTree:
+    """ID3 or C4.5 classification tree on quantised features.
+
+    Parameters
+    ----------
+    criterion : "id3" (information gain), "gini" (Gini impurity decrease)
+        or "c45" (gain ratio + pruning).
+    max_depth : maximum depth, unlimited by default.
+    min_samples_leaf : minimum rows per leaf; None means 1 for ID3 and 2
+        for C4.5.
+    prune : pessimistic error pruning; None means only for C4.5.
+    confidence : C4.5's confidence factor for pruning.
+    max_features : features drawn as split candidates at each node
+        ("sqrt", an int, a fraction or None for all), as in a random forest.
+    max_bins, subsample : binning of ``X`` when it is not already a
+        ``BinnedMatrix``.
+    random_state : seed of the binning row sample and of ``max_features``.
+    """
+
+    def __init__(self, criterion="id3", max_depth=None, min_samples_leaf=None, prune=None,
+                 confidence=0.25, max_features=None, max_bins=256, subsample=200_000,
+                 random_state=0):
+        self.criterion = criterion
+        self.max_depth = max_depth
+        self.min_samples_leaf = min_samples_leaf
+        self.prune = prune
+        self.confidence = confidence
+        self.max_features = max_features
+        self.max_bins = max_bins
+        self.subsample = subsample
+        self.random_state = random_state
+
+    def fit(self, X, y, sample_weight=None):
+        """Fit on a float matrix or on a ``BinnedMatrix`` of it."""
+        if not isinstance(X, BinnedMatrix):
+            X = BinnedMatrix.from_array(X, self.max_bins, self.subsample, self.random_state)
+        self.classes_, y_codes = np.unique(np.asarray(y), return_inverse=True)
+        return self._fit(X, y_codes, _case_weights(sample_weight))
+
+    def _fit(self, binned, y_codes, weights, rows=None):
+        """Grow on ``binned.codes[rows]`` given class codes into ``classes_``."""
+        if self.criterion not in ("id3", "gini", "c45"):
+            raise ValueError(f"criterion must be 'id3', 'gini' or 'c45', got {self.criterion!r}")
+        self.n_features_in_ = binned.shape[1]
+        self.bin_thresholds_ = binned.thresholds
+        self._rng = check_random_state(self.random_state)
+        self._grow(binned.codes, np.asarray(y_codes, dtype=np.intp), weights, rows)
+        prune = self.criterion == "c45" if self.prune is None else self.prune
+        if prune:
+            self._prune()
+        del self._rng
+        return self
+
+    # -- growing ---------------------------------------------------------
+
+    def _histogram(self, codes, y, weights, rows):
+        """Weighted (n_features, n_bins, n_classes) histogram of ``rows``.
+
+        With sample weights the unweighted counts per (feature, bin) are
+        returned too, for ``min_samples_leaf``.
+        """
+        n_features, n_classes = codes.shape[1], len(self.classes_)
+        n_bins = self.bin_thresholds_.shape[1] + 1
+        size = n_features * n_bins * n_classes
+        keys = codes[rows].astype(np.intp)
+        keys *= n_classes
+        keys += y[rows, None]
+        keys += np.arange(n_features) * (n_bins * n_classes)
+        keys = keys.ravel()
+        shape = (n_features, n_bins, n_classes)
+        if weights is None:
+            hist = np.bincount(keys, minlength=size).reshape(shape).astype(np.float64)
+            return hist, None
+        hist = np.bincount(keys, np.repeat(weights[rows], n_features), size).reshape(shape)
+        counts = np.bincount(keys, minlength=size).reshape(shape).sum(axis=2)
+        return hist, counts
+
+    def _best_split(self, hist, counts, n_rows):
+        """``(feature, bin)`` of the best split, or None."""
+        total = hist[0].sum(axis=0)
+        n = total.sum()
+        left = np.cumsum(hist, axis=1)[:, :-1]
+        right = total - left
+        n_left, n_right = left.sum(axis=2), right.sum(axis=2)
+        if counts is None:
+            c_left = n_left
+        else:
+            c_left = np.cumsum(counts, axis=1)[:, :-1]
+        valid = (n_left > 0) & (n_right > 0) & (c_left >= self.min_samples_leaf_) \
+            & (n_rows - c_left >= self.min_samples_leaf_)
+        if self.n_candidates_ < len(valid):
+            skipped = self._rng.permutation(len(valid))[self.n_candidates_:]
+            valid[skipped] = False
+        if not valid.any():
+            return None
+        if self.criterion == "gini":
+            # n * gini = n - sum(count^2) / n, per node.
+            parent = n - (total ** 2).sum() / n
+            children = (n_left - (left ** 2).sum(axis=2) / np.maximum(n_left, 1e-300)
+                        + n_right - (right ** 2).sum(axis=2) / np.maximum(n_right, 1e-300))
+        else:
+            parent = _xlogx(n) - _xlogx(total).sum()
+            children = (_xlogx(n_left) - _xlogx(left).sum(axis=2)
+                        + _xlogx(n_right) - _xlogx(right).sum(axis=2))
+        gain = np.where(valid, (parent - children) / n, -np.inf)
+
+        if self.criterion != "c45":
+            f, t = np.unravel_index(np.argmax(gain), gain.shape)
+            return (f, t) if gain[f, t] > 1e-12 else None
+
+        features = np.flatnonzero(valid.any(axis=1))
+        t_best = gain[features].argmax(axis=1)
+        n_thresholds = valid[features].sum(axis=1)
+        best_gain = gain[features, t_best] - np.log2(n_thresholds) / n
+        p_left = n_left[features, t_best] / n
+        split_info = -(_xlogx(p_left) + _xlogx(1 - p_left))
+        eligible = best_gain > 1e-12
+        if not eligible.any():
+            return None
+        eligible &= best_gain >= best_gain[eligible].mean() - 1e-3
+        ratio = np.where(eligible, best_gain / np.maximum(split_info, 1e-12), -np.inf)
+        i = np.argmax(ratio)
+        return features[i], t_best[i]
+
+    def _grow(self, codes, y, weights, rows=None):
+        c45 = self.criterion == "c45"
+        self.min_samples_leaf_ = self.min_samples_leaf or (2 if c45 else 1)
+        self.n_candidates_ = _n_candidates(self.max_features, codes.shape[1])
+        max_depth = np.inf if self.max_depth is None else self.max_depth
+        feature, threshold_bin, left, right, value, n_rows = [], [], [], [], [], []
+
+        def new_node():
+            for column, default in ((feature, -1), (threshold_bin, 0), (left, -1), (right, -1),
+                                    (value, None), (n_rows, 0)):
+                column.append(default)
+            return len(feature) - 1
+
+        rows = np.arange(len(y)) if rows is None else np.asarray(rows)
+        stack = [(new_node(), rows, *self._histogram(codes, y, weights, rows), 0)]
+        while stack:
+            node, rows, hist, counts, depth = stack.pop()
+            value[node] = hist[0].sum(axis=0)
+            n_rows[node] = len(rows)
+            if depth >= max_depth or len(rows) < 2 * self.min_samples_leaf_ \
+                    or np.count_nonzero(value[node]) < 2:
+                continue
+            split = self._best_split(hist, counts, len(rows))
+            if split is None:
+                continue
+            f, t = split
+            feature[node], threshold_bin[node] = f, t
+            left[node], right[node] = new_node(), new_node()
+            go_left = codes[rows, f] <= t
+            children = [(left[node], rows[go_left]), (right[node], rows[~go_left])]
+            # Histogram the smaller child; the larger one is the difference.
+            children.sort(key=lambda child: len(child[1]))
+            (small, small_rows), (large, large_rows) = children
+            small_hist, small_counts = self._histogram(codes, y, weights, small_rows)
+            large_hist = np.maximum(hist - small_hist, 0)
+            large_counts = None if counts is None else counts - small_counts
+            stack.append((large, large_rows, large_hist, large_counts, depth + 1))
+            stack.append((small, small_rows, small_hist, small_counts, depth + 1))
+
+        self._set_nodes(np.array(feature), np.array(threshold_bin), np.array(left),
+                        np.array(right), np.array(value, dtype=np.float64), np.array(n_rows))
+
+    def _set_nodes(self, feature, threshold_bin, left, right, value, n_rows):
+        self.feature_ = feature
+        self.threshold_bin_ = threshold_bin
+        self.children_left_ = left
+        self.children_right_ = right
+        self.value_ = value
+        self.n_node_samples_ = n_rows
+        internal = left >= 0
+        self.threshold_ = np.where(
+            internal, self.bin_thresholds_[np.maximum(feature, 0), threshold_bin], -2.0)
+        depth = np.zeros(len(left), dtype=np.intp)
+        for node in np.flatnonzero(internal):  # children have larger ids than parents
+            depth[left[node]] = depth[right[node]] = depth[node] + 1
+        self.node_depth_ = depth
+
+    # -- pruning ---------------------------------------------------------
+
+    def _prune(self):
+        """C4.5 subtree replacement with pessimistic error estimates."""
+        left, right = self.children_left_.copy(), self.children_right_.copy()
+        n = self.value_.sum(axis=1)
+        errors = n - self.value_.max(axis=1)
+        estimate = np.zeros(len(left))
+        for node in range(len(left) - 1, -1, -1):  # children before parents
+            as_leaf = errors[node] + added_errors(n[node], errors[node], self.confidence)
+            if left[node] < 0:
+                estimate[node] = as_leaf
+                continue
+            subtree = estimate[left[node]] + estimate[right[node]]
+            if as_leaf <= subtree + 0.1:
+                left[node] = right[node] = -1
+                estimate[node] = as_leaf
+            else:
+                estimate[node] = subtree
+
+        # Drop the nodes cut off from the root, keeping parents before children.
+        keep = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            keep.append(node)
+            if left[node] >= 0:
+                stack += [right[node], left[node]]
+        keep = np.array(keep)
+        new_id = np.full(len(left), -1)
+        new_id[keep] = np.arange(len(keep))
+        left, right = left[keep], right[keep]
+        self._set_nodes(np.where(left >= 0, self.feature_[keep], -1),
+                        np.where(left >= 0, self.threshold_bin_[keep], 0),
+                        np.where(left >= 0, new_id[left], -1),
+                        np.where(left >= 0, new_id[right], -1),
+                        self.value_[keep], self.n_node_samples_[keep])
+
+    # -- prediction ------------------------------------------------------
+
+    def apply(self, X):
+        """Leaf id of every row of ``X``, all rows moving one level per step."""
+        X = np.asarray(X, dtype=np.float64)
+        node = np.zeros(len(X), dtype=np.intp)
+        active = np.flatnonzero(self.children_left_[node] >= 0)
+        while len(active):
+            current = node[active]
+            go_left = X[active, self.feature_[current]] <= self.threshold_[current]
+            node[active] = np.where(go_left, self.children_left_[current],
+                                    self.children_right_[current])
+            active = active[self.children_left_[node[active]] >= 0]
+        return node
+
+    def predict_proba(self, X):
+        value = self.value_[self.apply(X)]
+        return value / value.sum(axis=1, keepdims=True)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    def get_depth(self):
+        return int(self.node_depth_.max())
+
+    def get_n_leaves(self):
+        return int(np.count_nonzero(self.children_left_ < 0))
+
+
+class RandomForest:
+    """Bagged ``DecisionTree``s grown on one shared ``BinnedMatrix``.
+
+    Each tree gets a bootstrap sample, passed as per-row draw counts
+    (multiplied into ``sample_weight``) rather than a resampled copy, and
+    ``max_features`` candidate features per node. Trees are unpruned, split
+    on Gini impurity by default and the forest averages their class
+    probabilities, like ``RandomForestClassifier``.
+    """
+
+    def __init__(self, n_estimators=100, criterion="gini", max_depth=None, min_samples_leaf=None,
+                 max_features="sqrt", bootstrap=True, max_bins=256, subsample=200_000,
+                 random_state=None):
+        self.n_estimators = n_estimators
+        self.criterion = criterion
+        self.max_depth = max_depth
+        self.min_samples_leaf = min_samples_leaf
+        self.max_features = max_features
+        self.bootstrap = bootstrap
+        self.max_bins = max_bins
+        self.subsample = subsample
+        self.random_state = random_state
+
+    def fit(self, X, y, sample_weight=None):
+        """Fit on a float matrix or on a ``BinnedMatrix`` of it."""
+        rng = check_random_state(self.random_state)
+        if not isinstance(X, BinnedMatrix):
+            X = BinnedMatrix.from_array(X, self.max_bins, self.subsample, rng.randint(2**31 - 1))
+        self.classes_, y_codes = np.unique(np.asarray(y), return_inverse=True)
+        self.n_features_in_ = X.shape[1]
+        n = len(y_codes)
+        sample_weight = _case_weights(sample_weight)
+        self.estimators_ = []
+        for _ in range(self.n_estimators):
+            seed = rng.randint(2**31 - 1)
+            tree = DecisionTree(self.criterion, self.max_depth, self.min_samples_leaf,
+                                prune=False, max_features=self.max_features, random_state=seed)
+            tree.classes_ = self.classes_
+            if self.bootstrap:
+                counts = np.bincount(check_random_state(seed).randint(0, n, n), minlength=n)
+                rows = np.flatnonzero(counts)
+                weights = counts.astype(np.float64)
+                if sample_weight is not None:
+                    weights *= sample_weight
+            else:
+                rows = None
+                weights = sample_weight
+            self.estimators_.append(tree._fit(X, y_codes, weights, rows))
+        return self
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        return sum(tree.predict_proba(X) for tree in self.estimators_) / len(self.estimators_)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]